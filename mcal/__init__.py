@@ -1,2 +1,2 @@
-from .samplers.base import Sampler
+from .samplers.base import AsyncSampler, Sampler
 from .schedules import *
\ No newline at end of file
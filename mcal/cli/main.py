@@ -5,10 +5,13 @@ from typing import Optional
 import click
 import pandas as pd
 
+from mcal import AsyncSampler
 from mcal.config import load_config_file
 from mcal.runner import orchestrate
+from mcal.runner.writer import RunWriter
 from mcal.samplers.base import _load_samplers, get_sampler
 from mcal.utils.logging import get_logger, set_cli_level
+from mcal.utils.pandas import FILE_TYPES
 
 from .dev import dev
 from .util import parse_extra_kwargs
@@ -58,7 +61,10 @@ def run(ctx, name: str):
     logger.info("Constructing sampler with provided args...")
     logger.info("Sampling...")
     sampler = sampler(**kwargs)
-    sample = sampler.sample()
+    if isinstance(sampler, AsyncSampler):
+        sample = asyncio.run(sampler.sample())
+    else:
+        sample = sampler.sample()
 
     assert isinstance(sample, (pd.Series, pd.DataFrame)), f"Sampler returned non-sample type: %s" % type(sample)
 
@@ -73,19 +79,26 @@ def run(ctx, name: str):
 @click.argument('config_path')
 @click.option('--save-name', help="Name to save the run as in the save folder.")
 @click.option('--save-directory', help="Directory to save the run in.")
+@click.option('--flush-every', default=1, type=int, help="Number of iterations between writes of collected data to disk.")
+@click.option('--data-type', default='csv', type=click.Choice(tuple(FILE_TYPES)), help="File format to save collected data in.")
 def run(
     ctx,
     config_path: str,
     save_name: Optional[str] = None,
-    save_directory: Optional[str] = None
+    save_directory: Optional[str] = None,
+    flush_every: int = 1,
+    data_type: str = 'csv'
 ):
     arguments = parse_extra_kwargs(ctx)
     config = load_config_file(config_path, arguments=arguments)
 
-    run_data = asyncio.run(orchestrate.run(config))
-
-    save_path = run_data.write_run(
-        name=save_name,
+    writer = RunWriter(
         save_directory=save_directory,
+        name=save_name,
+        flush_every=flush_every,
+        data_type=data_type
     )
+    run_data = asyncio.run(orchestrate.run(config, writer=writer))
+
+    save_path = run_data.write_run()
     logger.info("Wrote run data to path: %s" % save_path)
\ No newline at end of file
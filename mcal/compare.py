@@ -4,6 +4,7 @@ import pandas as pd
 
 from mcal.runner.models import CalibrationRun
 from mcal.utils.logging import get_logger
+from mcal.utils.pandas import to_wide
 
 logger = get_logger(__name__)
 
@@ -18,7 +19,8 @@ class Compare:
 
         self.unpacked_data = {}
         for key, sample_data in self.run.collected_data.items():
-            self.unpacked_data[key] = sample_data.data
+            # NOTE: Data in the long layout is compared in the wide layout, rows are identified by 'id' before it is dropped
+            self.unpacked_data[key] = to_wide(sample_data.raw_data).drop(columns='id')
 
     def yield_data(self) -> Iterable[Dict[str, pd.DataFrame]]:
         if self.iterate_by is None:
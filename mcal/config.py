@@ -3,7 +3,7 @@ from __future__ import annotations
 import importlib
 import inspect
 import os
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
 
 import jinja2
 import oyaml as yaml
@@ -12,14 +12,19 @@ from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 from mcal import Sampler
 from mcal.actions import Action
+from mcal.events import DEFAULT_MAX_PENDING, get_listener_worker
 from mcal.samplers import get_sampler, is_sampler
+from mcal.samplers.base import RetentionPolicy
 from mcal.schedules import (
     Schedule,
     get_schedule,
     is_schedule,
 )
 from mcal.utils.logging import get_logger
+from mcal.utils.resources import ResourceRegistry
+from mcal.utils.time import parse_timedelta
 from mcal.watchers import Watcher
+from mcal.watchers.base import COALESCERS
 
 logger = get_logger(__name__)
 
@@ -29,8 +34,36 @@ class KindArgs(BaseModel):
     kind: str
     args: Optional[Dict[str, Any]] = Field(default_factory=lambda: {})
 
+class ScheduleConfig(KindArgs):
+    @model_validator(mode='after')
+    def check_sampler_config(self) -> ScheduleConfig:
+        if not is_schedule(self.kind):
+            raise ValueError("Specified schedule does not exist: %s" % self.kind)
+
+        return self
+
+class RetentionConfig(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    # Rows older than this (e.g. '30m') are evicted from memory once written to disk
+    max_age: Optional[str] = None
+    # Only this many of the most recent rows are kept in memory once older rows are written to disk
+    max_rows: Optional[int] = Field(default=None, ge=0)
+
+    def create(self) -> RetentionPolicy:
+        return RetentionPolicy(
+            max_age=parse_timedelta(self.max_age) if self.max_age is not None else None,
+            max_rows=self.max_rows
+        )
+
 class SamplerConfig(KindArgs):
     name: Optional[str] = None
+    # Optional schedule to sample on independently of the run level schedule
+    schedule: Optional[ScheduleConfig] = None
+    # Samples taking longer than this are abandoned (e.g. '5s'), defaults to the schedule's interval
+    timeout: Optional[str] = None
+    # Optional limit on the data kept in memory, only applies when the run is streamed to disk
+    retention: Optional[RetentionConfig] = None
 
     @model_validator(mode='after')
     def check_sampler_config(self) -> SamplerConfig:
@@ -44,14 +77,6 @@ class SamplerConfig(KindArgs):
             return self.name
         return self.kind
 
-class ScheduleConfig(KindArgs):
-    @model_validator(mode='after')
-    def check_sampler_config(self) -> ScheduleConfig:
-        if not is_schedule(self.kind):
-            raise ValueError("Specified schedule does not exist: %s" % self.kind)
-
-        return self
-
 class ObjectAsKind(KindArgs):
     _object: Callable = None
 
@@ -96,6 +121,11 @@ class ObjectAsKind(KindArgs):
         self._object = obj
 
 class WatcherConfig(ObjectAsKind):
+    # Maximum number of events queued for the watcher and what to do once it is exceeded, see `ListenerWorker`
+    # NOTE: Only applies to synchronous watcher methods
+    max_pending: int = Field(default=DEFAULT_MAX_PENDING, ge=1)
+    overflow: Literal['block', 'drop-oldest', 'coalesce'] = 'block'
+
     @model_validator(mode='after')
     def check_object_as_kind(self) -> WatcherConfig:
         # Validate watcher
@@ -104,6 +134,12 @@ class WatcherConfig(ObjectAsKind):
         if not isinstance(self._object, Watcher):
             raise ValueError("Object specified by '%s' is not a watcher: %s - %s" % (self.kind, type(self._object), self._object))
 
+        worker = get_listener_worker(self._object)
+        if worker is not None:
+            worker.max_pending = self.max_pending
+            worker.overflow = self.overflow
+            worker.coalescers = COALESCERS
+
         return self
 
 class ActionConfig(ObjectAsKind):
@@ -123,6 +159,12 @@ class StopCriteriaConfig(ObjectAsKind):
         self.create_object('mcal.criteria')
         return self
 
+class RunnerConfig(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    # Number of iterations which may still be notifying watchers / running awaited actions when the next iteration samples. One disables pipelining.
+    max_in_flight_iterations: int = Field(default=1, ge=1)
+
 class MCalConfig(BaseModel): 
     model_config = ConfigDict(extra="forbid")
 
@@ -131,9 +173,11 @@ class MCalConfig(BaseModel):
     watchers: List[WatcherConfig] = Field(default_factory=lambda: [])
     stop_criteria: StopCriteriaConfig = Field(default=None)
     actions: List[ActionConfig] = Field(default_factory=lambda: [])
+    runner: RunnerConfig = Field(default_factory=RunnerConfig)
 
     _schedule: Schedule = None
     _samplers: Dict[str, Sampler] = None
+    _resources: ResourceRegistry = None
 
 
     @model_validator(mode='after')
@@ -161,6 +205,12 @@ class MCalConfig(BaseModel):
         if self.stop_criteria is not None:
             return self.stop_criteria._object
 
+    def get_resources(self) -> Optional[ResourceRegistry]:
+        """
+        Resources shared by the samplers, None until `create()` is called.
+        """
+        return self._resources
+
     def create(self) -> Tuple[Schedule, Dict[str, Sampler], List[Watcher], List[Action], Callable]:
         if self._schedule is not None or self._samplers is not None:
             assert self._schedule is not None and self._samplers is not None, "Schedule or sampler has been constructed but not both. This should not happen."
@@ -175,14 +225,21 @@ class MCalConfig(BaseModel):
 
         # NOTE: Here we are constructing samplers first, bc schedule constructors may be permitted to use samplers to measure parameters for use in schedule. Note how samplers are passed into schedule construction.
         samplers = {}
+        resources = ResourceRegistry()
         for sampler_config in self.samplers:
             sampler_cls = get_sampler(sampler_config.kind)
             # Sanity check although this should never be None
             assert sampler_cls is not None, "Internal error, sampler '%s' does not exist, is config validation working properly?" % sampler_config.kind
 
             try:
+                sampler_args = dict(sampler_config.args)
+                # NOTE: Samplers accepting 'resources' share clients / discovery results with the rest of the run
+                if 'resources' in inspect.signature(sampler_cls).parameters:
+                    assert 'resources' not in sampler_args, "Usage error, parameter name 'resources' is reserved for injection of shared resources"
+                    sampler_args['resources'] = resources
+
                 sampler = sampler_cls(
-                    **sampler_config.args
+                    **sampler_args
                 )
                 sampler.config = sampler_config
                 samplers[sampler_config.get_name()] = sampler
@@ -192,32 +249,30 @@ class MCalConfig(BaseModel):
                 logger.error(err)
                 raise err
 
-        schedule_cls = get_schedule(self.schedule.kind)
-        # Another sanity check that should never be false
-        assert schedule_cls is not None, "Internal error, schedule '%s' does not exist, is config validation working properly?" % self.schedule.kind
-
-        try:
-            signature = inspect.signature(schedule_cls.from_config)
-
-            if 'samplers' in signature.parameters:
-                assert 'samplers' not in self.schedule.args, "Usage error, parameter name 'samplers' is reserved for injection of samplers"
-                schedule = schedule_cls.from_config(
-                    **self.schedule.args,
-                    samplers=samplers
+        schedule = _create_schedule(self.schedule, samplers)
+        for sampler_config in self.samplers:
+            sampler = samplers[sampler_config.get_name()]
+            if sampler_config.schedule is not None:
+                # NOTE: Independent schedules only get their own sampler injected
+                sampler.schedule = _create_schedule(
+                    sampler_config.schedule,
+                    {sampler_config.get_name(): sampler}
                 )
+
+            if sampler_config.timeout is not None:
+                sampler.timeout = parse_timedelta(sampler_config.timeout).total_seconds()
             else:
-                schedule = schedule_cls.from_config(
-                    **self.schedule.args,
-                )
-        except Exception as err:
-            logger.error("Failed to construct schedule '%s' with arguments: %s" % (self.schedule.kind, self.schedule.args))
-            logger.error("Please make sure the arguments are correct and initialization logic.")
-            logger.error(err)
-            raise err
+                interval = getattr(sampler.schedule or schedule, 'interval', None)
+                if interval is not None and interval.total_seconds() > 0:
+                    sampler.timeout = interval.total_seconds()
+
+            if sampler_config.retention is not None:
+                sampler.retention = sampler_config.retention.create()
 
         # If everything works, save constructions and return
         self._schedule = schedule
         self._samplers = samplers
+        self._resources = resources
 
         return (
             schedule,
@@ -227,6 +282,30 @@ class MCalConfig(BaseModel):
             self.get_stop_criteria()
         )
 
+def _create_schedule(schedule_config: ScheduleConfig, samplers: Dict[str, Sampler]) -> Schedule:
+    schedule_cls = get_schedule(schedule_config.kind)
+    # Another sanity check that should never be false
+    assert schedule_cls is not None, "Internal error, schedule '%s' does not exist, is config validation working properly?" % schedule_config.kind
+
+    try:
+        signature = inspect.signature(schedule_cls.from_config)
+
+        if 'samplers' in signature.parameters:
+            assert 'samplers' not in schedule_config.args, "Usage error, parameter name 'samplers' is reserved for injection of samplers"
+            return schedule_cls.from_config(
+                **schedule_config.args,
+                samplers=samplers
+            )
+        else:
+            return schedule_cls.from_config(
+                **schedule_config.args,
+            )
+    except Exception as err:
+        logger.error("Failed to construct schedule '%s' with arguments: %s" % (schedule_config.kind, schedule_config.args))
+        logger.error("Please make sure the arguments are correct and initialization logic.")
+        logger.error(err)
+        raise err
+
 def load_config_file(path: str, arguments: Dict[str, Any]) -> MCalConfig:
     assert os.path.isfile(path), "Config path is not a file: %s" % path
     with open(path, 'r') as f:
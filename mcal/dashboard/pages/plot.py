@@ -18,13 +18,14 @@ PRESET_DIR = os.path.join(THIS_DIR, "../preset")
 DASK_WORKER_DASHBOARD = os.path.join(PRESET_DIR, 'dask_worker.json')
 
 # Incorporate data
+# NOTE: Data is loaded lazily, only the columns used by graphs are read
 run = load_run(os.environ["RUN_PATH"])
 
 OPTIONS = []
-for sampler, sampler_data in run.collected_data.items():
+for sampler in run.collected_data:
     OPTIONS.extend((
         f"{sampler}:{c}"
-        for c in list(sampler_data.data.drop(columns="timestamp").columns)
+        for c in run.collected_data.read_schema(sampler).index.drop(["id", "timestamp"], errors="ignore")
     ))
 
 dash.register_page(__name__)
@@ -188,13 +189,12 @@ def create_graph(
     if len(by_formatter) > 2:
         return None, [dbc.Alert("Currently only two formatters are supported.", color='danger')]
 
-    sampler_data = run.collected_data[sampler_name]
     fig = make_subplots(specs=[[{"secondary_y": True}]])
     units = {}
     dash = {0: None, 1: "dash"}
     for i, (formatter, attrs) in enumerate(by_formatter.items()):
         for attr in attrs:
-            attr_timeseries = sampler_data.raw_data[["id", "timestamp", attr]]
+            attr_timeseries = run.collected_data.read_columns(sampler_name, ["id", "timestamp", attr])
             attr_timeseries["id"] = simple_id_formatter(attr_timeseries["id"])
 
             if formatter is not None:
@@ -202,7 +202,7 @@ def create_graph(
                     attr_timeseries[attr]
                 )
 
-            for id, timeseries in attr_timeseries.groupby("id"):
+            for id, timeseries in attr_timeseries.groupby("id", observed=True):
                 fig.add_trace(
                     go.Scatter(
                         x=timeseries["timestamp"],
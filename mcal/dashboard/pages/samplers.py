@@ -13,7 +13,7 @@ run = load_run(os.environ["RUN_PATH"])
 dash.register_page(__name__, order=0)
 
 def attribute_table(sampler: str) -> dbc.Table:
-    dtypes_df = run.collected_data[sampler].data.dtypes
+    dtypes_df = run.collected_data.read_schema(sampler).drop("id", errors="ignore")
     dtypes_df = dtypes_df.to_frame()
 
     dtypes_df = dtypes_df.rename(columns={0: 'dtype'})
@@ -59,7 +59,7 @@ def attr_info(sampler: str, attribute: Optional[str]) -> dbc.Card:
         title = html.H3(f"Attribute Info - {attribute}")
         contents = []
 
-        data = run.collected_data[sampler].data[attribute]
+        data = run.collected_data.read_columns(sampler, [attribute])[attribute]
         describe_df = data.describe().to_frame()
         describe_df = describe_df.rename(columns={attribute: 'value'})
         describe_df = describe_df.reset_index().rename(columns={'index': 'metric'})
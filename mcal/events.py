@@ -1,43 +1,345 @@
 from __future__ import annotations
 
 import asyncio
-import functools
 import inspect
-from typing import Callable, Dict, Hashable, List
+import threading
+from collections import deque
+from itertools import count
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 
+from mcal.utils.instrument import RECORDER
 from mcal.utils.logging import get_logger
 
 ASYNC_EVENT_LISTENERS: Dict[Hashable, List[Callable]] = {}
 SYNC_EVENT_LISTENERS: Dict[Hashable, List[SyncListenerFeeder]] = {}
+# Workers shared by sync listeners with the same owner (function or bound method instance)
+SYNC_LISTENER_WORKERS: Dict[Hashable, ListenerWorker] = {}
+
+# Maximum number of calls queued on a listener worker before the overflow policy applies
+DEFAULT_MAX_PENDING = 1024
+OVERFLOW_POLICIES = ('block', 'drop-oldest', 'coalesce')
 
 logger = get_logger(__name__)
 
+# Scope of queued calls which are not for a single id (e.g. 'new-sample' / 'id-updates-batch'), see `ListenerWorker`
+_ALL_IDS = object()
+
 def clear_subscriptions():
     global ASYNC_EVENT_LISTENERS
     global SYNC_EVENT_LISTENERS
+    global SYNC_LISTENER_WORKERS
+
+    for worker in SYNC_LISTENER_WORKERS.values():
+        worker.stop()
 
     ASYNC_EVENT_LISTENERS = {}
     SYNC_EVENT_LISTENERS = {}
+    SYNC_LISTENER_WORKERS = {}
+
+class _Call:
+    __slots__ = ('loop', 'future', 'func', 'args', 'kwargs', 'key', 'event', 'seq')
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        future: Optional[asyncio.Future],
+        func: Callable,
+        args: tuple,
+        kwargs: dict,
+        key: Optional[Hashable] = None,
+        event: Optional[Hashable] = None
+    ):
+        self.loop = loop
+        self.future = future
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.event = event
+        self.seq = -1
+
+class ListenerWorker:
+    """
+    Runs synchronous listener calls in order on a dedicated thread. Calls are queued and drained in batches, so listeners are never invoked concurrently and do not compete with samplers for the default executor.
+
+    When more than `max_pending` calls are queued the `overflow` policy decides what happens:
+    - `block`: Emitters wait for the listener to catch up.
+    - `drop-oldest`: The oldest queued call is dropped, emitters never wait.
+    - `coalesce`: Calls to an event with a coalescer (see `coalescers`) are merged into the last queued call with the same key, e.g. consecutive `id-updates` for one id. Calls are only merged if nothing else for the same id, and no call without an id (e.g. a batch), was queued after it, so the order of events is kept. Otherwise the oldest queued call is dropped, emitters never wait.
+
+    **NOTE:** With the non-blocking policies emitters do not wait on the listener, use `join()` to wait for queued calls to finish. Exceptions raised by the listener are logged instead of propagated.
+    """
+    def __init__(
+        self,
+        name: str,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        overflow: str = 'block'
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy '%s', expected one of: %s" % (overflow, OVERFLOW_POLICIES))
+
+        self.name = name
+        self.max_pending = max_pending
+        self.overflow = overflow
+        # Maps event names to a `(key, merge)` pair, calls with equal `key(kwargs)` are merged with `merge(old_kwargs, new_kwargs)`
+        self.coalescers: Dict[str, Tuple[Callable[[dict], Hashable], Callable[[dict, dict], dict]]] = {}
+
+        self.dropped = 0
+        self.coalesced = 0
+
+        self._pending: Deque[Optional[_Call]] = deque()
+        # The last queued call for each id (see `_scope(...)`), the only calls which may be merged into
+        self._last: Dict[Hashable, _Call] = {}
+        self._seq = count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        # NOTE: asyncio primitives are bound to a loop so these are re-created if the loop changes
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _start(self, loop: asyncio.AbstractEventLoop):
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._drain,
+                    name="mcal-listener-%s" % self.name,
+                    daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            if self._thread is not None:
+                self._pending.append(None)
+                self._condition.notify()
+                self._thread = None
+
+    async def submit(
+        self,
+        func: Callable,
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        event: Optional[Hashable] = None
+    ) -> Any:
+        """
+        Queue a call of `func` on the worker thread.
+
+        Args:
+            event (Optional[Hashable], optional): Event which triggered the call, used to find a coalescer. Defaults to None.
+
+        Returns:
+            Any: The result of the call with the `block` policy, otherwise None.
+        """
+        if kwargs is None:
+            kwargs = {}
+        loop = asyncio.get_running_loop()
+        self._start(loop)
+
+        if self.overflow == 'block':
+            async with self._slots:
+                future = loop.create_future()
+                self._put(_Call(loop, future, func, args, kwargs, event=event))
+                return await future
+
+        key = None
+        coalescer = self.coalescers.get(_event_name(event)) if self.overflow == 'coalesce' else None
+        with self._condition:
+            if coalescer is not None:
+                key = (func, event, coalescer[0](kwargs))
+                if len(self._pending) >= self.max_pending:
+                    queued = self._mergeable(key, _scope(kwargs))
+                    if queued is not None:
+                        queued.kwargs = coalescer[1](queued.kwargs, kwargs)
+                        self.coalesced += 1
+                        return
+
+            while len(self._pending) >= self.max_pending:
+                dropped = self._pending.popleft()
+                if dropped is None:
+                    # Do not drop stop requests
+                    self._pending.appendleft(dropped)
+                    break
+                if self._last.get(_scope(dropped.kwargs)) is dropped:
+                    del self._last[_scope(dropped.kwargs)]
+                self.dropped += 1
+
+            self._put(_Call(loop, None, func, args, kwargs, key=key, event=event))
+
+    async def join(self):
+        """
+        Wait for all calls queued so far to finish.
+        """
+        if self._thread is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            self._put(_Call(loop, future, _noop, (), {}))
+        await future
+
+    def _mergeable(self, key: Hashable, scope: Hashable) -> Optional[_Call]:
+        # NOTE: Calls without an id are ordered against every call, so they are only merged into the tail of the queue
+        if scope is _ALL_IDS:
+            queued = self._pending[-1] if len(self._pending) != 0 else None
+        else:
+            queued = self._last.get(scope)
+            last_all = self._last.get(_ALL_IDS)
+            if queued is not None and last_all is not None and last_all.seq > queued.seq:
+                return None
+
+        if queued is None or queued.key != key:
+            return None
+        return queued
+
+    def _put(self, call: _Call):
+        with self._condition:
+            call.seq = next(self._seq)
+            self._pending.append(call)
+            self._last[_scope(call.kwargs)] = call
+            self._condition.notify()
+
+    def _drain(self):
+        while True:
+            with self._condition:
+                while len(self._pending) == 0:
+                    self._condition.wait()
+                # Take everything which is queued so results are handed back to the loop in one call
+                calls = list(self._pending)
+                self._pending.clear()
+                self._last.clear()
+
+            results: Dict[asyncio.AbstractEventLoop, List[Tuple]] = {}
+            stopped = False
+            for call in calls:
+                if call is None:
+                    stopped = True
+                    continue
+
+                try:
+                    with RECORDER.time(self.name, str(_event_name(call.event))):
+                        result = (call.future, call.func(*call.args, **call.kwargs), None)
+                except BaseException as err:
+                    if call.future is None:
+                        logger.error("Listener '%s' raised an exception: %s" % (self.name, err))
+                        continue
+                    result = (call.future, None, err)
+
+                if call.future is None:
+                    continue
+                if call.loop not in results:
+                    results[call.loop] = []
+                results[call.loop].append(result)
+
+            for loop, loop_results in results.items():
+                try:
+                    loop.call_soon_threadsafe(_resolve, loop_results)
+                except RuntimeError:
+                    # Loop has been closed, nobody is waiting on these anymore
+                    pass
+
+            if stopped:
+                return
+
+def _noop():
+    pass
+
+def _scope(kwargs: dict) -> Hashable:
+    # NOTE: Calls for a single id only need to be ordered against other calls for that id
+    return kwargs.get('id', _ALL_IDS)
+
+def _event_name(event: Optional[Hashable]) -> Optional[Hashable]:
+    # NOTE: Sampler events are keyed by `(kind, event_name)`
+    if isinstance(event, tuple) and len(event) == 2:
+        return event[1]
+    return event
+
+def _resolve(results: List[Tuple]):
+    for future, result, err in results:
+        if future.cancelled():
+            continue
+        if err is not None:
+            future.set_exception(err)
+        else:
+            future.set_result(result)
+
+async def drain_listeners():
+    """
+    Wait for all queued synchronous listener calls to finish, logging any events which were dropped or coalesced.
+    """
+    workers = list(SYNC_LISTENER_WORKERS.values())
+    await asyncio.gather(*(worker.join() for worker in workers))
+
+    for worker in workers:
+        if worker.dropped != 0 or worker.coalesced != 0:
+            logger.warning("Listener '%s' fell behind, %s events were dropped and %s were coalesced." % (worker.name, worker.dropped, worker.coalesced))
+
+def get_listener_worker(owner: Any) -> Optional[ListenerWorker]:
+    """
+    Get the worker shared by the synchronous listeners of a function or instance (e.g. a watcher).
+    """
+    return SYNC_LISTENER_WORKERS.get(id(owner))
+
+def _listener_name(func: Callable) -> str:
+    owner = getattr(func, '__self__', None)
+    if owner is not None:
+        return type(owner).__name__
+    return getattr(func, '__qualname__', repr(func))
+
+def _get_worker(func: Callable) -> ListenerWorker:
+    # NOTE: Methods of the same instance (e.g. a watcher) share a worker so the instance is never entered concurrently
+    owner = getattr(func, '__self__', func)
+    key = id(owner)
+    if key not in SYNC_LISTENER_WORKERS:
+        SYNC_LISTENER_WORKERS[key] = ListenerWorker(_listener_name(func))
+
+    return SYNC_LISTENER_WORKERS[key]
 
 class SyncListenerFeeder:
     """Designed invoke synchronous without them needing to be reentrant"""
 
-    def __init__(self, func: Callable):
+    def __init__(
+        self,
+        func: Callable,
+        worker: Optional[ListenerWorker] = None,
+        event: Optional[Hashable] = None
+    ):
         self.func = func
+        self.event = event
 
-        self.lock = asyncio.Lock()
+        if worker is None:
+            worker = _get_worker(func)
+        self.worker = worker
 
     async def __call__(self, *args, **kwargs):
-        async with self.lock:
-            func = functools.partial(self.func, *args, **kwargs)
-            await asyncio.get_running_loop().run_in_executor(
-                None,
-                func
-            )
+        await self.worker.submit(self.func, args, kwargs, event=self.event)
 
 
 # TODO: Maybe preform upfront detection of signature and match to a protocol
-def on_event(event: Hashable) -> Callable:
+def on_event(event: Hashable, worker: Optional[ListenerWorker] = None) -> Callable:
+    """
+    Subscribe a function to an event.
+
+    Args:
+        event (Hashable): The event to listen to.
+        worker (Optional[ListenerWorker], optional): Worker to run a synchronous listener on. Defaults to None which shares a worker between all listeners with the same function or instance.
+    """
     def _on_event(func: Callable) -> Callable:
         if inspect.iscoroutinefunction(func):
             if event not in ASYNC_EVENT_LISTENERS:
@@ -49,19 +351,48 @@ def on_event(event: Hashable) -> Callable:
             if event not in SYNC_EVENT_LISTENERS:
                 SYNC_EVENT_LISTENERS[event] = []
             SYNC_EVENT_LISTENERS[event].append(
-                SyncListenerFeeder(func)
+                SyncListenerFeeder(func, worker=worker, event=event)
             )
 
         return func
 
     return _on_event
 
+def has_listeners(event: Hashable) -> bool:
+    return (
+        len(SYNC_EVENT_LISTENERS.get(event, ())) != 0
+        or len(ASYNC_EVENT_LISTENERS.get(event, ())) != 0
+    )
+
+def dispatch_plan(kind: Hashable, events: Iterable[str]) -> FrozenSet[str]:
+    """
+    Find which events of a source have listeners, so emitters can skip building payloads for events nobody listens to.
+
+    Args:
+        kind (Hashable): The source of the events, the first part of `(kind, event)` keys.
+        events (Iterable[str]): Candidate event names.
+
+    Returns:
+        FrozenSet[str]: The event names which have at least one listener.
+    """
+    return frozenset(event for event in events if has_listeners((kind, event)))
+
+async def _timed_listener(listener: Callable, event: Hashable, *args, **kwargs):
+    with RECORDER.time(_listener_name(listener), str(_event_name(event))):
+        await listener(*args, **kwargs)
+
 async def emit(event: Hashable, *args, **kwargs):
+    if not has_listeners(event):
+        return
+
     tasks = []
     for listener in SYNC_EVENT_LISTENERS.get(event, ()):
         tasks.append(listener(*args, **kwargs))
     for listener in ASYNC_EVENT_LISTENERS.get(event, ()):
-        tasks.append(listener(*args, **kwargs))
+        if RECORDER.enabled:
+            tasks.append(_timed_listener(listener, event, *args, **kwargs))
+        else:
+            tasks.append(listener(*args, **kwargs))
 
     try:
         await asyncio.gather(*tasks)
@@ -8,6 +8,19 @@ from mcal.utils.env_file import load_env_file
 
 DEFAULT_ENDPOINT = "https://api.newrelic.com/graphql"
 
+# Variable substitution reference: https://gql.readthedocs.io/en/stable/usage/variables.html
+NRQL_REQUEST = gql(
+    """
+    query ($id: Int!, $query: Nrql!) {
+        actor {
+            account(id: $id) {
+                nrql(query: $query) { results }
+            }
+        }
+    }
+    """
+)
+
 class NewRelicClient:
     def __init__(
         self,
@@ -30,20 +43,18 @@ class NewRelicClient:
         )
 
     def query(self, query: str):
-        # Variable substitution reference: https://gql.readthedocs.io/en/stable/usage/variables.html
-        request = gql(
-            """
-            query ($id: Int!, $query: Nrql!) {
-                actor {
-                    account(id: $id) {
-                        nrql(query: $query) { results }
-                    }
-                }
+        result = self.client.execute(
+            NRQL_REQUEST,
+            variable_values={
+                'id': self.account_id,
+                'query': query
             }
-            """
         )
-        result = self.client.execute(
-            request,
+        return result["actor"]["account"]["nrql"]["results"]
+
+    async def query_async(self, query: str):
+        result = await self.client.execute_async(
+            NRQL_REQUEST,
             variable_values={
                 'id': self.account_id,
                 'query': query
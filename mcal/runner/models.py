@@ -3,36 +3,146 @@ from __future__ import annotations
 import os
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+)
 
 import pandas as pd
 
 from mcal.config import MCalConfig, load_config_file
 from mcal.samplers.base import SamplerData
 from mcal.utils.logging import get_logger
+from mcal.utils.pandas import (
+    FILE_TYPES,
+    LONG_COLUMNS,
+    is_long,
+    long_column_name,
+    select_wide,
+)
+
+if TYPE_CHECKING:
+    from .writer import RunWriter
 
 # NOTE: I think it is important that %Z is included to assure UTC
 DATE_FORMAT = "%Y-%m-%d_%H:%M:%S_%Z"
 
 logger = get_logger(__name__)
 
+class LazyRunData(MutableMapping[str, SamplerData]):
+    """
+    Sampler data of a saved run, each sampler's data is only loaded from disk when first accessed. Use `read_columns(...)` or `read_schema(...)` to look at a subset of the data without loading all of it.
+
+    **NOTE:** `read_columns(...)` and `read_schema(...)` present data stored in the long layout (see `mcal.utils.pandas.LONG_COLUMNS`) as if it was stored in the wide layout.
+    """
+    def __init__(self, paths: Dict[str, str]):
+        self._paths = paths
+        self._loaded: Dict[str, SamplerData] = {}
+
+    def __getitem__(self, name: str) -> SamplerData:
+        if name not in self._loaded:
+            if name not in self._paths:
+                raise KeyError(name)
+            self._loaded[name] = SamplerData.load(self._paths[name])
+
+        return self._loaded[name]
+
+    def __setitem__(self, name: str, value: SamplerData):
+        self._loaded[name] = value
+
+    def __delitem__(self, name: str):
+        if name not in self._paths and name not in self._loaded:
+            raise KeyError(name)
+        self._paths.pop(name, None)
+        self._loaded.pop(name, None)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._paths
+        yield from (name for name in self._loaded if name not in self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths.keys() | self._loaded.keys())
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def load_all(self):
+        for name in self._paths:
+            self[name]
+
+    def read_columns(self, name: str, columns: List[str]) -> pd.DataFrame:
+        """
+        Read only some columns of a sampler's data. If the data has not been loaded, columnar formats will be memory-mapped and only the requested columns will be read.
+        """
+        if name in self._loaded:
+            df = self._loaded[name].raw_data
+            if is_long(df.columns):
+                return select_wide(df, columns)
+            return df.reindex(columns=columns)
+
+        path = self._paths[name]
+        schema = SamplerData.read_schema(path)
+        if is_long(schema.index):
+            # Rows are identified by 'id' and 'timestamp' even if they are not requested
+            read = ['id', 'timestamp', *columns, *LONG_COLUMNS]
+            read = [c for c in dict.fromkeys(read) if c in schema.index]
+            return select_wide(SamplerData.read_columns(path, columns=read), columns)
+
+        return SamplerData.read_columns(path, columns=columns)
+
+    def read_schema(self, name: str) -> pd.Series:
+        """
+        Read the dtypes of a sampler's data, indexed by column name.
+        """
+        if name in self._loaded:
+            schema = self._loaded[name].raw_data.dtypes
+        else:
+            schema = SamplerData.read_schema(self._paths[name])
+        if not is_long(schema.index):
+            return schema
+
+        keys = self.read_columns_raw(name, ['metric', 'labels']).drop_duplicates()
+        names = [long_column_name(metric, labels) for metric, labels in keys.itertuples(index=False)]
+        return pd.concat([
+            schema.drop(list(LONG_COLUMNS)),
+            pd.Series(schema['value'], index=names, dtype=object)
+        ])
+
+    def read_columns_raw(self, name: str, columns: List[str]) -> pd.DataFrame:
+        """
+        Read only some columns of a sampler's data as they are stored, without pivoting the long layout.
+        """
+        if name in self._loaded:
+            return self._loaded[name].raw_data.reindex(columns=columns)
+
+        return SamplerData.read_columns(self._paths[name], columns=columns)
+
 # TODO: Unify with / include in CalibrationRun
 @dataclass
 class RunStats:
     time_elapsed: timedelta = timedelta(seconds=0)
     iterations: int = 0
+    # Samples which were abandoned or skipped because a sampler overran its timeout
+    missed_samples: int = 0
 
     def get_str(self) -> str:
         return "\t" + "\n\t".join((
             f"Iterations: {self.iterations}",
             f"Time elapsed: {self.time_elapsed}",
+            f"Missed samples: {self.missed_samples}",
         ))
 
 @dataclass
 class CalibrationRun:
     start_time: datetime
     config: MCalConfig
-    collected_data: Dict[str, SamplerData] = field(default_factory=lambda: {})
+    collected_data: MutableMapping[str, SamplerData] = field(default_factory=lambda: {})
+    # Set when the run is streamed to disk while it is in progress
+    writer: Optional[RunWriter] = None
 
     def gen_name(self) -> str:
         return self.start_time.strftime(DATE_FORMAT)
@@ -43,6 +153,12 @@ class CalibrationRun:
         name: Optional[str] = None,
         data_type: str = 'csv'
     ) -> str:
+        if self.writer is not None and self.writer.folder_path is not None:
+            # Data has already been streamed to disk, just finalize the remaining data
+            if save_directory is not None or name is not None:
+                logger.warning("Run is already being written to '%s', ignoring save directory and name." % self.writer.folder_path)
+            return self.writer.close()
+
         if save_directory is None:
             save_directory = 'mcal_run_data'
         if name is None:
@@ -60,11 +176,21 @@ class CalibrationRun:
         self.config.save(config_path)
 
         for sample in self.collected_data.values():
-            sample.write(folder_path)
+            sample.write(folder_path, file_type=data_type)
 
         return folder_path
 
-def load_run(path: str) -> CalibrationRun:
+def load_run(path: str, lazy: bool = True) -> CalibrationRun:
+    """
+    Load a run previously saved by `CalibrationRun.write_run(...)`.
+
+    Args:
+        path (str): Path to the run folder.
+        lazy (bool, optional): Only load each sampler's data when it is first accessed. Defaults to True.
+
+    Returns:
+        CalibrationRun: The loaded run, with `collected_data` as a `LazyRunData` mapping.
+    """
     try:
         folder_name = os.path.basename(path)
         start_time = datetime.strptime(folder_name, DATE_FORMAT)
@@ -72,7 +198,7 @@ def load_run(path: str) -> CalibrationRun:
         start_time = None
 
     config = None
-    collected_data = {}
+    data_paths = {}
     for file in os.listdir(path):
         file_path = os.path.join(path, file)
         if file == "config.yml":
@@ -80,21 +206,30 @@ def load_run(path: str) -> CalibrationRun:
             config = load_config_file(file_path, {})
             continue
 
+        if os.path.isdir(file_path):
+            # Segments written incrementally during the run
+            data_paths[file] = file_path
+            continue
+
         name, ext = os.path.splitext(file)
         if ext == ".json":
             # Used for saving CSV dtypes so just skipping here
             continue
-        if ext == ".csv":
-            collected_data[name] = SamplerData.load(file_path)
+        if ext in FILE_TYPES.values():
+            data_paths[name] = file_path
         else:
             raise NotImplementedError("Found unexpected type in save folder: %s" % ext)
 
     if config is None:
         # TODO: Definitely can optimize this if data load times get larger
         raise RuntimeError("Unable to find 'config.yml' file in directory: %s" % path)
-    if len(collected_data) == 0:
+    if len(data_paths) == 0:
         logger.warning("Not sample data was found in directory, returning a sample run with empty data: %s" % path)
 
+    collected_data = LazyRunData(data_paths)
+    if not lazy:
+        collected_data.load_all()
+
     return CalibrationRun(
         start_time=start_time,
         config=config,
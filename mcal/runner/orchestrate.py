@@ -1,18 +1,29 @@
 import asyncio
+import time
+from collections import deque
+from copy import copy
+from typing import Callable, Coroutine, Deque, Dict, FrozenSet, List, Optional
 
 import pandas as pd
 
+from mcal import AsyncSampler, Sampler
+from mcal.actions import Action
 from mcal.config import MCalConfig
-from mcal.events import emit
+from mcal.events import dispatch_plan, drain_listeners, emit
+from mcal.schedules import Schedule
+from mcal.utils.instrument import RECORDER
 from mcal.utils.logging import get_logger
 from mcal.utils.time import utc_now
+from mcal.watchers.base import EVENTS
 
 from .models import CalibrationRun, RunStats, SamplerData
+from .writer import RunWriter
 
 logger = get_logger(__name__)
 
 async def run(
     config: MCalConfig,
+    writer: Optional[RunWriter] = None,
 ) -> CalibrationRun:
     schedule, samplers, watchers, actions, stop_criteria = config.create()
 
@@ -21,161 +32,387 @@ async def run(
         start_time=utc_now(),
         config=config
     )
-    for name in samplers.keys():
-        run_data.collected_data[name] = None
+    for name, sampler in samplers.items():
+        run_data.collected_data[name] = SamplerData.empty(name, type(sampler))
+        if sampler.retention is not None:
+            if writer is None:
+                logger.warning("Retention of sampler '%s' has no effect, data is only evicted once the run is written to disk." % name)
+            else:
+                run_data.collected_data[name].retention = sampler.retention
+
+    if writer is not None:
+        writer.open(run_data)
+        run_data.writer = writer
+
+    try:
+        await _run_loop(
+            run_data,
+            schedule,
+            samplers,
+            actions,
+            stop_criteria,
+            writer,
+            max_in_flight=config.runner.max_in_flight_iterations
+        )
+    finally:
+        if writer is not None:
+            # Persist whatever was collected, even if the run failed
+            writer.close()
+        for name, sampler in samplers.items():
+            try:
+                sampler.close()
+            except Exception as err:
+                logger.warning("Failed to close sampler '%s': %s" % (name, err))
+        config.get_resources().close()
+
+    return run_data
+
+async def _run_loop(
+    run_data: CalibrationRun,
+    schedule: Schedule,
+    samplers: Dict[str, Sampler],
+    actions: List[Action],
+    stop_criteria: Optional[Callable],
+    writer: Optional[RunWriter],
+    max_in_flight: int = 1
+):
+    """
+    Iterate the run until the stop criteria is met.
+
+    Args:
+        max_in_flight (int, optional): Maximum number of iterations whose watchers / awaited actions may still be running when the next iteration starts. Values above one allow the next iteration to sample on schedule while slow watchers drain. Defaults to 1.
+    """
+    # Samplers with their own schedule are driven independently of the run level loop
+    independent = {name: s for name, s in samplers.items() if s.schedule is not None}
+    samplers = {name: s for name, s in samplers.items() if s.schedule is None}
 
     stats = RunStats()
+    # Sync samples which overran their timeout and are still running in the executor
+    overruns: Dict[str, asyncio.Future] = {}
+
+    stop = asyncio.Event()
+    # NOTE: Errors of independently scheduled samplers stop the run as soon as they happen, the error is raised once the sampler loops are gathered
+    run_task = asyncio.current_task()
+    failed: List[asyncio.Task] = []
+    def _sampler_done(task: asyncio.Task):
+        if task.cancelled() or task.exception() is None or stop.is_set():
+            return
+        logger.error("Sampler '%s' failed, stopping the run." % task.get_name())
+        failed.append(task)
+        stop.set()
+        run_task.cancel()
+
+    sampler_loops = []
+    for name, sampler in independent.items():
+        sampler_loop = asyncio.create_task(_sampler_loop(run_data, sampler, stop, writer, overruns, stats), name=name)
+        sampler_loop.add_done_callback(_sampler_done)
+        sampler_loops.append(sampler_loop)
+
+    loop = asyncio.get_running_loop()
+    flush_task: Optional[asyncio.Future] = None
+
+    # NOTE: Watchers for a sampler are notified after the previous notification for that sampler, so event order is kept across iterations
+    notify_tasks: Dict[str, asyncio.Task] = {}
+    # NOTE: Likewise, an action's `after_iter` only starts once its previous call finished so it is never run concurrently
+    action_calls: List[Optional[asyncio.Task]] = [None] * len(actions)
+    in_flight: Deque[asyncio.Future] = deque()
+
     logger.info("Starting run loop...")
     if stop_criteria is None:
         logger.warning("No stop criteria has been provided, loop will iterate infinitely...")
-    while stop_criteria is None or not stop_criteria(stats):
-        # NOTE: Given the structure of schedules, the fact that we don't pass any "start_time" it is useful to call sleep at the start of the loop so it may capture that or similar concepts without any parameter passing here.
-        # NOTE: Schedulers are currently using thread.sleep not asyncio.sleep because this is the outer most async loop and there is nothing else important to make progress.
-        schedule.sleep()
-        logger.debug("Iteration %s", stats.iterations + 1)
-
-        tasks = [
-            sampler._run_sampler() for sampler in samplers.values()
-        ]
-
-        watcher_tasks = []
-        for task in asyncio.as_completed(tasks):
-            sample_data = await task
-            name = sample_data.source_name
-
-            if sample_data.raw_data.empty:
-                continue
-
-            existing_data = run_data.collected_data[name]
-            if existing_data is not None:
-                new_ids, returned_ids = existing_data.append(sample_data)
-            else:
-                run_data.collected_data[name] = sample_data
-                existing_data = sample_data
-                new_ids = sample_data.ids["id"]
-                returned_ids = pd.Series()
-
-            # Send to subscribed watchers
-            timedout = existing_data.preform_timeout()
-            watcher_tasks.append(asyncio.create_task(
-                _notify_watchers(sample_data, new_ids, returned_ids, timedout)
-            ))
+    try:
+        while stop_criteria is None or not stop_criteria(stats):
+            # NOTE: Given the structure of schedules, the fact that we don't pass any "start_time" it is useful to call sleep at the start of the loop so it may capture that or similar concepts without any parameter passing here.
+            # NOTE: Waiting asynchronously so watchers, non-awaited actions, flushes, and independently scheduled samplers may make progress
+            await schedule.wait()
+            iteration_start = time.perf_counter()
+            RECORDER.record('run', 'schedule_drift', schedule.drift)
+            logger.debug("Iteration %s", stats.iterations + 1)
+
+            tasks = [
+                _sample(sampler, overruns, stats) for sampler in samplers.values()
+            ]
 
-        # Run all action's after_inter method
-        loop = asyncio.get_running_loop()
-        action_tasks = []
-        for action in actions:
-            task = loop.run_in_executor(None, action.after_iter, stats)
-            if action.AWAIT_AFTER_ITER:
-                action_tasks.append(task)
+            watcher_tasks = []
+            for task in asyncio.as_completed(tasks):
+                sample_data = await task
+                if sample_data is None:
+                    continue
+                watcher_task = _ingest(
+                    run_data,
+                    sample_data,
+                    writer,
+                    after=notify_tasks.get(sample_data.source_name)
+                )
+                if watcher_task is not None:
+                    notify_tasks[sample_data.source_name] = watcher_task
+                    watcher_tasks.append(watcher_task)
 
-        # Wait for actions to complete
-        await asyncio.gather(*action_tasks)
-        # Wait for watchers to complete
-        await asyncio.gather(*watcher_tasks)
+            # Run all action's after_inter method
+            action_tasks = []
+            for i, action in enumerate(actions):
+                task = asyncio.create_task(_after_iter(action, copy(stats), after=action_calls[i]))
+                action_calls[i] = task
+                if action.AWAIT_AFTER_ITER:
+                    action_tasks.append(task)
 
+            # Wait for actions and watchers to complete, only blocking once too many iterations are in flight
+            in_flight.append(asyncio.gather(*action_tasks, *watcher_tasks))
+            while len(in_flight) >= max_in_flight:
+                await in_flight.popleft()
 
-        stats.iterations += 1
-        stats.time_elapsed = utc_now() - run_data.start_time
+            stats.iterations += 1
+            stats.time_elapsed = utc_now() - run_data.start_time
+            RECORDER.record('run', 'iteration', time.perf_counter() - iteration_start)
 
-        # TODO: Store checkpointed data
+            if writer is not None:
+                # Flush in the background, only waiting on the previous flush so they do not pile up
+                if flush_task is not None:
+                    await flush_task
+                flush_task = loop.run_in_executor(None, writer.after_iter, copy(stats))
+
+        # Drain iterations which are still in flight
+        while len(in_flight) != 0:
+            await in_flight.popleft()
+    except asyncio.CancelledError:
+        if len(failed) == 0:
+            raise
+    finally:
+        stop.set()
+        if flush_task is not None:
+            await flush_task
+        await asyncio.gather(*sampler_loops)
+
+    # Watchers with non-blocking overflow policies may still have queued events
+    await drain_listeners()
 
     logger.info("Run ended successfully:\n%s" % stats.get_str())
 
-    return run_data
+async def _sampler_loop(
+    run_data: CalibrationRun,
+    sampler: Sampler,
+    stop: asyncio.Event,
+    writer: Optional[RunWriter],
+    overruns: Dict[str, asyncio.Future],
+    stats: RunStats
+):
+    """
+    Drive a sampler on its own schedule until the run is stopped. Watchers for this sampler are notified in order before the next sample is processed.
+    """
+    stopped = asyncio.create_task(stop.wait())
+    try:
+        while True:
+            wait = asyncio.create_task(sampler.schedule.wait())
+            await asyncio.wait((wait, stopped), return_when=asyncio.FIRST_COMPLETED)
+            if stop.is_set():
+                wait.cancel()
+                break
+            RECORDER.record(sampler.config.get_name(), 'schedule_drift', sampler.schedule.drift)
+
+            watcher_task = _ingest(run_data, await _sample(sampler, overruns, stats), writer)
+            if watcher_task is not None:
+                await watcher_task
+    finally:
+        stopped.cancel()
+
+async def _sample(
+    sampler: Sampler,
+    overruns: Dict[str, asyncio.Future],
+    stats: RunStats
+) -> Optional[SamplerData]:
+    """
+    Take a sample, abandoning it if the sampler does not return within its timeout. Abandoned samples are counted in `stats.missed_samples`.
+
+    Returns:
+        Optional[SamplerData]: The sample, None if it was abandoned or skipped.
+    """
+    name = sampler.config.get_name()
+    overrun = overruns.get(name)
+    if overrun is not None:
+        if not overrun.done():
+            logger.warning("Sampler '%s' is still running from a previous sample, skipping." % name)
+            stats.missed_samples += 1
+            return None
+        del overruns[name]
+
+    task = asyncio.ensure_future(sampler._run_sampler())
+    if sampler.timeout is None:
+        return await task
+
+    try:
+        # NOTE: Shielded so the timeout does not cancel the task, cancellation is decided below
+        return await asyncio.wait_for(asyncio.shield(task), sampler.timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Sampler '%s' did not return within %s seconds, abandoning sample." % (name, sampler.timeout))
+        stats.missed_samples += 1
 
-async def _chain(*args):
-    for arg in args:
-        await arg
+        if isinstance(sampler, AsyncSampler):
+            task.cancel()
+        else:
+            # NOTE: Threads can not be cancelled, samples are skipped until this one finishes
+            overruns[name] = task
+        task.add_done_callback(_discard_result)
+        return None
+
+def _discard_result(future: asyncio.Future):
+    # Retrieve the exception of abandoned samples so it is not reported as never retrieved
+    if not future.cancelled():
+        future.exception()
+
+def _ingest(
+    run_data: CalibrationRun,
+    sample_data: Optional[SamplerData],
+    writer: Optional[RunWriter],
+    after: Optional[asyncio.Task] = None
+) -> Optional[asyncio.Task]:
+    """
+    Store the data from a sample in the run and start notifying watchers.
+
+    Args:
+        after (Optional[asyncio.Task], optional): Watchers are only notified once this task completes. Defaults to None.
+
+    Returns:
+        Optional[asyncio.Task]: Task notifying the watchers, None if the sample was missed, empty, or nothing is subscribed to the sampler.
+    """
+    if sample_data is None or sample_data.raw_data.empty:
+        return None
+
+    existing_data = run_data.collected_data[sample_data.source_name]
+    with RECORDER.time(sample_data.source_name, 'append'):
+        new_ids, returned_ids = existing_data.append(sample_data)
+
+    if writer is not None:
+        writer.append(sample_data)
+        if existing_data.retention is not None:
+            with RECORDER.time(sample_data.source_name, 'evict'):
+                existing_data.evict(
+                    writer.durable_rows(sample_data.source_name),
+                    writer.sampler_path(sample_data.source_name)
+                )
+
+    # Send to subscribed watchers
+    with RECORDER.time(sample_data.source_name, 'timeout'):
+        timedout = existing_data.preform_timeout()
+    plan = dispatch_plan(sample_data.source_type, EVENTS)
+    if len(plan) == 0:
+        return None
+
+    notify = _notify_watchers(sample_data, new_ids, returned_ids, timedout, plan)
+    if after is not None and not after.done():
+        notify = _after(after, notify)
+
+    return asyncio.create_task(notify)
+
+def _timed_after_iter(action: Action, stats: RunStats):
+    with RECORDER.time(type(action).__name__, 'after_iter'):
+        action.after_iter(stats)
+
+async def _after_iter(action: Action, stats: RunStats, after: Optional[asyncio.Task] = None):
+    if after is not None:
+        # NOTE: Errors of the previous call are reported with its own iteration
+        await asyncio.wait((after,))
+    await asyncio.get_running_loop().run_in_executor(None, _timed_after_iter, action, stats)
+
+async def _after(after: asyncio.Task, notify: Coroutine):
+    # NOTE: A failed previous notification was already reported with its own iteration, this sample is still notified
+    try:
+        await after
+    finally:
+        await notify
 
 async def _notify_watchers(
     sample_data: SamplerData,
     new_ids: pd.Series,
     returned_ids: pd.Series,
-    gone_ids: pd.Series
+    gone_ids: pd.Series,
+    plan: Optional[FrozenSet[str]] = None
 ):
-    unordered_tasks = []
-    unordered_tasks.append(
-        asyncio.create_task(emit(
-            (sample_data.source_type, "new-sample"),
-            kind=sample_data.source_type,
-            records=sample_data.data
-        ))
-    )
+    """
+    Emit the events for a single sample.
 
-    raw_data = sample_data.raw_data
-    updates_issues = []
-    first_id_records = (
-        raw_data[raw_data['id'].isin(new_ids)]
-        .groupby("id")
-        .head(1)
-    )
-    for _, record in first_id_records.iterrows():
-        # NOTE: Chain is used b/c the order of id-found / id-updates is strictly defined.
-        unordered_tasks.append(asyncio.create_task(_chain(
-            emit(
-                (sample_data.source_type, "id-found"),
-                kind=sample_data.source_type,
-                id=record['id'],
-                record=record.drop("id")
-            ),
-            emit(
-                (sample_data.source_type, "id-updates"),
-                kind=sample_data.source_type,
-                id=record['id'],
-                records=raw_data[raw_data['id'] == record['id']].drop(columns='id')
-            )
-        )))
+    Args:
+        plan (Optional[FrozenSet[str]], optional): Events which have listeners, payloads are only built for these. Defaults to None which uses the current subscriptions.
+    """
+    kind = sample_data.source_type
+    data = sample_data.data
+    id_keys = sample_data.id_keys
+    if plan is None:
+        plan = dispatch_plan(kind, EVENTS)
 
-        # Keep track of all updated ids for later
-        updates_issues.append(record['id'])
+    unordered_tasks = []
+    if "new-sample" in plan:
+        unordered_tasks.append(
+            asyncio.create_task(emit(
+                (kind, "new-sample"),
+                kind=kind,
+                records=sample_data.data
+            ))
+        )
+    if "id-gone" in plan:
+        for gone_id in gone_ids.tolist():
+            unordered_tasks.append(asyncio.create_task(
+                emit(
+                    (kind, "id-gone"),
+                    kind=kind,
+                    id=gone_id
+                )
+            ))
 
-    returned_id_records = (
-        raw_data[raw_data['id'].isin(returned_ids)]
-        .groupby("id")
-        .head(1)
-    )
-    for _, record in returned_id_records.iterrows():
-        # NOTE: Chain is used b/c the order of id-returned / id-updates is strictly defined.
-        unordered_tasks.append(asyncio.create_task(_chain(
-            emit(
-                (sample_data.source_type, "id-returned"),
-                kind=sample_data.source_type,
-                id=record['id'],
-                record=record.drop("id")
-            ),
-            emit(
-                (sample_data.source_type, "id-updates"),
-                kind=sample_data.source_type,
-                id=record['id'],
-                records=raw_data[raw_data['id'] == record['id']].drop(columns='id')
-            )
-        )))
+    # NOTE: All per-id slices are taken from a single pass over the sample, grouping on the integer id keys
+    grouped = None
+    if "id-updates" in plan or "id-updates-batch" in plan:
+        grouped = data.groupby(id_keys, sort=False, observed=True)
+        # Compute the groups up front so sync listeners in other threads do not race to do so
+        grouped.indices
+    first_records = None
+    if "id-found" in plan or "id-returned" in plan:
+        first = ~id_keys.duplicated().to_numpy()
+        first_records = data[first].set_axis(id_keys[first].astype(object), axis=0)
 
-        updates_issues.append(record['id'])
+    async def _ordered():
+        # NOTE: The order of id-found / id-returned before id-updates is strictly defined.
+        ordered_tasks = []
+        if "id-found" in plan:
+            for id in new_ids.tolist():
+                ordered_tasks.append(
+                    emit(
+                        (kind, "id-found"),
+                        kind=kind,
+                        id=id,
+                        record=first_records.loc[id]
+                    )
+                )
+        if "id-returned" in plan:
+            for id in returned_ids.tolist():
+                ordered_tasks.append(
+                    emit(
+                        (kind, "id-returned"),
+                        kind=kind,
+                        id=id,
+                        record=first_records.loc[id]
+                    )
+                )
+        await asyncio.gather(*ordered_tasks)
 
-    # For any record which did not get newly or re-discovered, issue updates for those also
-    simple_updates = (
-        raw_data[~raw_data['id'].isin(updates_issues)]
-    )
-    for id, records in simple_updates.groupby('id'):
-        # Note no _chain(...) use here
-        unordered_tasks.append(asyncio.create_task(
-            emit(
-                (sample_data.source_type, "id-updates"),
-                kind=sample_data.source_type,
-                id=id,
-                records=records.drop(columns='id')
-            )
-        ))
-
-    for gone_id in gone_ids.values:
-        unordered_tasks.append(asyncio.create_task(
-            emit(
-                (sample_data.source_type, "id-gone"),
-                kind=sample_data.source_type,
-                id=gone_id
+        update_tasks = []
+        if "id-updates-batch" in plan:
+            update_tasks.append(
+                emit(
+                    (kind, "id-updates-batch"),
+                    kind=kind,
+                    grouped=grouped
+                )
             )
-        ))
-    
-    await asyncio.gather(*unordered_tasks)
\ No newline at end of file
+        if "id-updates" in plan:
+            for id, records in grouped:
+                update_tasks.append(
+                    emit(
+                        (kind, "id-updates"),
+                        kind=kind,
+                        id=id,
+                        records=records
+                    )
+                )
+        await asyncio.gather(*update_tasks)
+
+    await asyncio.gather(_ordered(), *unordered_tasks)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import pandas as pd
+
+from mcal.samplers.base import SamplerData
+from mcal.utils.instrument import RECORDER
+from mcal.utils.logging import get_logger
+from mcal.utils.pandas import FILE_TYPES, concat_frames, write_frame
+
+if TYPE_CHECKING:
+    from .models import CalibrationRun, RunStats
+
+logger = get_logger(__name__)
+
+class RunWriter:
+    """
+    Streams sampler data to disk while a run is in progress. Each flush writes the batches collected since the previous flush as a new segment in a per-sampler folder, so a crash only loses the data collected since the last flush.
+    """
+    def __init__(
+        self,
+        save_directory: Optional[str] = None,
+        name: Optional[str] = None,
+        flush_every: int = 1,
+        data_type: str = 'csv'
+    ):
+        if flush_every < 1:
+            raise ValueError("Flush cadence must be at least one iteration, received: %s" % flush_every)
+        if data_type not in FILE_TYPES:
+            raise NotImplementedError("Writing not implemented for file type: '%s'" % data_type)
+
+        self.save_directory = save_directory
+        self.name = name
+        self.flush_every = flush_every
+        self.data_type = data_type
+
+        self.folder_path: Optional[str] = None
+        self.closed = False
+
+        self._pending: Dict[str, List[pd.DataFrame]] = {}
+        self._segments: Dict[str, int] = {}
+        # Rows of each sampler which have been written, batches are written in the order they were appended
+        self._durable_rows: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def open(self, run: CalibrationRun) -> str:
+        """
+        Create the run folder and write the config up front.
+
+        Args:
+            run (CalibrationRun): The run which will be written.
+
+        Returns:
+            str: Path to the run folder.
+        """
+        assert self.folder_path is None, "Writer has already been opened."
+
+        save_directory = self.save_directory
+        if save_directory is None:
+            save_directory = 'mcal_run_data'
+        name = self.name
+        if name is None:
+            name = run.gen_name()
+
+        folder_path = os.path.join(save_directory, name)
+        if os.path.exists(folder_path):
+            raise RuntimeError("Write path already exists: %s" % folder_path)
+
+        os.makedirs(folder_path)
+        logger.info("Writing sample run to directory: %s" % folder_path)
+
+        run.config.save(os.path.join(folder_path, "config.yml"))
+        self.folder_path = folder_path
+
+        return folder_path
+
+    def append(self, sample_data: SamplerData):
+        """
+        Queue a batch from a single sample to be written on the next flush.
+        """
+        assert not self.closed, "Cannot append to closed writer."
+
+        with self._pending_lock:
+            if sample_data.source_name not in self._pending:
+                self._pending[sample_data.source_name] = []
+            self._pending[sample_data.source_name].append(sample_data.raw_data)
+
+    def after_iter(self, stats: RunStats):
+        if stats.iterations % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        assert self.folder_path is not None, "Writer must be opened before flushing."
+
+        with self._flush_lock:
+            with self._pending_lock:
+                pending = self._pending
+                self._pending = {}
+
+            for name, batches in pending.items():
+                if len(batches) == 0:
+                    continue
+
+                segment = self._segments.get(name, 0)
+                path = SamplerData.segment_path(self.folder_path, name, segment)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                with RECORDER.time(name, 'flush'):
+                    write_frame(
+                        path,
+                        concat_frames(batches),
+                        file_type=self.data_type
+                    )
+                self._segments[name] = segment + 1
+                self._durable_rows[name] = self._durable_rows.get(name, 0) + sum(len(batch) for batch in batches)
+
+    def durable_rows(self, name: str) -> int:
+        """
+        Number of rows of a sampler which have been written to disk, these are the first rows appended for the sampler.
+        """
+        return self._durable_rows.get(name, 0)
+
+    def sampler_path(self, name: str) -> str:
+        """
+        Path to the folder holding the segments of a sampler.
+        """
+        assert self.folder_path is not None, "Writer must be opened before data is written."
+        return os.path.join(self.folder_path, name)
+
+    def close(self) -> str:
+        """
+        Flush any remaining data, after this no more data may be appended.
+
+        Returns:
+            str: Path to the run folder.
+        """
+        if not self.closed:
+            if self.folder_path is not None:
+                self.flush()
+            self.closed = True
+
+        return self.folder_path
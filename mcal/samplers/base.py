@@ -7,25 +7,59 @@ from dataclasses import dataclass
 from datetime import timedelta
 from importlib.metadata import entry_points
 from itertools import compress
-from typing import TYPE_CHECKING, Dict, Optional, Tuple, Type, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Type, Union
 
+import numpy as np
 import pandas as pd
 
+from mcal.utils.ids import IdIndex, IdTable
+from mcal.utils.instrument import RECORDER
 from mcal.utils.logging import LogDeduplicate, get_logger
-from mcal.utils.pandas import load_dtypes, save_dtypes
+from mcal.utils.pandas import (
+    DTYPES_SUFFIX,
+    ChunkedDataFrame,
+    DtypeCompactor,
+    concat_frames,
+    read_frame,
+    read_schema,
+    write_frame,
+)
 from mcal.utils.time import utc_now
 
 if TYPE_CHECKING:
     from mcal.config import SamplerConfig
+    from mcal.schedules import Schedule
 
 logger = get_logger(__name__)
 dedup = LogDeduplicate()
 
 _LOADED_SAMPLERS: Optional[Dict[str, Sampler]] = None
 
+SEGMENT_PREFIX = "part-"
+SEGMENT_FORMAT = SEGMENT_PREFIX + "%05d"
+
+@dataclass
+class RetentionPolicy:
+    """
+    How much of a sampler's data is kept in memory during a run, older rows are evicted once they have been written to disk. Rows are evicted if either limit is exceeded.
+    """
+    # Rows older than this are evicted
+    max_age: Optional[timedelta] = None
+    # Only this many of the most recent rows are kept
+    max_rows: Optional[int] = None
+
 class Sampler(ABC):
     ID_TIMEOUT: timedelta = timedelta(minutes=30)
     config: SamplerConfig
+    # Set when the sampler is configured with its own schedule, otherwise the run level schedule is used
+    schedule: Optional[Schedule] = None
+    # Seconds after which a sample is abandoned, set from the config
+    timeout: Optional[float] = None
+    # Limits the data kept in memory during a run, set from the config
+    retention: Optional[RetentionPolicy] = None
+    # Convert samples to compact dtypes (categoricals, downcast numerics) as they are ingested, see `DtypeCompactor`
+    COMPACT_DTYPES: bool = True
+    _compactor: Optional[DtypeCompactor] = None
 
     def __init__(self):
         pass
@@ -34,12 +68,19 @@ class Sampler(ABC):
     def sample(self) -> Union[pd.Series, pd.DataFrame]:
         pass
 
+    def close(self):
+        """
+        Release anything the sampler holds across samples, such as thread pools. Called once when the run ends.
+        """
+        pass
+
     async def _run_sampler(self) -> SamplerData:
         """
         Small wrapper for sampler execution to:
-        1. Make synchronous sampler async.
+        1. Make synchronous sampler async (`AsyncSampler`s are awaited directly).
         2. Do post processing on the sampler output
-            -> Add timestamp if not supplied
+            -> Add timestamp if not supplied, otherwise normalize it to UTC
+            -> Compact dtypes if `COMPACT_DTYPES` is set
             -> Create `SamplerData` object from DataFrame / Series
     
         Returns:
@@ -47,10 +88,14 @@ class Sampler(ABC):
         """
         loop = asyncio.get_running_loop()
 
-        # NOTE: This is to prevent this from being a blocking call, allowing other async tasks to make progress
-        # Reference: https://stackoverflow.com/a/43263397/11325551
         sample_time = utc_now()
-        sample = await loop.run_in_executor(None, self.sample)
+        with RECORDER.time(self.config.get_name(), 'sample'):
+            if isinstance(self, AsyncSampler):
+                sample = await self.sample()
+            else:
+                # NOTE: This is to prevent this from being a blocking call, allowing other async tasks to make progress
+                # Reference: https://stackoverflow.com/a/43263397/11325551
+                sample = await loop.run_in_executor(None, self.sample)
 
         assert isinstance(sample, (pd.Series, pd.DataFrame)), "Sampler '%s' returned value which is not an instance of 'Sample': %s" % (self.__class__.__name__, sample)
 
@@ -61,6 +106,17 @@ class Sampler(ABC):
             sample['timestamp'] = sample_time
         else:
             assert pd.api.types.is_datetime64_any_dtype(sample['timestamp']), f"Sampler '{self.__class__.__name__}' returned 'timestamp' which is not an instance of datetime"
+            # NOTE: Timestamps are compared against `utc_now()` (e.g. retention), naive timestamps are assumed to be UTC
+            if sample['timestamp'].dt.tz is None:
+                sample['timestamp'] = sample['timestamp'].dt.tz_localize('UTC')
+            elif str(sample['timestamp'].dt.tz) != 'UTC':
+                sample['timestamp'] = sample['timestamp'].dt.tz_convert('UTC')
+
+        if self.COMPACT_DTYPES:
+            if self._compactor is None:
+                # NOTE: Kept per sampler so the dtype of a column is stable across samples
+                self._compactor = DtypeCompactor()
+            sample = self._compactor.compact(sample)
 
         return SamplerData.from_dataframe(
             source_name=self.config.get_name(),
@@ -68,12 +124,108 @@ class Sampler(ABC):
             source_type=type(self)
         )
 
-@dataclass
+class AsyncSampler(Sampler):
+    """
+    Sampler which is awaited directly on the event loop instead of being run in the default executor. Use this for I/O bound samplers so they do not consume thread pool slots.
+    """
+    @abstractmethod
+    async def sample(self) -> Union[pd.Series, pd.DataFrame]:
+        pass
+
+def _match_tz(timestamp: pd.Timestamp, timestamps: pd.Series) -> pd.Timestamp:
+    tz = getattr(timestamps.dtype, 'tz', None)
+    if tz is None:
+        return timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp.tz_convert(tz)
+
 class SamplerData:
-    raw_data: pd.DataFrame
-    ids: pd.DataFrame
-    source_name: str
-    source_type: Optional[Type[Sampler]]
+    def __init__(
+        self,
+        raw_data: pd.DataFrame,
+        ids: pd.DataFrame,
+        source_name: str,
+        source_type: Optional[Type[Sampler]],
+    ):
+        # NOTE: Ids are interned into integer keys, rows and the id index only store the keys
+        self._id_table = IdTable()
+        # NOTE: Batches are stored as chunks so that `append(...)` does not need to copy the full history each iteration
+        self._raw_data = ChunkedDataFrame(self._intern_rows(raw_data))
+        self._ids = IdIndex.from_frame(ids.assign(id=self._id_table.intern(ids["id"])))
+        self.source_name = source_name
+        self.source_type = source_type
+
+        self.retention: Optional[RetentionPolicy] = None
+        # Rows evicted from memory, these are the first rows of the data written to `_spill_path`
+        self._evicted = 0
+        self._spill_path: Optional[str] = None
+        # Evicted rows read back from disk, only kept until more rows are evicted
+        self._spilled: Optional[pd.DataFrame] = None
+
+    def _intern_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        if "id" not in df.columns:
+            return df
+        return df.assign(id=self._id_table.intern(df["id"]))
+
+    def _restore_ids(self, keys: pd.Series) -> pd.Series:
+        return pd.Series(self._id_table.lookup(keys), name="id", dtype=object)
+
+    @property
+    def raw_data(self) -> pd.DataFrame:
+        """
+        All data, including rows which were evicted from memory by the retention policy (these are read back from disk).
+        """
+        df = self._raw_data.to_frame()
+        if "id" in df.columns:
+            df = df.assign(id=self._id_table.lookup(df["id"]))
+        if self._evicted == 0:
+            return df
+
+        return concat_frames([self._read_spilled(), df])
+
+    def _read_spilled(self) -> pd.DataFrame:
+        """
+        Read the evicted rows back from disk, only reading the segments which hold them.
+        """
+        if self._spilled is not None and len(self._spilled) == self._evicted:
+            return self._spilled
+
+        segments = []
+        rows = 0
+        for file in self._data_files(self._spill_path):
+            if rows >= self._evicted:
+                break
+            segment = read_frame(file)
+            segments.append(segment)
+            rows += len(segment)
+
+        self._spilled = concat_frames(segments).iloc[:self._evicted]
+        return self._spilled
+
+    @property
+    def evicted(self) -> int:
+        """Number of rows which have been evicted from memory."""
+        return self._evicted
+
+    @property
+    def id_keys(self) -> pd.Series:
+        """
+        The id of each row held in memory as a categorical backed by the integer keys, used to group rows without comparing ids.
+        """
+        df = self._raw_data.to_frame()
+        return pd.Series(self._id_table.categorical(df["id"]), index=df.index, name="id")
+
+    @raw_data.setter
+    def raw_data(self, df: pd.DataFrame):
+        self._raw_data = ChunkedDataFrame(self._intern_rows(df))
+        self._evicted = 0
+        self._spill_path = None
+        self._spilled = None
+
+    @property
+    def ids(self) -> pd.DataFrame:
+        ids = self._ids.to_frame()
+        ids["id"] = self._restore_ids(ids["id"])
+        return ids
 
     @classmethod
     def from_dataframe(
@@ -88,7 +240,7 @@ class SamplerData:
 
         # Create ids df by grabbing latest timestamp from each
         ids = df[["id", "timestamp"]]
-        ids = ids.groupby(["id"]).tail(1).rename(columns={'timestamp': 'last_seen'})
+        ids = ids.drop_duplicates("id", keep="last").rename(columns={'timestamp': 'last_seen'})
         ids["present"] = True # TODO: Make this a computation?
 
         data = cls(
@@ -100,10 +252,24 @@ class SamplerData:
 
         return data
 
+    @classmethod
+    def empty(
+        cls,
+        source_name: str,
+        source_type: Optional[Type[Sampler]] = None
+    ) -> SamplerData:
+        return cls.from_dataframe(
+            source_name=source_name,
+            df=pd.DataFrame(columns=['id', 'timestamp']),
+            source_type=source_type
+        )
+
     @property
     def data(self) -> pd.DataFrame:
         # TODO: This is probably inefficient for consecutive calls without mutation to `raw_data`.
-        return self.raw_data.drop(columns='id')
+        if self._evicted != 0:
+            return self.raw_data.drop(columns='id')
+        return self._raw_data.to_frame().drop(columns='id')
 
     def append(self, other: SamplerData) -> Tuple[pd.Series, pd.Series]:
         """
@@ -115,87 +281,162 @@ class SamplerData:
         Returns:
             Set[str]: A set of ids which were introduced by `other.
         """
-        assert len(other.ids[other.ids["present"] == False]) == 0, "Unexpected usage of append, `other` object should always be from most recent sample"
+        other_ids = other._ids.to_frame()
+        assert len(other_ids[other_ids["present"] == False]) == 0, "Unexpected usage of append, `other` object should always be from most recent sample"
 
-        # Note that we are only selecting the '"id"' column from the ids dataframe for each of these
-        ids_returned = self.ids[self.ids["present"] == False]
-        ids_returned = ids_returned[ids_returned["id"].isin(other.ids["id"])]["id"]
-        ids_new = other.ids[~other.ids["id"].isin(self.ids["id"])]["id"]
+        # Map the keys of `other` to keys of this table, only the distinct ids of the sample are hashed
+        remap = self._id_table.intern(other._id_table.ids)
 
-        self.ids = pd.concat(
-            [
-                # NOTE: Order is important here since we are only keeping head(1)
-                other.ids,
-                self.ids
-            ],
-            ignore_index=True, # Don't 100% understand this param
-        )
-        self.ids = self.ids.groupby("id").head(1) # Keep one record per id, preferring the ones from `other` which should be the newer dataframe.
-
-        self.raw_data = pd.concat(
-            [
-                self.raw_data,
-                other.raw_data
-            ],
-            ignore_index=True, # Don't 100% understand this param
+        ids_new, ids_returned = self._ids.update(
+            pd.Series(remap[other_ids["id"].to_numpy(dtype=np.int64)]),
+            other_ids["last_seen"]
         )
 
-        return ids_new, ids_returned
+        rows = other._raw_data.to_frame()
+        if "id" in rows.columns:
+            rows = rows.assign(id=remap[rows["id"].to_numpy(dtype=np.int64)])
+        self._raw_data.append(rows)
+
+        return self._restore_ids(ids_new), self._restore_ids(ids_returned)
+
+    def evict(self, durable_rows: int, spill_path: str) -> int:
+        """
+        Evict rows from memory which are no longer needed by the retention policy. Only rows which have been written to disk are evicted.
+
+        Args:
+            durable_rows (int): Number of rows, from the start of the data, which have been written to disk.
+            spill_path (str): Path to the written data, used to read back evicted rows.
+
+        Returns:
+            int: Number of rows evicted.
+        """
+        policy = self.retention
+        durable = durable_rows - self._evicted
+        if policy is None or durable <= 0:
+            return 0
+
+        excess = 0
+        if policy.max_rows is not None:
+            excess = max(excess, len(self._raw_data) - policy.max_rows)
+        if policy.max_age is not None:
+            cutoff = pd.Timestamp(utc_now() - policy.max_age)
+            # NOTE: Rows are in ingest order so only the leading rows are considered
+            excess = max(excess, self._raw_data.leading_rows(
+                lambda chunk: chunk["timestamp"] < _match_tz(cutoff, chunk["timestamp"])
+            ))
+
+        evict = min(excess, durable)
+        if evict > 0:
+            self._raw_data.drop_head(evict)
+            self._evicted += evict
+            self._spill_path = spill_path
+            # NOTE: Dropped so evicted rows are not held in memory during the run
+            self._spilled = None
+
+        return evict
 
     def preform_timeout(self) -> pd.Series:
         assert self.source_type is not None, "Can not read ID_TIMEOUT since source type is None"
 
-        self.ids["age"] = utc_now() - self.ids['last_seen']
-        self.ids["present_update"] = self.ids["age"] <= self.source_type.ID_TIMEOUT
+        timedout = self._restore_ids(self._ids.timeout(utc_now(), self.source_type.ID_TIMEOUT))
+        if len(timedout) != 0:
+            logger.debug("IDs timed out:\n%s" % timedout)
+
+        return timedout
+
+    def write(self, folder_path: str, file_type: str = "csv"):
+        write_frame(
+            os.path.join(folder_path, self.source_name),
+            self.raw_data,
+            file_type=file_type
+        )
+
+    @staticmethod
+    def segment_path(folder_path: str, source_name: str, segment: int) -> str:
+        """
+        Path (without extension) of a segment written incrementally during a run. Segments for a sampler are stored in a folder named after the sampler and are loaded back in order by `load(...)`.
+        """
+        return os.path.join(folder_path, source_name, SEGMENT_FORMAT % segment)
+
+    @staticmethod
+    def _data_files(file_path: str) -> List[str]:
+        if not os.path.isdir(file_path):
+            return [file_path]
+
+        # NOTE: Sorted by the segment number, names stop sorting lexically once the number outgrows the zero padding
+        segments = sorted(
+            (
+                file for file in os.listdir(file_path)
+                if file.startswith(SEGMENT_PREFIX) and not file.endswith(DTYPES_SUFFIX)
+            ),
+            key=lambda file: int(file[len(SEGMENT_PREFIX):].split('.', 1)[0])
+        )
+        return [os.path.join(file_path, segment) for segment in segments]
+
+    @classmethod
+    def read_columns(
+        cls,
+        file_path: str,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Read saved sampler data without constructing a `SamplerData` object, optionally only reading some columns.
 
-        logger.debug("IDs ages:\n%s" % self.ids)
+        Args:
+            file_path (str): Path to the saved data file or segments folder.
+            columns (Optional[List[str]], optional): Columns to read. Defaults to None which reads all columns.
 
-        timedout = self.ids[self.ids["present"] != self.ids["present_update"]]
-        assert len(timedout[timedout["present_update"] == True]) == 0, "Internal error, `preform_timeout` would have caused present to go from False to True."
+        Returns:
+            pd.DataFrame: The saved data.
+        """
+        files = cls._data_files(file_path)
+        if len(files) == 0:
+            return pd.DataFrame(columns=['id', 'timestamp'] if columns is None else columns)
+        if len(files) == 1:
+            return read_frame(files[0], columns=columns)
 
-        # Clean up intermediate columns
-        self.ids.drop(columns=["age", "present"], inplace=True)
-        self.ids.rename(columns={"present_update": "present"}, inplace=True)
+        return concat_frames([read_frame(file, columns=columns) for file in files])
 
-        return timedout["id"]
+    @classmethod
+    def read_schema(cls, file_path: str) -> pd.Series:
+        """
+        Read the dtypes of saved sampler data without loading it.
 
-    def write(self, folder_path: str, file_type: str = "csv"):
-        if file_type == 'csv':
-            path = os.path.join(folder_path, self.source_name + ".csv")
-            dtypes_path = dtypes_path = os.path.join(folder_path, self.source_name + '_dtypes.json')
-            self.raw_data.to_csv(path)
-            save_dtypes(dtypes_path, self.raw_data)
-        else:
-            raise NotImplementedError("SampleData saving not implemented for file type: '%s'" % file_type)
+        **NOTE:** For segments with differing dtypes, the dtype from the first segment containing the column is reported.
+
+        Args:
+            file_path (str): Path to the saved data file or segments folder.
+
+        Returns:
+            pd.Series: The dtypes indexed by column name.
+        """
+        dtypes = {}
+        for file in cls._data_files(file_path):
+            for column, dtype in read_schema(file).items():
+                dtypes.setdefault(column, dtype)
+
+        return pd.Series(dtypes, dtype=object)
 
     @classmethod
     def load(
         cls,
         file_path: str,
     ) -> SamplerData:
-        name, ext = os.path.splitext(file_path)
-        folder, name = name.rsplit(os.sep, 1)
-
-        if ext == '.csv':
-            dtypes_path = os.path.join(folder, name + "_dtypes.json")
-            if not os.path.isfile(dtypes_path):
-                msg = "File at '%s' should be accompanied by dtypes file at path '%s' but none found" % (file_path, dtypes_path)
-                logger.error(msg)
-                raise RuntimeError(msg)
-
-            dtypes_dict, parse_dates = load_dtypes(dtypes_path)
-            df = pd.read_csv(
-                file_path,
-                dtype=dtypes_dict,
-                parse_dates=parse_dates,
-                index_col=0 # Avoids 'Unnamed: 0' from showing up
-            )
-            return cls.from_dataframe(
-                source_name=name,
-                df=df
-            )
+        if os.path.isdir(file_path):
+            name = os.path.basename(os.path.normpath(file_path))
         else:
-            raise NotImplementedError("SamplerData loading not implemented for file type: '%s'" % ext)
+            name, _ = os.path.splitext(os.path.basename(file_path))
+
+        try:
+            df = cls.read_columns(file_path)
+        except RuntimeError as err:
+            logger.error(err)
+            raise
+
+        return cls.from_dataframe(
+            source_name=name,
+            df=df
+        )
 
 
 def _load_samplers() -> Dict[str, Sampler]:
@@ -1,39 +1,28 @@
+from typing import Optional
+
 import pandas as pd
-from kubernetes import client, config
 
 from mcal import Sampler
+from mcal.utils.resources import ResourceRegistry
 
+from .dask_prom import get_k8_resources
 
-class DaskK8Cluster(Sampler):
-    def __init__(self):
-        config.load_kube_config()
 
-        self.v1_api = client.CoreV1Api()
-        self.api_client = client.ApiClient() 
-        self.cr_api = client.CustomObjectsApi(self.api_client) # NOTE: CoreV1Api does not have 'client_size_validation'
+class DaskK8Cluster(Sampler):
+    def __init__(self, resources: Optional[ResourceRegistry] = None):
+        # NOTE: Clusters and worker groups are read from watches shared by all samplers instead of listed each sample
+        self.informers = get_k8_resources(resources).informers
 
     def sample(self) -> pd.DataFrame:
-        # Make all requests as close in time as possible
-        cluster_crds = self.cr_api.list_cluster_custom_object(
-            # Still a little iffy on this, like how I don't specify 'DaskCluster' anywhere BUT do specify 'daskclusters' not sure what type of filter is active
-            # kubectl get crd
-            # kubectl describe crds daskclusters.kubernetes.dask.org | less
-            group='kubernetes.dask.org',
-            plural='daskclusters', 
-            version='v1', # Would be nice to pull automatically
-        )
-        workergroup_crds = self.cr_api.list_cluster_custom_object(
-            group='kubernetes.dask.org',
-            plural='daskworkergroups', 
-            version='v1', # Would be nice to pull automatically
-        )
+        cluster_crds = self.informers.clusters.items()
+        workergroup_crds = self.informers.workergroups.items()
 
         # -------------------------
         # Organize collected data -
         # -------------------------
         # First sort worker groups by namespace / cluster name
         workergroups = {}
-        for item in workergroup_crds['items']:
+        for item in workergroup_crds:
             if item['kind'] != 'DaskWorkerGroup':
                 # TODO: Not sure if this check is need b/c confused by 'list_cluster_custom_object'
                 print(f"Skipping non DaskWorkerGroup resource: {item['kind']}")
@@ -45,7 +34,7 @@ class DaskK8Cluster(Sampler):
             workergroups[(metadata['namespace'], item['spec']['cluster'])] = item
 
         data = []
-        for item in cluster_crds['items']:
+        for item in cluster_crds:
             cluster_info = {}
             if item['kind'] != 'DaskCluster':
                 # TODO: Not sure if this check is need b/c confused by 'list_cluster_custom_object'
@@ -1,17 +1,29 @@
-from http.client import HTTPConnection, RemoteDisconnected
-from typing import Iterable, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPException
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import pandas as pd
 from dask_kubernetes.constants import SCHEDULER_NAME_TEMPLATE
 from kubernetes import client, config
 from kubernetes.stream import portforward
 from kubernetes.stream.ws_client import PortForward
-from prometheus_client.metrics_core import Metric
-from prometheus_client.parser import text_string_to_metric_families
 
 from mcal import Sampler
+from mcal.utils.k8 import DASK_CLUSTER_LABEL, DaskInformers
 from mcal.utils.logging import LogDeduplicate
-from mcal.utils.prometheus import mapper_python_info, metrics_to_pd_series
+from mcal.utils.prometheus import (
+    Family,
+    MetricFilter,
+    create_metric_filter,
+    long_frame,
+    mapper_python_info,
+    metrics_to_dict,
+    metrics_to_long,
+    parse_exposition,
+)
+from mcal.utils.resources import ResourceRegistry
+from mcal.utils.time import utc_now
 
 dedup = LogDeduplicate()
 
@@ -35,12 +47,42 @@ class PortForwardConnection(HTTPConnection):
         self.sock = None
         super().close()
 
+    @property
+    def connected(self) -> bool:
+        return self.ws_portforward.connected
+
+    def close_all(self):
+        """Close the HTTP connection and the port-forward beneath it."""
+        self.close()
+        self.ws_portforward.close()
+
+# Connections are pooled by (namespace, pod, port)
+ConnKey = Tuple[str, str, int]
+
+def _pod_names(pods: list, must_be_ready: bool) -> List[str]:
+    if must_be_ready:
+        pods = list(filter(
+            lambda item: (
+                item.status.container_statuses is not None
+                and all(status.ready for status in item.status.container_statuses)
+            ),
+            pods
+        ))
+    return [item.metadata.name for item in pods]
+
 class K8Resources:
     def __init__(self):
         config.load_kube_config()
 
         self.v1_api = client.CoreV1Api()
         self.cr_api = client.CustomObjectsApi()
+        # NOTE: Discovery is served from watches shared by all samplers, the API is only called for port-forwards
+        self.informers = DaskInformers()
+        self.informers.start()
+
+        # NOTE: Port-forwards are kept open across samples, scrapes may run from several threads
+        self._connections: Dict[ConnKey, PortForwardConnection] = {}
+        self._connections_lock = threading.Lock()
 
     def find_clusters(
         self,
@@ -48,16 +90,7 @@ class K8Resources:
         find_workers: bool = False,
     ) -> list:
         clusters = []
-        cluster_crds = self.cr_api.list_cluster_custom_object(
-            # Still a little iffy on this, like how I don't specify 'DaskCluster' anywhere BUT do specify 'daskclusters' not sure what type of filter is active
-            # kubectl get crd
-            # kubectl describe crds daskclusters.kubernetes.dask.org | less
-            group='kubernetes.dask.org',
-            plural='daskclusters', 
-            version='v1', # Would be nice to pull automatically
-        )
-
-        for item in cluster_crds['items']:
+        for item in self.informers.clusters.items():
             if item['kind'] != 'DaskCluster':
                 # TODO: Not sure if this check is need b/c confused by 'list_cluster_custom_object'
                 dedup(print, f"Skipping non DaskCluster resource: {item['kind']}")
@@ -80,13 +113,9 @@ class K8Resources:
 
     def find_schedulers(self, cluster: dict, must_be_ready: bool = True):
         """Update cluster with schedulers"""
-        try:
-            scheduler_service = SCHEDULER_NAME_TEMPLATE.format(cluster_name=cluster['name'])
-            service = self.v1_api.read_namespaced_service(
-                name=scheduler_service,
-                namespace=cluster['namespace'],
-            )
-        except client.ApiException:
+        scheduler_service = SCHEDULER_NAME_TEMPLATE.format(cluster_name=cluster['name'])
+        service = self.informers.services.get(cluster['namespace'], scheduler_service)
+        if service is None:
             dedup(
                 print,
                 f"Unable to get scheduler name '{scheduler_service}' for cluster '{cluster['name']}' in namespace '{cluster['namespace']}'"
@@ -94,55 +123,25 @@ class K8Resources:
             cluster['scheduler_pods'] = []
             return
 
-
-        service_selector = service.spec.selector
-        service_selector = ",".join(
-            [f"{k}={v}" for k, v in service_selector.items()]
-        )
-        pods = self.v1_api.list_namespaced_pod(
+        pods = self.informers.pods.select(
             namespace=cluster['namespace'],
-            label_selector=service_selector
+            labels=service.spec.selector
         )
-        if must_be_ready:
-            pods_list = list(filter(
-                lambda item: (
-                    item.status.container_statuses is not None
-                    and all(status.ready for status in item.status.container_statuses)
-                ),
-                pods.items
-            ))
-        else:
-            pods_list = pods.items
-        pod_names = [item.metadata.name for item in pods_list]
-
-        cluster['scheduler_pods'] = pod_names
+        cluster['scheduler_pods'] = _pod_names(pods, must_be_ready)
 
     def find_workers(self, cluster: dict, must_be_ready: bool = True):
         # Reference: https://github.com/dask/dask-kubernetes/blob/547c911efc58fa003d4cb8d49fcd58a7536fa7e7/dask_kubernetes/operator/controller/controller.py#L145-L150
-        selector = ",".join((
-            f"dask.org/cluster-name={cluster['name']}",
-            "dask.org/component=worker",
+        selector = {
+            DASK_CLUSTER_LABEL: cluster['name'],
+            "dask.org/component": "worker",
             # TODO: Worker group name?
-        ))
+        }
 
-        pods = self.v1_api.list_namespaced_pod(
+        pods = self.informers.pods.select(
             namespace=cluster['namespace'],
-            label_selector=selector
+            labels=selector
         )
-
-        if must_be_ready:
-            pods_list = list(filter(
-                lambda item: (
-                    item.status.container_statuses is not None
-                    and all(status.ready for status in item.status.container_statuses)
-                ),
-                pods.items
-            ))
-        else:
-            pods_list = pods.items
-        pod_names = [item.metadata.name for item in pods_list]
-
-        cluster['worker_pods'] = pod_names
+        cluster['worker_pods'] = _pod_names(pods, must_be_ready)
 
     def get_conn(self, namespace: str, pod_name: str, port: int) -> PortForwardConnection:
         pf: PortForward = portforward(
@@ -158,31 +157,112 @@ class K8Resources:
         )
         return conn
 
+    def pooled_conn(self, namespace: str, pod_name: str, port: int) -> PortForwardConnection:
+        """
+        Get the open connection to a pod's port, creating a port-forward if there is none or it was disconnected.
+        """
+        key = (namespace, pod_name, port)
+        with self._connections_lock:
+            conn = self._connections.get(key)
+            if conn is not None and conn.connected:
+                return conn
+
+        if conn is not None:
+            self.close_conn(key)
+
+        conn = self.get_conn(
+            namespace=namespace,
+            pod_name=pod_name,
+            port=port
+        )
+        with self._connections_lock:
+            self._connections[key] = conn
+
+        return conn
+
+    def close_conn(self, key: ConnKey):
+        with self._connections_lock:
+            conn = self._connections.pop(key, None)
+
+        if conn is not None:
+            try:
+                conn.close_all()
+            except Exception:
+                # Already broken, nothing else to clean up
+                pass
+
+    def evict_conns(self, live_pods: Iterable[Tuple[str, str]]):
+        """
+        Close pooled connections to pods which no longer exist.
+
+        Args:
+            live_pods (Iterable[Tuple[str, str]]): The `(namespace, pod)` pairs which are still present.
+        """
+        live_pods = set(live_pods)
+        with self._connections_lock:
+            gone = [key for key in self._connections if key[:2] not in live_pods]
+
+        for key in gone:
+            self.close_conn(key)
+
+    def close(self):
+        self.informers.stop()
+
+        with self._connections_lock:
+            keys = list(self._connections)
+
+        for key in keys:
+            self.close_conn(key)
+
+    def discover(self) -> list:
+        """
+        Find all clusters with their scheduler and worker pods, closing pooled connections to pods which are gone.
+        """
+        clusters = self.find_clusters(find_schedulers=True, find_workers=True)
+        self.evict_conns(
+            (cluster['namespace'], pod)
+            for cluster in clusters
+            for pod in cluster['scheduler_pods'] + cluster['worker_pods']
+        )
+
+        return clusters
+
     def pod_prom_sample(
         self,
         namespace: str,
         pod: str,
         port: int,
         endpoint: str = '/metrics',
-        write_rsp: bool = False
-    ) -> Optional[Iterable[Metric]]:
-        # TODO(20): Leave connection open?
-        conn = self.get_conn(
-            namespace=namespace,
-            pod_name=pod,
-            port=port
-        )
-        conn.request('GET', endpoint)
-        try:
-            rsp = conn.getresponse().read().decode()
-        except RemoteDisconnected:
+        write_rsp: bool = False,
+        metric_filter: Optional[MetricFilter] = None
+    ) -> Optional[Iterable[Family]]:
+        key = (namespace, pod, port)
+
+        rsp = None
+        # NOTE: A pooled port-forward may have been closed by the pod since the last sample, so reconnect once before giving up
+        for _ in range(2):
+            conn = self.pooled_conn(
+                namespace=namespace,
+                pod_name=pod,
+                port=port
+            )
+            try:
+                conn.request('GET', endpoint)
+                response = conn.getresponse()
+                rsp = response.read().decode()
+            except (HTTPException, OSError):
+                self.close_conn(key)
+                continue
+
+            if response.will_close:
+                # Server will not accept another request on this connection
+                self.close_conn(key)
+            break
+
+        if rsp is None:
             dedup(print, "WARNING: Pod disconnected before sending response: %s" % pod)
             return None
 
-        # TODO: Combine these
-        conn.ws_portforward.close()
-        conn.close()
-
         # TODO: This is dask (not prom) specific
         if rsp.startswith("# Prometheus metrics are not available"):
             dedup(print, "WARNING: Prometheus is not enabled on scheduler: %s" % pod)
@@ -194,22 +274,104 @@ class K8Resources:
             with open(":".join((namespace, pod)) + '.txt', 'w') as f:
                 f.write(rsp)
 
-        return text_string_to_metric_families(rsp)
+        return parse_exposition(rsp, metric_filter=metric_filter)
+
+# Seconds a discovery result is shared between samplers, short enough that each iteration discovers once
+DISCOVERY_TTL = 1.0
+
+def get_k8_resources(registry: Optional[ResourceRegistry]) -> K8Resources:
+    if registry is None:
+        return K8Resources()
+    return registry.get('k8-resources', K8Resources)
+
+def discover_clusters(
+    resources: K8Resources,
+    registry: Optional[ResourceRegistry],
+    ttl: float = DISCOVERY_TTL
+) -> list:
+    """
+    Discover dask clusters, sharing the result with other samplers of the run for `ttl` seconds.
+    """
+    if registry is None:
+        return resources.discover()
+    return registry.snapshot('dask-discovery', resources.discover, ttl)
+
+LAYOUTS = ('wide', 'long')
+CUSTOM_MAPS = {
+    'python_info': mapper_python_info
+}
+
+def check_layout(layout: str):
+    if layout not in LAYOUTS:
+        raise ValueError("Unknown layout '%s', expected one of: %s" % (layout, LAYOUTS))
+
+def families_to_row(
+    info: dict,
+    families: Optional[Iterable[Family]],
+    layout: str,
+    metric_filter: Optional[MetricFilter]
+):
+    """
+    Add the metrics of a pod to its `info`. For the 'wide' layout this is the updated dict, for the 'long' layout a tuple of the dict and the pod's samples (see `long_frame(...)`), pods without samples (e.g. a failed scrape) get a single row without a metric in the 'long' layout.
+    """
+    if layout == 'long':
+        samples = []
+        if families is not None:
+            mapped, samples = metrics_to_long(families, custom_maps=CUSTOM_MAPS, metric_filter=metric_filter)
+            info.update(mapped)
+        return info, samples
+
+    if families is not None:
+        info.update(metrics_to_dict(families, custom_maps=CUSTOM_MAPS, metric_filter=metric_filter))
+    return info
+
+def rows_to_frame(rows: list, layout: str) -> pd.DataFrame:
+    if layout == 'long':
+        return long_frame(rows)
+    return pd.DataFrame.from_records(rows)
 
 class DaskPromScheduler(Sampler):
-    def __init__(self, discovery: str = 'k8'):
+    def __init__(
+        self,
+        discovery: str = 'k8',
+        discovery_ttl: float = DISCOVERY_TTL,
+        include_metrics: Optional[List[str]] = None,
+        exclude_metrics: Optional[List[str]] = None,
+        include_labels: Optional[List[str]] = None,
+        exclude_labels: Optional[List[str]] = None,
+        layout: str = 'wide',
+        resources: Optional[ResourceRegistry] = None
+    ):
+        """
+        Args:
+            discovery (str, optional): How dask clusters are discovered. Defaults to 'k8'.
+            discovery_ttl (float, optional): Seconds a discovery result is shared with other samplers of the run. Defaults to DISCOVERY_TTL.
+            include_metrics, exclude_metrics, include_labels, exclude_labels (Optional[List[str]], optional): Patterns selecting which metrics / labels become columns, see `MetricFilter`. Defaults to None which keeps everything.
+            layout (str, optional): 'wide' for one column per metric and labels, 'long' for one row per metric and labels which keeps the columns fixed when new label values appear (see `mcal.utils.pandas.to_wide(...)`). Defaults to 'wide'.
+            resources (Optional[ResourceRegistry], optional): Resources shared by the run, injected by the config. Defaults to None.
+        """
         if discovery == 'k8':
-            self.resources = K8Resources()
+            self.resources = get_k8_resources(resources)
         else:
             raise NotImplementedError(f"Dask cluster discovery method not implemented: {discovery}")
 
+        check_layout(layout)
+        self.layout = layout
+        self.registry = resources
+        self.discovery_ttl = discovery_ttl
+        self.metric_filter = create_metric_filter(
+            include_metrics=include_metrics,
+            exclude_metrics=exclude_metrics,
+            include_labels=include_labels,
+            exclude_labels=exclude_labels,
+        )
+
     def sample(self) -> pd.DataFrame:
-        # TODO(20): Use watch api for this stuff? 
-        clusters = self.resources.find_clusters(find_schedulers=True)
+        clusters = discover_clusters(self.resources, self.registry, self.discovery_ttl)
 
         data = []
         for cluster in clusters:
-            cluster_info = pd.Series()
+            cluster_info = {}
             cluster_info['id'] = f"{cluster['namespace']}/{cluster['name']}"
             cluster_info['namespace'] = cluster['namespace']
             cluster_info['cluster_name'] = cluster['name']
@@ -227,59 +389,98 @@ class DaskPromScheduler(Sampler):
             families = self.resources.pod_prom_sample(
                 namespace=cluster['namespace'],
                 pod=scheduler_pod,
-                port=8787
+                port=8787,
+                metric_filter=self.metric_filter
             )
-            if families is not None:
-                cluster_info = pd.concat([
-                    cluster_info,
-                    metrics_to_pd_series(
-                        families,
-                        custom_maps={
-                            'python_info': mapper_python_info
-                        }
-                    )
-                ])
+            data.append(families_to_row(cluster_info, families, self.layout, self.metric_filter))
 
-            data.append(cluster_info)
-
-        return pd.DataFrame(data)
+        return rows_to_frame(data, self.layout)
 
 class DaskPromWorker(Sampler):
-    def __init__(self, discovery: str = 'k8'):
+    def __init__(
+        self,
+        discovery: str = 'k8',
+        max_concurrency: int = 16,
+        discovery_ttl: float = DISCOVERY_TTL,
+        include_metrics: Optional[List[str]] = None,
+        exclude_metrics: Optional[List[str]] = None,
+        include_labels: Optional[List[str]] = None,
+        exclude_labels: Optional[List[str]] = None,
+        layout: str = 'wide',
+        resources: Optional[ResourceRegistry] = None
+    ):
+        """
+        Args:
+            discovery (str, optional): How dask clusters are discovered. Defaults to 'k8'.
+            max_concurrency (int, optional): Maximum number of worker pods scraped at once. Defaults to 16.
+            discovery_ttl (float, optional): Seconds a discovery result is shared with other samplers of the run. Defaults to DISCOVERY_TTL.
+            include_metrics, exclude_metrics, include_labels, exclude_labels (Optional[List[str]], optional): Patterns selecting which metrics / labels become columns, see `MetricFilter`. Defaults to None which keeps everything.
+            layout (str, optional): 'wide' for one column per metric and labels, 'long' for one row per metric and labels which keeps the columns fixed when new label values appear (see `mcal.utils.pandas.to_wide(...)`). Defaults to 'wide'.
+            resources (Optional[ResourceRegistry], optional): Resources shared by the run, injected by the config. Defaults to None.
+        """
         if discovery == 'k8':
-            self.resources = K8Resources()
+            self.resources = get_k8_resources(resources)
         else:
             raise NotImplementedError(f"Dask cluster discovery method not implemented: {discovery}")
 
+        check_layout(layout)
+        self.layout = layout
+        self.registry = resources
+        self.discovery_ttl = discovery_ttl
+        self.metric_filter = create_metric_filter(
+            include_metrics=include_metrics,
+            exclude_metrics=exclude_metrics,
+            include_labels=include_labels,
+            exclude_labels=exclude_labels,
+        )
+
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least one, not: %s" % max_concurrency)
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix='mcal-dask-prom'
+        )
+
+    def close(self):
+        self._executor.shutdown()
+
+    def _scrape_worker(self, cluster: dict, worker_pod: str):
+        worker_info = {}
+        worker_info['id'] = f"{cluster['namespace']}/{cluster['name']}/{worker_pod}"
+        worker_info['namespace'] = cluster['namespace']
+        worker_info['cluster_name'] = cluster['name']
+
+        families = self.resources.pod_prom_sample(
+            namespace=cluster['namespace'],
+            pod=worker_pod,
+            port=8788,
+            # write_rsp=True
+            metric_filter=self.metric_filter
+        )
+        # NOTE: Each pod is timed individually as scrapes complete at different times
+        worker_info['timestamp'] = utc_now()
+
+        # NOTE: Metrics are parsed straight into a dict, the frame is built once all pods are scraped
+        return families_to_row(worker_info, families, self.layout, self.metric_filter)
+
     def sample(self):
-        # TODO(20): Use watch api for this stuff? 
-        clusters = self.resources.find_clusters(find_workers=True)
+        clusters = discover_clusters(self.resources, self.registry, self.discovery_ttl)
+
+        pods = [
+            (cluster, worker_pod)
+            for cluster in clusters
+            for worker_pod in cluster['worker_pods']
+        ]
+
+        # Scrape pods concurrently, results are kept in discovery order
+        data = list(self._executor.map(
+            lambda pod: self._scrape_worker(*pod),
+            pods
+        ))
 
-        data = []
-        for cluster in clusters:
-            for worker_pod in cluster['worker_pods']:
-                worker_info = pd.Series()
-                worker_info['id'] = f"{cluster['namespace']}/{cluster['name']}/{worker_pod}"
-                worker_info['namespace'] = cluster['namespace']
-                worker_info['cluster_name'] = cluster['name']
-
-                families = self.resources.pod_prom_sample(
-                    namespace=cluster['namespace'],
-                    pod=worker_pod,
-                    port=8788,
-                    # write_rsp=True
-                )
-                if families is not None:
-                    worker_info = pd.concat([
-                    worker_info,
-                    metrics_to_pd_series(
-                        families,
-                        custom_maps={
-                            'python_info': mapper_python_info
-                        }
-                    )
-                ])
-
-                data.append(worker_info)
-
-        return pd.DataFrame(data)
\ No newline at end of file
+        df = rows_to_frame(data, self.layout)
+        if 'timestamp' in df.columns:
+            df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+
+        return df
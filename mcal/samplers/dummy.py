@@ -1,11 +1,13 @@
+import asyncio
 import os
+import threading
 import time
 from datetime import timedelta
 from typing import Optional
 
 import pandas as pd
 
-from mcal import Sampler
+from mcal import AsyncSampler, Sampler
 from mcal.utils.time import parse_timedelta
 
 
@@ -75,4 +77,17 @@ class _DummyFileCount(Sampler):
     def sample(self) -> pd.DataFrame:
         return pd.DataFrame([{
             'file_count': len(os.listdir(self.directory))
-        }])
\ No newline at end of file
+        }])
+
+class _DummyAsyncSampler(AsyncSampler):
+    """Dummy async sampler which reports if it was run on the event loop's thread"""
+    def __init__(self, delay: Optional[float] = None):
+        self.delay = delay
+
+    async def sample(self) -> pd.DataFrame:
+        if self.delay is not None:
+            await asyncio.sleep(self.delay)
+
+        return pd.DataFrame([{
+            'on_main_thread': threading.current_thread() is threading.main_thread()
+        }])
@@ -1,6 +1,6 @@
 import pandas as pd
 
-from mcal import Sampler
+from mcal import AsyncSampler
 from mcal.files import load_file
 from mcal.new_relic import client_from_env_file
 from mcal.utils.nr import timestamp_to_datetime
@@ -8,7 +8,7 @@ from mcal.utils.nr import timestamp_to_datetime
 # This should probably capture all reporting intervals
 SINCE = "1 minute ago"
 
-class NRTop(Sampler):
+class NRTop(AsyncSampler):
     def __init__(
         self,
         command: str,
@@ -31,8 +31,9 @@ class NRTop(Sampler):
 
         self.nr = client_from_env_file()
 
-    def sample(self) -> pd.DataFrame:
-        result = self.nr.query(self.query)
+    async def sample(self) -> pd.DataFrame:
+        # NOTE: The client's transport is aiohttp based so the query is awaited directly on the event loop
+        result = await self.nr.query_async(self.query)
 
         for row in result:
             row['podName'] = row.pop('facet')
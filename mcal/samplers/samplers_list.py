@@ -1,9 +1,10 @@
 from .dask_k8_cluster import DaskK8Cluster
 from .dask_prom import DaskPromScheduler, DaskPromWorker
-from .dummy import _DummyFileCount, _DummySampler
+from .dummy import _DummyAsyncSampler, _DummyFileCount, _DummySampler
 from .kubectl_top import KubectlTop
 # from .k8_basic_stats import K8BasicStats
 from .nr_top import NRTop
+from .self_stats import _MCalSelfStats
 
 # from .nr_basic_stats import NRBasicStats
 # from .nr_frequency import NRFrequency
@@ -21,7 +22,10 @@ SAMPLERS = [
     NRTop,
     # NRBasicStats,
     # NRFrequency,
+    # Internal
+    _MCalSelfStats,
     # Dummy samplers for testing purposes
     _DummySampler,
-    _DummyFileCount
+    _DummyFileCount,
+    _DummyAsyncSampler
 ]
\ No newline at end of file
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from mcal import Sampler
+from mcal.utils.instrument import RECORDER
+
+
+class _MCalSelfStats(Sampler):
+    """
+    Records how long mcal itself spends on each part of a run, e.g. each sampler's `sample()`, appending and timing out data, each watcher, each action, and schedule drift.
+
+    Each row is a single timing where 'id' is the component (sampler / watcher / action name, or 'run'), 'stage' is what was timed, and 'seconds' is the time taken.
+    """
+    def __init__(self):
+        RECORDER.enabled = True
+
+    def sample(self) -> pd.DataFrame:
+        return RECORDER.collect()
+
+    def close(self):
+        RECORDER.reset()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import time
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, timezone
@@ -18,6 +19,9 @@ DETAILED_FORMAT = '%m/%d/%y %H:%M:%S.%f'
 
 
 class Schedule(ABC):
+    # Seconds the last sleep ended after its target, positive values mean the loop is behind schedule
+    drift: Optional[float] = None
+
     @classmethod
     @abstractmethod
     def from_config(
@@ -29,9 +33,38 @@ class Schedule(ABC):
         pass
 
     @abstractmethod
-    def sleep(loop_start: datetime):
+    def _sleep_time(self) -> float:
+        """
+        Calculate how long to sleep before the next iteration.
+
+        Returns:
+            float: Seconds to sleep, non-positive values will return immediately and indicate how far behind the target the loop is.
+        """
         pass
 
+    def _after_sleep(self, target: float):
+        self.drift = time.perf_counter() - target
+
+    def sleep(self):
+        """
+        Block until the next iteration should start.
+        """
+        sleep_time = self._sleep_time()
+        target = time.perf_counter() + sleep_time
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        self._after_sleep(target)
+
+    async def wait(self):
+        """
+        Same as `sleep()` but yields to the event loop while waiting so other tasks may make progress.
+        """
+        sleep_time = self._sleep_time()
+        target = time.perf_counter() + sleep_time
+        if sleep_time > 0:
+            await asyncio.sleep(sleep_time)
+        self._after_sleep(target)
+
 class IntervalSchedule(Schedule):
     @classmethod
     def from_config(cls, interval: str) -> IntervalSchedule:
@@ -46,19 +79,23 @@ class IntervalSchedule(Schedule):
             logger.error("Specified interval is negative.")
             raise NotImplementedError("Schedule not implemented for negative intervals")
 
-    def sleep(self):
+    def _sleep_time(self) -> float:
         # If this is the first loop, return immediately
         # TODO: This assumes that sleep() is called at the start of the loop, although this may be good for IntervalSchedule and even ReferencesIntervalSchedule, it is a tad confusing to see.
-        if self._last_time is not None:
-            sleep_time = self.interval - (
-                utc_now() - self._last_time
-            )
+        if self._last_time is None:
+            return 0
+
+        sleep_time = self.interval - (
+            utc_now() - self._last_time
+        )
 
-            if sleep_time.total_seconds() <= 0:
-                logger.warning("Calculated sleep time is not positive, this may indicate the sleep calculation loop is running too slow, returning immediately: %s seconds" % sleep_time.total_seconds())
-            else:
-                time.sleep(sleep_time.total_seconds())
+        if sleep_time.total_seconds() <= 0:
+            logger.warning("Calculated sleep time is not positive, this may indicate the sleep calculation loop is running too slow, returning immediately: %s seconds" % sleep_time.total_seconds())
 
+        return sleep_time.total_seconds()
+
+    def _after_sleep(self, target: float):
+        super()._after_sleep(target)
         self._last_time = utc_now()
 
 class ReferencedIntervalSchedule(Schedule):
@@ -104,7 +141,7 @@ class ReferencedIntervalSchedule(Schedule):
         self.reference_time = reference_time
         # TODO: Figure out how to handle _last_target here, just reset? 
 
-    def sleep(self):
+    def _sleep_time(self) -> float:
         # Find next interval to target
         now = utc_now()
         now_reference_diff = now - self.reference_time # NOTE: Assertion that this will be positive happens when reference clock is set
@@ -135,10 +172,10 @@ class ReferencedIntervalSchedule(Schedule):
         if time_to_target.total_seconds() <= 0:
             # Not an optional check for my own sanity
             logger.warning("Calculated sleep time is not positive, this may indicate the sleep calculation loop is running too slow, returning immediately: %s seconds" % time_to_target.total_seconds())
-            return
+            return time_to_target.total_seconds()
 
         logger.debug("Sleeping for %s seconds to meet target: %s" % (time_to_target.total_seconds(), current_target))
-        time.sleep(time_to_target.total_seconds())
+        return time_to_target.total_seconds()
 
 SCHEDULES = [
     IntervalSchedule,
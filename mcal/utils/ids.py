@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import heapq
+from datetime import datetime, timedelta
+from itertools import count
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class IdTable:
+    """
+    Interns ids into dense integer keys, in the order they are first seen. Rows store the keys so that grouping, lookups and timeouts compare integers instead of strings, the ids are only restored when data leaves `SamplerData`.
+    """
+    def __init__(self):
+        self._keys: Dict[Hashable, int] = {}
+        self._ids: List[Hashable] = []
+        self._array: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def ids(self) -> np.ndarray:
+        """The ids indexed by their key."""
+        if self._array is None or len(self._array) != len(self._ids):
+            self._array = np.empty(len(self._ids), dtype=object)
+            self._array[:] = self._ids
+        return self._array
+
+    def _key(self, id: Hashable) -> int:
+        key = self._keys.get(id)
+        if key is None:
+            key = len(self._ids)
+            self._keys[id] = key
+            self._ids.append(id)
+        return key
+
+    def intern(self, ids: Iterable[Hashable]) -> np.ndarray:
+        """
+        Get the keys of ids, adding ids which have not been seen before. Each distinct id is only hashed once per call.
+
+        Returns:
+            np.ndarray: The int64 key of each id.
+        """
+        if not isinstance(ids, (pd.Series, pd.Index, np.ndarray)):
+            ids = pd.Series(list(ids), dtype=object)
+        # NOTE: Categorical ids are factorized by their codes
+        codes, uniques = pd.factorize(ids, use_na_sentinel=False)
+        mapping = np.fromiter(
+            (self._key(id) for id in uniques.tolist()),
+            dtype=np.int64,
+            count=len(uniques)
+        )
+        return mapping[codes]
+
+    def lookup(self, keys: Iterable[int]) -> np.ndarray:
+        """Get the ids of keys."""
+        return self.ids[np.asarray(keys, dtype=np.int64)]
+
+    def categorical(self, keys: Iterable[int]) -> pd.Categorical:
+        """
+        Get the ids of keys as a categorical backed by the keys, which restores the ids without creating an object per row.
+        """
+        return pd.Categorical.from_codes(
+            np.asarray(keys, dtype=np.int64),
+            categories=pd.Index(self.ids, dtype=object)
+        )
+
+class IdIndex:
+    """
+    Incremental index of the ids seen by a sampler. Keeps the last time each id was seen and whether it is present, plus a min-heap of last seen times so timeouts only need to look at the ids which are expiring.
+    """
+    def __init__(self):
+        self._last_seen: Dict[Hashable, datetime] = {}
+        self._present: Dict[Hashable, bool] = {}
+
+        # Entries are (last_seen, tie_breaker, id), one per present id. Entries which are stale when popped are pushed again with the current last seen time
+        self._expiry: List[Tuple[datetime, int, Hashable]] = []
+        self._counter = count()
+
+    @classmethod
+    def from_frame(cls, ids: pd.DataFrame) -> IdIndex:
+        index = cls()
+        for id, last_seen, present in zip(ids["id"].tolist(), ids["last_seen"].tolist(), ids["present"].tolist()):
+            index._last_seen[id] = last_seen
+            index._present[id] = present = bool(present)
+            if present:
+                index._push(id, last_seen)
+
+        return index
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def _push(self, id: Hashable, last_seen: datetime):
+        heapq.heappush(self._expiry, (last_seen, next(self._counter), id))
+
+    def update(self, ids: pd.Series, last_seen: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        """
+        Update the index with the ids from a sample.
+
+        Args:
+            ids (pd.Series): Unique ids found in the sample.
+            last_seen (pd.Series): The latest timestamp for each id.
+
+        Returns:
+            Tuple[pd.Series, pd.Series]: The ids which are new and the ids which have returned after timing out respectively.
+        """
+        new = np.zeros(len(ids), dtype=bool)
+        returned = np.zeros(len(ids), dtype=bool)
+
+        for i, (id, timestamp) in enumerate(zip(ids.tolist(), last_seen.tolist())):
+            present = self._present.get(id)
+            if present is None:
+                new[i] = True
+            elif not present:
+                returned[i] = True
+
+            self._last_seen[id] = timestamp
+            if not present:
+                # NOTE: Present ids already have an entry, it is refreshed once popped
+                self._push(id, timestamp)
+            self._present[id] = True
+
+        return ids[new], ids[returned]
+
+    def timeout(self, now: datetime, timeout: timedelta) -> pd.Series:
+        """
+        Mark ids which have not been seen within `timeout` as not present.
+
+        Args:
+            now (datetime): The current time.
+            timeout (timedelta): How long an id may go without being seen.
+
+        Returns:
+            pd.Series: The ids which timed out during this call.
+        """
+        timedout = []
+        while len(self._expiry) != 0 and now - self._expiry[0][0] > timeout:
+            last_seen, _, id = heapq.heappop(self._expiry)
+            if self._last_seen[id] != last_seen:
+                # Stale entry, id has been seen since this was pushed
+                self._push(id, self._last_seen[id])
+                continue
+
+            self._present[id] = False
+            timedout.append(id)
+
+        return pd.Series(timedout, name="id", dtype=object)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "id": pd.Series(list(self._last_seen.keys()), dtype=object),
+            "last_seen": pd.Series(list(self._last_seen.values())),
+            "present": pd.Series(list(self._present.values()), dtype=bool),
+        })
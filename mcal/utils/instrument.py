@@ -0,0 +1,69 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Tuple
+
+import pandas as pd
+
+from .time import utc_now
+
+COLUMNS = ('id', 'timestamp', 'stage', 'seconds')
+
+class TimingRecorder:
+    """
+    Collects timings of the orchestrator's own work (sampling, ingest, watchers, actions, ...). Recording is a no-op until enabled, which is done by the `_MCalSelfStats` sampler for the duration of a run.
+
+    Each timing is recorded against a component (e.g. a sampler / watcher name) and a stage (e.g. 'sample', 'append').
+    """
+    def __init__(self):
+        self.enabled = False
+
+        self._records: List[Tuple[str, datetime, str, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, component: str, stage: str, seconds: float):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._records.append((component, utc_now(), stage, seconds))
+
+    @contextmanager
+    def time(self, component: str, stage: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(component, stage, time.perf_counter() - start)
+
+    def reset(self):
+        """
+        Disable recording and drop timings which were not collected, so a finished run does not keep recording.
+        """
+        with self._lock:
+            self.enabled = False
+            self._records = []
+
+    def collect(self) -> pd.DataFrame:
+        """
+        Take all timings recorded since the last collection.
+
+        Returns:
+            pd.DataFrame: One row per timing with the columns 'id' (the component), 'timestamp', 'stage', and 'seconds'.
+        """
+        with self._lock:
+            records = self._records
+            self._records = []
+
+        df = pd.DataFrame.from_records(records, columns=COLUMNS)
+        if len(records) == 0:
+            df = df.astype({'timestamp': 'datetime64[ns, UTC]', 'seconds': 'float64'})
+
+        return df
+
+RECORDER = TimingRecorder()
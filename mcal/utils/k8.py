@@ -0,0 +1,241 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from kubernetes import client, config, watch
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+DASK_GROUP = 'kubernetes.dask.org'
+DASK_VERSION = 'v1'
+# Label set by the dask operator on all resources which belong to a cluster
+DASK_CLUSTER_LABEL = 'dask.org/cluster-name'
+
+# Seconds before the server ends a watch, the watch is then resumed from the last seen resource version
+WATCH_TIMEOUT = 300
+# Seconds to wait before retrying after a failed list / watch
+RETRY_DELAY = 5
+
+def _metadata(obj: Any) -> Tuple[str, str, Optional[str]]:
+    # NOTE: Custom objects are returned as dicts while core objects are deserialized into models
+    if isinstance(obj, dict):
+        metadata = obj['metadata']
+        return metadata.get('namespace'), metadata['name'], metadata.get('resourceVersion')
+
+    metadata = obj.metadata
+    return metadata.namespace, metadata.name, metadata.resource_version
+
+def _list_contents(rsp: Any) -> Tuple[List[Any], Optional[str]]:
+    if isinstance(rsp, dict):
+        return rsp['items'], rsp['metadata'].get('resourceVersion')
+
+    return rsp.items, rsp.metadata.resource_version
+
+def get_labels(obj: Any) -> Dict[str, str]:
+    if isinstance(obj, dict):
+        return obj['metadata'].get('labels') or {}
+
+    return obj.metadata.labels or {}
+
+class Informer:
+    """
+    Maintains an in-memory copy of a kind of resource from a single LIST followed by a WATCH, so lookups do not need to call the API server.
+
+    The watch runs on a daemon thread, if it fails or the resource version expires the resources are listed again.
+    """
+    def __init__(self, name: str, list_func: Callable, **list_kwargs):
+        """
+        Args:
+            name (str): Name used in logs.
+            list_func (Callable): API method listing the resources across all namespaces, e.g. `CoreV1Api.list_pod_for_all_namespaces`.
+            **list_kwargs: Arguments for `list_func`, e.g. a `label_selector`.
+        """
+        self.name = name
+        self.list_func = list_func
+        self.list_kwargs = list_kwargs
+
+        self._objects: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._watch: Optional[watch.Watch] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="mcal-informer-%s" % self.name,
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._watch is not None:
+            self._watch.stop()
+        self._thread = None
+
+    def wait_synced(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the initial list to complete.
+
+        Returns:
+            bool: True if the informer has synced, False if the timeout expired first.
+        """
+        return self._synced.wait(timeout)
+
+    def items(self) -> List[Any]:
+        with self._lock:
+            return list(self._objects.values())
+
+    def get(self, namespace: str, name: str) -> Optional[Any]:
+        with self._lock:
+            return self._objects.get((namespace, name))
+
+    def select(
+        self,
+        namespace: Optional[str] = None,
+        labels: Optional[Dict[str, str]] = None
+    ) -> List[Any]:
+        """
+        Find cached resources, equivalent to listing with an equality based label selector.
+
+        Args:
+            namespace (Optional[str], optional): Only return resources in this namespace. Defaults to None which returns resources from all namespaces.
+            labels (Optional[Dict[str, str]], optional): Labels the resources must have. Defaults to None.
+        """
+        selected = []
+        for obj in self.items():
+            if namespace is not None and _metadata(obj)[0] != namespace:
+                continue
+            if labels is not None:
+                obj_labels = get_labels(obj)
+                if any(obj_labels.get(k) != v for k, v in labels.items()):
+                    continue
+            selected.append(obj)
+
+        return selected
+
+    def _list(self) -> Optional[str]:
+        items, resource_version = _list_contents(self.list_func(**self.list_kwargs))
+
+        objects = {}
+        for obj in items:
+            namespace, name, _ = _metadata(obj)
+            objects[(namespace, name)] = obj
+
+        with self._lock:
+            self._objects = objects
+        self._synced.set()
+
+        return resource_version
+
+    def _apply(self, event: dict) -> Optional[str]:
+        """
+        Apply a watch event to the cache.
+
+        Returns:
+            Optional[str]: The resource version of the event's object.
+        """
+        obj = event['object']
+        namespace, name, resource_version = _metadata(obj)
+
+        with self._lock:
+            if event['type'] == 'DELETED':
+                self._objects.pop((namespace, name), None)
+            elif event['type'] in ('ADDED', 'MODIFIED'):
+                self._objects[(namespace, name)] = obj
+
+        return resource_version
+
+    def _run(self):
+        resource_version = None
+        while not self._stopped.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self._list()
+
+                self._watch = watch.Watch()
+                for event in self._watch.stream(
+                    self.list_func,
+                    resource_version=resource_version,
+                    timeout_seconds=WATCH_TIMEOUT,
+                    **self.list_kwargs
+                ):
+                    if event['type'] == 'ERROR':
+                        # NOTE: Usually '410 Gone', meaning the resource version is too old to resume from
+                        logger.debug("Informer '%s' received error event, re-listing: %s" % (self.name, event.get('raw_object')))
+                        resource_version = None
+                        break
+                    if event['type'] == 'BOOKMARK':
+                        continue
+
+                    resource_version = self._apply(event) or resource_version
+            except client.ApiException as err:
+                if err.status == 410:
+                    logger.debug("Informer '%s' resource version expired, re-listing." % self.name)
+                else:
+                    logger.warning("Informer '%s' failed to list / watch, retrying in %s seconds: %s" % (self.name, RETRY_DELAY, err))
+                    self._stopped.wait(RETRY_DELAY)
+                resource_version = None
+            except Exception as err:
+                logger.warning("Informer '%s' failed to list / watch, retrying in %s seconds: %s" % (self.name, RETRY_DELAY, err))
+                self._stopped.wait(RETRY_DELAY)
+                resource_version = None
+
+class DaskInformers:
+    """
+    Informers for the resources used to discover dask clusters on kubernetes. The watches are owned by `K8Resources`, which the samplers of a run share through the run's `ResourceRegistry`, and are stopped when it is closed.
+    """
+    def __init__(self):
+        config.load_kube_config()
+
+        v1_api = client.CoreV1Api()
+        cr_api = client.CustomObjectsApi()
+
+        self.clusters = Informer(
+            'daskclusters',
+            cr_api.list_cluster_custom_object,
+            group=DASK_GROUP,
+            version=DASK_VERSION,
+            plural='daskclusters'
+        )
+        self.workergroups = Informer(
+            'daskworkergroups',
+            cr_api.list_cluster_custom_object,
+            group=DASK_GROUP,
+            version=DASK_VERSION,
+            plural='daskworkergroups'
+        )
+        self.services = Informer(
+            'services',
+            v1_api.list_service_for_all_namespaces,
+            label_selector=DASK_CLUSTER_LABEL
+        )
+        self.pods = Informer(
+            'pods',
+            v1_api.list_pod_for_all_namespaces,
+            label_selector=DASK_CLUSTER_LABEL
+        )
+
+    def _informers(self) -> Tuple[Informer, ...]:
+        return (self.clusters, self.workergroups, self.services, self.pods)
+
+    def start(self, timeout: Optional[float] = 30):
+        """
+        Start all informers and wait for them to sync.
+        """
+        for informer in self._informers():
+            informer.start()
+        for informer in self._informers():
+            if not informer.wait_synced(timeout):
+                logger.warning("Informer '%s' did not sync within %s seconds, discovery may be incomplete." % (informer.name, timeout))
+
+    def stop(self):
+        for informer in self._informers():
+            informer.stop()
@@ -1,9 +1,24 @@
 import json
 import os
-from typing import Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
+import numpy as np
 import pandas as pd
 
+DTYPES_SUFFIX = '_dtypes.json'
+# Maps file types supported by `write_frame(...)` to their file extensions
+FILE_TYPES = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+COLUMNAR_COMPRESSION = 'zstd'
+# String columns with at most this ratio of unique values per row are stored as categoricals
+CATEGORY_RATIO = 0.5
+# String columns with more unique values than this are never stored as categoricals, which bounds the values tracked per column
+CATEGORY_MAX_UNIQUE = 65536
+# Columns of the long / tidy layout, one row per (timestamp, id, metric, labels) instead of one column per metric + labels
+LONG_COLUMNS = ('metric', 'labels', 'value')
 
 def save_dtypes(path: str, df: pd.DataFrame, overwrite: bool = False):
     if not overwrite:
@@ -29,7 +44,7 @@ def load_dtypes(path: str) -> Tuple[dict, list]:
         Tuple[dict, list]: The `dtype` and `parse_dates` arguments to `read_csv` respectively.
     """
 
-    # TODO: For `datetime[ns, UTC]` this will currently remove the UTC in the type
+    # TODO: For `datetime[ns, UTC]` this will currently remove the UTC in the type, use the 'parquet' or 'arrow' file types to preserve it
 
     with open(path, 'r') as f:
         dtypes_dict = json.load(f)
@@ -42,4 +57,431 @@ def load_dtypes(path: str) -> Tuple[dict, list]:
     for name in parse_dates:
         del dtypes_dict[name]
 
-    return dtypes_dict, parse_dates
\ No newline at end of file
+    return dtypes_dict, parse_dates
+
+def write_frame(path: str, df: pd.DataFrame, file_type: str = 'csv') -> str:
+    """
+    Write a DataFrame to disk in the specified format, along with anything needed to restore the dtypes.
+
+    Args:
+        path (str): Path to write to without the file extension.
+        df (pd.DataFrame): The data to write.
+        file_type (str, optional): Format to write. Defaults to 'csv'.
+
+    Returns:
+        str: The path to the written data file.
+    """
+    if file_type not in FILE_TYPES:
+        raise NotImplementedError("Writing not implemented for file type: '%s'" % file_type)
+    data_path = path + FILE_TYPES[file_type]
+
+    if file_type == 'csv':
+        df.to_csv(data_path)
+        save_dtypes(path + DTYPES_SUFFIX, df)
+    elif file_type == 'parquet':
+        # NOTE: Columnar formats store the dtypes (including timezones) natively so no dtypes file is needed
+        df.to_parquet(data_path, compression=COLUMNAR_COMPRESSION)
+    elif file_type == 'arrow':
+        # Arrow IPC (feather v2) requires a default index
+        df.reset_index(drop=True).to_feather(data_path, compression=COLUMNAR_COMPRESSION)
+
+    return data_path
+
+def read_frame(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a DataFrame previously written by `write_frame(...)`.
+
+    **NOTE:** For columnar formats the file is memory-mapped and only the requested columns are read.
+
+    Args:
+        path (str): Path to the data file.
+        columns (Optional[List[str]], optional): Only read these columns, columns which do not exist in the file are filled with missing values. Defaults to None which reads all columns.
+
+    Returns:
+        pd.DataFrame: The loaded data.
+    """
+    name, ext = os.path.splitext(path)
+
+    file_columns = None
+    if columns is not None:
+        schema = read_schema(path)
+        file_columns = [c for c in columns if c in schema.index]
+
+    if ext == '.csv':
+        dtypes_path = name + DTYPES_SUFFIX
+        if not os.path.isfile(dtypes_path):
+            raise RuntimeError("File at '%s' should be accompanied by dtypes file at path '%s' but none found" % (path, dtypes_path))
+
+        dtypes_dict, parse_dates = load_dtypes(dtypes_path)
+        df = pd.read_csv(
+            path,
+            dtype=dtypes_dict,
+            parse_dates=parse_dates,
+            index_col=0 # Avoids 'Unnamed: 0' from showing up
+        )
+        if file_columns is not None:
+            df = df[file_columns]
+    elif ext == '.parquet':
+        df = pd.read_parquet(path, columns=file_columns, memory_map=True)
+    elif ext == '.arrow':
+        from pyarrow import feather
+
+        df = feather.read_table(path, columns=file_columns, memory_map=True).to_pandas()
+    else:
+        raise NotImplementedError("Reading not implemented for file type: '%s'" % ext)
+
+    if columns is not None and len(file_columns) != len(columns):
+        df = df.reindex(columns=columns)
+
+    return df
+
+def read_schema(path: str) -> pd.Series:
+    """
+    Read the dtypes of a DataFrame previously written by `write_frame(...)` without loading the data.
+
+    Args:
+        path (str): Path to the data file.
+
+    Returns:
+        pd.Series: The dtypes indexed by column name.
+    """
+    name, ext = os.path.splitext(path)
+
+    if ext == '.csv':
+        with open(name + DTYPES_SUFFIX, 'r') as f:
+            dtypes_dict = json.load(f)
+        return pd.Series(
+            {column: pd.api.types.pandas_dtype(dtype) for column, dtype in dtypes_dict.items()},
+            dtype=object
+        )
+    elif ext == '.parquet':
+        from pyarrow import parquet
+
+        schema = parquet.read_schema(path, memory_map=True)
+    elif ext == '.arrow':
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            schema = pa.ipc.open_file(source).schema
+    else:
+        raise NotImplementedError("Reading not implemented for file type: '%s'" % ext)
+
+    return schema.empty_table().to_pandas().dtypes
+
+class DtypeCompactor:
+    """
+    Converts the batches of a sampler to compact dtypes as they are ingested:
+    -> String columns with few unique values across all batches so far become categoricals
+    -> Floats are downcast to float32 where no values change
+    -> Datetimes are stored as nanoseconds (backed by int64)
+
+    The dtype chosen for a column is remembered and only widened by later batches, so the schema does not flip between batches.
+
+    **NOTE:** Integers are left as int64, arithmetic on narrower integers would silently wrap.
+    """
+    def __init__(
+        self,
+        category_ratio: float = CATEGORY_RATIO,
+        category_max_unique: int = CATEGORY_MAX_UNIQUE,
+        exclude: Iterable[str] = ('id',)
+    ):
+        """
+        Args:
+            category_ratio (float, optional): String columns are converted when the ratio of unique values to rows, counted across all batches so far, is at most this. Defaults to CATEGORY_RATIO.
+            category_max_unique (int, optional): String columns with more unique values than this are never converted. Defaults to CATEGORY_MAX_UNIQUE.
+            exclude (Iterable[str], optional): Columns which are left as they are. Defaults to ('id',).
+        """
+        self.category_ratio = category_ratio
+        self.category_max_unique = category_max_unique
+        self.exclude = set(exclude)
+        self._dtypes: Dict[str, object] = {}
+
+        # NOTE: Counted across batches so samplers returning a few rows per sample (e.g. one per cluster) still get categoricals
+        self._rows: Dict[str, int] = {}
+        self._uniques: Dict[str, set] = {}
+        self._high_cardinality: Set[str] = set()
+
+    def compact(self, df: pd.DataFrame) -> pd.DataFrame:
+        converted = {}
+        for column in df.columns:
+            if column in self.exclude:
+                continue
+
+            series = df[column]
+            dtype = self._target(column, series, self._dtypes.get(column))
+            if dtype is None:
+                continue
+
+            self._dtypes[column] = dtype
+            if dtype != series.dtype:
+                converted[column] = series.astype(dtype)
+
+        if len(converted) == 0:
+            return df
+        return df.assign(**converted)
+
+    def _target(self, column: str, series: pd.Series, previous) -> Optional[object]:
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            return 'category'
+        if isinstance(dtype, pd.DatetimeTZDtype):
+            return pd.DatetimeTZDtype('ns', dtype.tz)
+        if pd.api.types.is_datetime64_dtype(dtype):
+            return np.dtype('datetime64[ns]')
+        if pd.api.types.is_bool_dtype(dtype):
+            return None
+        if isinstance(dtype, pd.StringDtype) or dtype == object:
+            if previous == 'category':
+                return 'category'
+            if column in self._high_cardinality:
+                return None
+            if not isinstance(dtype, pd.StringDtype) and pd.api.types.infer_dtype(series, skipna=True) != 'string':
+                return None
+            return self._category_target(column, series)
+        if not isinstance(dtype, np.dtype) or dtype.kind != 'f':
+            # NOTE: Integers and extension dtypes (nullable integers, ...) are left as they are
+            return None
+
+        target = dtype
+        if dtype.itemsize > 4:
+            values = series.to_numpy()
+            with np.errstate(over='ignore'):
+                if np.array_equal(values.astype(np.float32).astype(dtype), values, equal_nan=True):
+                    target = np.dtype(np.float32)
+
+        if isinstance(previous, np.dtype) and previous.kind == target.kind:
+            # Only widen, a column keeps the widest dtype seen so far
+            target = np.promote_types(previous, target)
+        return target
+
+    def _category_target(self, column: str, series: pd.Series) -> Optional[str]:
+        uniques = self._uniques.setdefault(column, set())
+        uniques.update(series.dropna().unique().tolist())
+        rows = self._rows[column] = self._rows.get(column, 0) + len(series)
+
+        if len(uniques) > self.category_max_unique:
+            # Stop tracking, the column is never converted
+            self._high_cardinality.add(column)
+            del self._uniques[column]
+            del self._rows[column]
+            return None
+        if len(uniques) > self.category_ratio * rows:
+            return None
+
+        # NOTE: Categorical columns are sticky, nothing more needs to be tracked
+        del self._uniques[column]
+        del self._rows[column]
+        return 'category'
+
+class ChunkedDataFrame:
+    """
+    Append only DataFrame which keeps appended batches as separate chunks and only concatenates them when the data is read. This keeps each append O(batch) instead of copying the full history like repeated calls to `pd.concat(...)` would.
+    """
+    def __init__(self, df: Optional[pd.DataFrame] = None):
+        self._chunks: List[pd.DataFrame] = []
+        self._rows = 0
+
+        if df is not None:
+            self.append(df)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def empty(self) -> bool:
+        return self._rows == 0
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self._chunks)
+
+    def append(self, df: pd.DataFrame):
+        # NOTE: Empty frames are only kept if nothing else is stored so that the columns are not lost
+        if len(df) == 0 and len(self._chunks) != 0:
+            return
+        if self._rows == 0:
+            self._chunks = []
+
+        self._chunks.append(df)
+        self._rows += len(df)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Materialize all chunks into a single DataFrame. The result is cached so consecutive calls without appends are free.
+
+        Returns:
+            pd.DataFrame: All appended data.
+        """
+        if len(self._chunks) == 0:
+            return pd.DataFrame()
+        if len(self._chunks) > 1:
+            self._chunks = [concat_frames(self._chunks)]
+
+        return self._chunks[0]
+
+    def leading_rows(self, predicate: Callable[[pd.DataFrame], pd.Series]) -> int:
+        """
+        Count the rows from the start for which `predicate` holds, without materializing the chunks.
+
+        Args:
+            predicate (Callable[[pd.DataFrame], pd.Series]): Returns a boolean mask for the rows of a chunk.
+        """
+        count = 0
+        for chunk in self._chunks:
+            mask = np.asarray(predicate(chunk), dtype=bool)
+            if mask.all():
+                count += len(chunk)
+                continue
+            count += int(np.argmin(mask))
+            break
+
+        return count
+
+    def drop_head(self, n: int):
+        """
+        Drop the first `n` rows. The columns are kept even if all rows are dropped.
+        """
+        while n > 0 and len(self._chunks) != 0:
+            first = self._chunks[0]
+            if len(first) <= n and len(self._chunks) > 1:
+                self._chunks.pop(0)
+                self._rows -= len(first)
+                n -= len(first)
+                continue
+
+            # NOTE: Copied so the memory of the dropped rows is released
+            self._chunks[0] = first.iloc[n:].reset_index(drop=True).copy()
+            self._rows -= min(n, len(first))
+            break
+
+def _is_string(dtype) -> bool:
+    return isinstance(dtype, pd.StringDtype) or dtype == object
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate DataFrames like `pd.concat(..., ignore_index=True)`, but keep columns which are categorical in every frame categorical. `pd.concat(...)` falls back to object dtype when the categories of the frames differ.
+
+    Columns which are strings in earlier frames and categorical in later ones (see `DtypeCompactor`) are converted to categoricals as well.
+    """
+    categorical = set()
+    for df in frames:
+        for column, dtype in df.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                categorical.add(column)
+
+    if len(categorical) != 0:
+        frames = [
+            df.assign(**{
+                column: df[column].astype('category')
+                for column in categorical
+                if column in df.columns and _is_string(df[column].dtype)
+            })
+            for df in frames
+        ]
+
+    categories = {}
+    for df in frames:
+        for column, dtype in df.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                categories.setdefault(column, []).append(dtype.categories)
+
+    union = {}
+    for column, column_categories in categories.items():
+        if len(column_categories) != len(frames):
+            # Missing or not categorical in some frame, leave it to pandas
+            continue
+        merged = column_categories[0]
+        for other in column_categories[1:]:
+            if not other.equals(merged):
+                merged = merged.append(other).unique()
+        union[column] = merged
+
+    if len(union) != 0:
+        frames = [
+            df.assign(**{
+                column: df[column].cat.set_categories(merged)
+                for column, merged in union.items()
+                if not df[column].cat.categories.equals(merged)
+            })
+            for df in frames
+        ]
+
+    return pd.concat(frames, ignore_index=True)
+
+def is_long(columns: Iterable[str]) -> bool:
+    """
+    Check if data is stored in the long layout, see `LONG_COLUMNS`.
+    """
+    return set(LONG_COLUMNS).issubset(columns)
+
+def long_column_name(metric: str, labels: str) -> str:
+    """
+    Name of the wide column for a metric and labels key, e.g. `family-label=value`.
+    """
+    if labels == '' or pd.isna(labels):
+        return metric
+    return f"{metric}-{labels}"
+
+def to_wide(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pivot data in the long layout back to one column per metric and labels key. Rows are identified by all other columns (e.g. `id` and `timestamp`) and keep the order they first appear in. Data which is not in the long layout is returned unchanged.
+
+    Args:
+        df (pd.DataFrame): Data in the long layout.
+
+    Returns:
+        pd.DataFrame: The wide data.
+    """
+    if not is_long(df.columns):
+        return df
+
+    index_columns = [c for c in df.columns if c not in LONG_COLUMNS]
+    if len(df) == 0:
+        return df[index_columns].reset_index(drop=True)
+
+    # NOTE: Cells are scattered into a dense array instead of `pivot(...)` which sorts rows and fails on NaN keys
+    if len(index_columns) != 0:
+        row_codes = df.groupby(index_columns, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    else:
+        row_codes = np.zeros(len(df), dtype=np.int64)
+    # NOTE: Rows without a metric only identify a row, e.g. an entity which failed to be scraped
+    has_metric = df['metric'].notna().to_numpy()
+    metrics = df[has_metric]
+    column_codes = metrics.groupby(['metric', 'labels'], sort=False, dropna=False, observed=True).ngroup().to_numpy()
+
+    _, first_rows = np.unique(row_codes, return_index=True)
+    _, first_columns = np.unique(column_codes, return_index=True)
+    values = np.full((len(first_rows), len(first_columns)), np.nan)
+    values[row_codes[has_metric], column_codes] = metrics['value'].to_numpy(dtype=float, na_value=np.nan)
+
+    wide = df[index_columns].iloc[first_rows].reset_index(drop=True)
+    names = [
+        long_column_name(metric, labels)
+        for metric, labels in zip(
+            metrics['metric'].to_numpy()[first_columns],
+            metrics['labels'].to_numpy()[first_columns]
+        )
+    ]
+    return pd.concat(
+        [wide, pd.DataFrame(values, columns=names)],
+        axis=1
+    )
+
+def select_wide(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """
+    Select columns from data in the long layout as if it was in the wide layout, only pivoting the rows of the requested metrics.
+
+    **NOTE:** Rows are identified by the columns which are not in `LONG_COLUMNS`, so include `id` and `timestamp` in `df`.
+    """
+    index_columns = [c for c in df.columns if c not in LONG_COLUMNS]
+    # NOTE: Prometheus metric names may not contain '-', so the first one separates the labels key
+    keys = [
+        tuple(c.split('-', 1)) if '-' in c else (c, '')
+        for c in columns if c not in index_columns
+    ]
+    selected = pd.MultiIndex.from_arrays([
+        df['metric'].astype(object),
+        df['labels'].astype(object).fillna('')
+    ]).isin(keys) | df['metric'].isna().to_numpy()
+
+    return to_wide(df[selected]).reindex(columns=columns)
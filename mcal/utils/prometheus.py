@@ -1,25 +1,334 @@
-from typing import Callable, Dict, Iterable
+import math
+import re
+from fnmatch import fnmatchcase
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 import pandas as pd
 from prometheus_client.metrics_core import Metric
 
+# Suffixes of the samples which belong to a family of each type, see `prometheus_client.parser`
+_ALLOWED_SUFFIXES = {
+    'summary': ('_count', '_sum', ''),
+    'histogram': ('_count', '_sum', '_bucket'),
+}
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"')
+_ESCAPES = {'\\\\': '\\', '\\"': '"', '\\n': '\n'}
+_ESCAPE = re.compile(r'\\[\\"n]')
+_SAMPLE_NAME = re.compile(r'[^{\s]+')
+# Labels which select a bucket / quantile, summing samples across them is meaningless so they are never dropped
+_BUCKET_LABELS = ('le', 'quantile')
 
-def metrics_to_pd_series(families: Iterable[Metric], custom_maps: Dict[str, Callable] = None):
+class MetricFilter:
+    """
+    Selects which metric families and labels are kept, using shell style patterns (e.g. `dask_worker_*`).
+
+    Families are matched by their name (counters without '_total'), excluded families are skipped while parsing. Labels which are not kept are dropped from the column names, samples which then share a column are summed.
+    """
+    def __init__(
+        self,
+        include_metrics: Optional[List[str]] = None,
+        exclude_metrics: Optional[List[str]] = None,
+        include_labels: Optional[List[str]] = None,
+        exclude_labels: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            include_metrics (Optional[List[str]], optional): Only keep families matching one of these patterns. Defaults to None which keeps all families.
+            exclude_metrics (Optional[List[str]], optional): Drop families matching one of these patterns. Defaults to None.
+            include_labels (Optional[List[str]], optional): Only keep labels matching one of these patterns. Defaults to None which keeps all labels.
+            exclude_labels (Optional[List[str]], optional): Drop labels matching one of these patterns. Defaults to None.
+        """
+        self.include_metrics = include_metrics
+        self.exclude_metrics = exclude_metrics or []
+        self.include_labels = include_labels
+        self.exclude_labels = exclude_labels or []
+
+        # NOTE: The same names are seen on every scrape, so matches are cached
+        self._metrics: Dict[str, bool] = {}
+        self._labels: Dict[str, bool] = {}
+
+    @property
+    def projects_labels(self) -> bool:
+        return self.include_labels is not None or len(self.exclude_labels) != 0
+
+    @staticmethod
+    def _matches(name: str, include: Optional[List[str]], exclude: List[str]) -> bool:
+        if include is not None and not any(fnmatchcase(name, pattern) for pattern in include):
+            return False
+        return not any(fnmatchcase(name, pattern) for pattern in exclude)
+
+    def keep_metric(self, name: str) -> bool:
+        keep = self._metrics.get(name)
+        if keep is None:
+            keep = self._matches(name, self.include_metrics, self.exclude_metrics)
+            self._metrics[name] = keep
+        return keep
+
+    def keep_label(self, label: str) -> bool:
+        keep = self._labels.get(label)
+        if keep is None:
+            keep = self._matches(label, self.include_labels, self.exclude_labels)
+            self._labels[label] = keep
+        return keep
+
+def create_metric_filter(
+    include_metrics: Optional[List[str]] = None,
+    exclude_metrics: Optional[List[str]] = None,
+    include_labels: Optional[List[str]] = None,
+    exclude_labels: Optional[List[str]] = None,
+) -> Optional[MetricFilter]:
+    """
+    Create a `MetricFilter` from sampler arguments, None if no patterns were given.
+    """
+    if all(arg is None for arg in (include_metrics, exclude_metrics, include_labels, exclude_labels)):
+        return None
+
+    return MetricFilter(
+        include_metrics=include_metrics,
+        exclude_metrics=exclude_metrics,
+        include_labels=include_labels,
+        exclude_labels=exclude_labels,
+    )
+
+class Sample(NamedTuple):
+    name: str
+    labels: Dict[str, str]
+    value: float
+
+class Family(NamedTuple):
+    """Lightweight stand-in for `prometheus_client.metrics_core.Metric` with the attributes used by the mappers."""
+    name: str
+    type: str
+    samples: List[Sample]
+
+def _parse_value(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        # Exposition spells these differently than python
+        lowered = value.lower()
+        if lowered in ('+inf', 'inf'):
+            return math.inf
+        if lowered == '-inf':
+            return -math.inf
+        if lowered == 'nan':
+            return math.nan
+        raise
+
+def _parse_labels(text: str) -> Dict[str, str]:
+    if '\\' not in text:
+        return dict(_LABEL.findall(text))
+    return {
+        label: _ESCAPE.sub(lambda m: _ESCAPES[m.group(0)], value)
+        for label, value in _LABEL.findall(text)
+    }
+
+def _parse_sample(line: str) -> Sample:
+    brace = line.find('{')
+    if brace != -1:
+        end = line.rindex('}')
+        name = line[:brace].strip()
+        labels = _parse_labels(line[brace + 1:end])
+        rest = line[end + 1:].split()
+    else:
+        name, *rest = line.split()
+        labels = {}
+
+    # NOTE: Timestamps (`rest[1]`) are ignored, same as the rows' timestamp is the scrape time
+    return Sample(name, labels, _parse_value(rest[0]))
+
+def _family_name(name: str, typ: str) -> str:
+    if typ == 'counter' and name.endswith('_total'):
+        return name[:-6]
+    return name
+
+def _build_family(name: str, typ: str, samples: List[Sample]) -> Family:
+    # NOTE: Matches `prometheus_client`, counter families are named without the '_total' suffix
+    if typ == 'counter' and not name.endswith('_total'):
+        samples = [sample._replace(name=sample.name + '_total') for sample in samples]
+    return Family(_family_name(name, typ), typ, samples)
+
+def parse_exposition(text: str, metric_filter: Optional[MetricFilter] = None) -> Iterator[Family]:
+    """
+    Parse prometheus text exposition into families. This is a faster equivalent of `prometheus_client.parser.text_string_to_metric_families` which groups samples into families the same way.
+
+    Args:
+        metric_filter (Optional[MetricFilter], optional): Families which are not kept are skipped without parsing their samples. Defaults to None which keeps all families.
+    """
+    name = ''
+    typ = 'untyped'
+    samples: List[Sample] = []
+    allowed = ('',)
+    keep = True
+
+    for line in text.splitlines():
+        line = line.strip()
+        if line == '':
+            continue
+
+        if line[0] == '#':
+            parts = line.split(None, 3)
+            if len(parts) < 3 or parts[1] not in ('HELP', 'TYPE'):
+                continue
+            if parts[2] != name:
+                if name != '' and keep:
+                    yield _build_family(name, typ, samples)
+                name = parts[2]
+                typ = 'untyped'
+                samples = []
+                allowed = (name,)
+            if parts[1] == 'TYPE' and len(parts) == 4:
+                typ = parts[3].strip()
+                allowed = tuple(name + suffix for suffix in _ALLOWED_SUFFIXES.get(typ, ('',)))
+            keep = metric_filter is None or metric_filter.keep_metric(_family_name(name, typ))
+            continue
+
+        sample_name = _SAMPLE_NAME.match(line).group(0)
+        if sample_name in allowed:
+            if keep:
+                samples.append(_parse_sample(line))
+        else:
+            # Samples without a family are yielded as untyped singletons
+            if name != '' and keep:
+                yield _build_family(name, typ, samples)
+            name = ''
+            typ = 'untyped'
+            samples = []
+            allowed = ('',)
+            keep = True
+            if metric_filter is None or metric_filter.keep_metric(sample_name):
+                yield _build_family(sample_name, 'untyped', [_parse_sample(line)])
+
+    if name != '' and keep:
+        yield _build_family(name, typ, samples)
+
+def _sample_name(family: Family, sample: Sample) -> str:
+    # NOTE: Histogram / summary samples keep their suffix ('_bucket', '_sum', '_count') so they neither overwrite each other nor are summed together
+    if family.type in _ALLOWED_SUFFIXES:
+        return sample.name
+    return family.name
+
+def _projected_labels(sample: Sample, metric_filter: MetricFilter) -> List[str]:
+    return [
+        f"{label}={value}" for label, value in sample.labels.items()
+        if label in _BUCKET_LABELS or metric_filter.keep_label(label)
+    ]
+
+def metrics_to_dict(
+    families: Iterable[Metric],
+    custom_maps: Dict[str, Callable] = None,
+    metric_filter: Optional[MetricFilter] = None
+) -> Dict[str, Any]:
+    """
+    Flatten metric families into one value per sample, named after the family and the sample's labels (e.g. `family-label=value`). Histogram / summary samples are named after the sample instead, keeping their suffix (e.g. `family_bucket-le=1.0`, `family_sum`).
+
+    Args:
+        metric_filter (Optional[MetricFilter], optional): Drops labels which are not kept, summing samples which then share a name. Histogram / summary samples keep their 'le' / 'quantile' labels so only the same series are summed. Families with a custom map keep all labels. Defaults to None.
+    """
     # https://prometheus.io/docs/concepts/data_model/
-    series = pd.Series()
+    row = {}
+    project = metric_filter is not None and metric_filter.projects_labels
+
+    for family in families:
+        if custom_maps is not None and family.name in custom_maps:
+            for name, value in custom_maps[family.name](family):
+                row[name] = value
+        elif project:
+            family_row = {}
+            for sample in family.samples:
+                name = _sample_name(family, sample) + "".join(
+                    f"-{label}" for label in _projected_labels(sample, metric_filter)
+                )
+                family_row[name] = family_row.get(name, 0) + sample.value
+            row.update(family_row)
+        else:
+            for sample in family.samples:
+                name = _sample_name(family, sample) + "".join(
+                    f"-{label}={value}" for label, value in sample.labels.items()
+                )
+                row[name] = sample.value
+
+    return row
+
+# (metric, labels key, value), see `metrics_to_long(...)`
+LongSample = Tuple[str, str, float]
+
+def metrics_to_long(
+    families: Iterable[Metric],
+    custom_maps: Dict[str, Callable] = None,
+    metric_filter: Optional[MetricFilter] = None
+) -> Tuple[Dict[str, Any], List[LongSample]]:
+    """
+    Flatten metric families into `(metric, labels key, value)` samples for the long layout (see `mcal.utils.pandas.LONG_COLUMNS`). The metric and labels key are the parts of the column name `metrics_to_dict(...)` would create (e.g. `label=value-other=value`) so the wide layout can be restored with `mcal.utils.pandas.to_wide(...)`.
+
+    Args:
+        metric_filter (Optional[MetricFilter], optional): Drops labels which are not kept, summing samples which then share a labels key. Histogram / summary samples keep their suffix and 'le' / 'quantile' labels, see `metrics_to_dict(...)`. Defaults to None.
+
+    Returns:
+        Tuple[Dict[str, Any], List[LongSample]]: Values of families with a custom map, which are kept as columns, and the samples of all other families.
+    """
+    info = {}
+    samples = []
+    project = metric_filter is not None and metric_filter.projects_labels
 
     for family in families:
         if custom_maps is not None and family.name in custom_maps:
             for name, value in custom_maps[family.name](family):
-                series[name] = value
+                info[name] = value
+        elif project:
+            family_samples = {}
+            for sample in family.samples:
+                key = (_sample_name(family, sample), "-".join(_projected_labels(sample, metric_filter)))
+                family_samples[key] = family_samples.get(key, 0) + sample.value
+            samples.extend((name, key, value) for (name, key), value in family_samples.items())
         else:
             for sample in family.samples:
-                name = family.name
-                for label, value in sample.labels.items():
-                    name += f"-{label}={value}"
-                series[name] = sample.value
+                key = "-".join(
+                    f"{label}={value}" for label, value in sample.labels.items()
+                )
+                samples.append((_sample_name(family, sample), key, sample.value))
+
+    return info, samples
+
+def long_frame(entities: Iterable[Tuple[Dict[str, Any], List[LongSample]]]) -> pd.DataFrame:
+    """
+    Build a DataFrame in the long layout, with one row per sample. The entity's columns (e.g. `id`, `timestamp`) are repeated on each of its rows and `metric` / `labels` are dictionary encoded as categoricals.
 
-    return series
+    Entities without samples (e.g. a failed scrape) get a single row with a missing `metric`, `labels` and `value`, like the row without metric columns they would have in the wide layout, so their ids are still seen.
+
+    Args:
+        entities (Iterable[Tuple[Dict[str, Any], List[LongSample]]]): Columns of each entity with its samples.
+    """
+    entities = list(entities)
+
+    repeats = [max(len(samples), 1) for _, samples in entities]
+    info = pd.DataFrame.from_records([entity for entity, _ in entities])
+    df = info.loc[info.index.repeat(repeats)].reset_index(drop=True)
+
+    samples = [
+        sample
+        for _, entity_samples in entities
+        for sample in (entity_samples if len(entity_samples) != 0 else [(None, None, math.nan)])
+    ]
+    metrics, labels, values = zip(*samples) if len(samples) != 0 else ((), (), ())
+    df['metric'] = pd.Categorical(metrics)
+    df['labels'] = pd.Categorical(labels)
+    df['value'] = pd.Series(values, dtype=float)
+
+    return df
+
+def metrics_to_pd_series(families: Iterable[Metric], custom_maps: Dict[str, Callable] = None):
+    return pd.Series(metrics_to_dict(families, custom_maps))
 
 def mapper_python_info(metric: Metric) -> dict:
     assert metric.name == "python_info" and len(metric.samples) == 1
@@ -28,4 +337,4 @@ def mapper_python_info(metric: Metric) -> dict:
     return (
         ("python_implementation", sample.labels["implementation"]),
         ("python_version", sample.labels["version"])
-    )
\ No newline at end of file
+    )
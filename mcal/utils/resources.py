@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar
+
+from .logging import get_logger
+
+T = TypeVar('T')
+
+logger = get_logger(__name__)
+
+class ResourceRegistry:
+    """
+    Resources shared by the samplers of a run, such as API clients or discovery results. Samplers receive the run's registry by accepting a `resources` argument.
+
+    Resources are created on first request and samplers may request them concurrently, each resource is only created once.
+    """
+    def __init__(self):
+        self._resources: Dict[Hashable, Any] = {}
+        self._snapshots: Dict[Hashable, Tuple[float, Any]] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def get(self, key: Hashable, factory: Callable[[], T]) -> T:
+        """
+        Get a shared resource, creating it with `factory()` if it has not been requested yet.
+        """
+        with self._key_lock(key):
+            if key not in self._resources:
+                self._resources[key] = factory()
+            return self._resources[key]
+
+    def snapshot(self, key: Hashable, factory: Callable[[], T], ttl: float) -> T:
+        """
+        Get a shared value which is recomputed with `factory()` once it is older than `ttl` seconds. Use this for results which every sampler of an iteration needs, like discovery, so they are computed once per iteration.
+
+        **NOTE:** The value is shared, callers should not mutate it.
+        """
+        with self._key_lock(key):
+            snapshot = self._snapshots.get(key)
+            now = time.monotonic()
+            if snapshot is None or now - snapshot[0] > ttl:
+                snapshot = (now, factory())
+                self._snapshots[key] = snapshot
+            return snapshot[1]
+
+    def close(self):
+        """
+        Close all resources which have a `close()` method and forget all resources / snapshots.
+        """
+        with self._lock:
+            resources = self._resources
+            self._resources = {}
+            self._snapshots = {}
+
+        for key, resource in resources.items():
+            close = getattr(resource, 'close', None)
+            if close is None:
+                continue
+            try:
+                close()
+            except Exception as err:
+                logger.warning("Failed to close shared resource '%s': %s" % (key, err))
@@ -2,6 +2,7 @@ from abc import ABC
 from typing import Callable, Optional, Type
 
 import pandas as pd
+from pandas.core.groupby import DataFrameGroupBy
 
 from mcal import Sampler
 from mcal.events import on_event
@@ -10,10 +11,35 @@ EVENTS = (
     "new-sample",
     "id-found",
     "id-updates",
+    "id-updates-batch",
     "id-gone",
     "id-returned"
 )
 
+def _merge_updates(old: dict, new: dict) -> dict:
+    return {
+        **new,
+        'records': pd.concat([old['records'], new['records']])
+    }
+
+def _merge_updates_batch(old: dict, new: dict) -> dict:
+    old_grouped: DataFrameGroupBy = old['grouped']
+    new_grouped: DataFrameGroupBy = new['grouped']
+
+    # NOTE: Groups are keyed by a separate 'id' series (see `_notify_watchers(...)`) so both are concatenated and re-grouped
+    records = pd.concat([old_grouped.obj, new_grouped.obj], ignore_index=True)
+    ids = pd.concat([old_grouped.keys, new_grouped.keys], ignore_index=True)
+    return {
+        **new,
+        'grouped': records.groupby(ids, sort=False, observed=True)
+    }
+
+# Used by the 'coalesce' overflow policy to merge queued updates, see `ListenerWorker.coalescers`
+COALESCERS = {
+    "id-updates": (lambda kwargs: kwargs['id'], _merge_updates),
+    "id-updates-batch": (lambda kwargs: None, _merge_updates_batch),
+}
+
 class Watcher(ABC):
     def subscribe(self, kind: Type[Sampler], method: Callable = None):
         # TODO: Don't overload 'event' here
@@ -32,7 +58,8 @@ class Watcher(ABC):
                 "new-sample": self.new_sample,
                 "id-found": self.id_found,
                 "id-returned": self.id_returned,
-                "id-updates": self.id_updates,
+                # NOTE: The batched event is used so there is one call per sample, by default it will call `id_updates(...)` for each id
+                "id-updates-batch": self.id_updates_batch,
                 "id-gone": self.id_gone,
             }
 
@@ -77,6 +104,17 @@ class Watcher(ABC):
     def id_updates(self, kind: Type[Sampler], id: str, records: pd.DataFrame):
         pass
 
+    def id_updates_batch(self, kind: Type[Sampler], grouped: DataFrameGroupBy):
+        """
+        Called once per sample with the records of every id in the sample. Override this to handle all ids at once, by default `id_updates(...)` is called for each id.
+
+        Args:
+            kind (Type[Sampler]): Which kind of sampler this set of records came from.
+            grouped (DataFrameGroupBy): The records from a single sample grouped by id, the 'id' column is not included in the groups.
+        """
+        for id, records in grouped:
+            self.id_updates(kind, id, records)
+
     def id_gone(self, kind: Type[Sampler], id: str):
         pass
 
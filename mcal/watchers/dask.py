@@ -42,7 +42,11 @@ class _GenericWatcher(Watcher):
             if name not in self.previous_schema:
                 changes.append(f"New attribute: '{name}'")
                 self.previous_schema[name] = dtype
-            elif self.previous_schema[name] != dtype:
+            elif self.previous_schema[name] != dtype and not (
+                # Categories grow as new values are seen, that is not a change of dtype
+                isinstance(dtype, pd.CategoricalDtype)
+                and isinstance(self.previous_schema[name], pd.CategoricalDtype)
+            ):
                 changes.append(f"Dtype changes: {self.previous_schema[name]} --> {dtype}")
                 self.previous_schema[name] = dtype
 
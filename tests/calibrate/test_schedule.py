@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import time
 from datetime import datetime, timedelta
@@ -6,7 +7,11 @@ import pytest
 from pytest_benchmark.fixture import BenchmarkFixture
 
 import mcal.schedules
-from mcal.schedules import DETAILED_FORMAT, ReferencedIntervalSchedule
+from mcal.schedules import (
+    DETAILED_FORMAT,
+    IntervalSchedule,
+    ReferencedIntervalSchedule,
+)
 from mcal.utils.time import utc_now
 
 logger_name = mcal.schedules.__name__
@@ -62,6 +67,43 @@ def test_basic():
             schedule.reference_time + ((i+1) * schedule.interval),
         )
 
+def test_wait():
+    schedule = ReferencedIntervalSchedule(
+        interval=timedelta(seconds=0.1),
+        reference_time=utc_now()
+    )
+
+    async def wait():
+        for i in range(0, 5):
+            await schedule.wait()
+            assert_within(
+                utc_now(),
+                schedule.reference_time + ((i+1) * schedule.interval),
+            )
+
+    asyncio.get_event_loop().run_until_complete(wait())
+
+def test_wait_non_blocking():
+    schedule = IntervalSchedule(interval=timedelta(seconds=0.5))
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.05)
+
+    async def wait():
+        task = asyncio.create_task(tick())
+        await schedule.wait() # First call returns immediately
+        await schedule.wait()
+        task.cancel()
+
+    asyncio.get_event_loop().run_until_complete(wait())
+
+    # Other tasks should have been able to run while waiting
+    assert ticks >= 5
+
 @pytest.mark.parametrize(
     "num_missed, interval",
     [
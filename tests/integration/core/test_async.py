@@ -8,6 +8,8 @@ THIS_DIR = os.path.abspath(os.path.dirname(__file__))
 CONFIG_ONE_ACTION_NO_AWAIT = os.path.join(THIS_DIR, 'config_one_action_no_await.yml')
 CONFIG_TWO_DELAYED_SAMPLES = os.path.join(THIS_DIR, 'config_two_delayed_samples.yml')
 CONFIG_TWO_DELAYED_ACTIONS = os.path.join(THIS_DIR, 'config_two_delayed_actions.yml')
+CONFIG_ASYNC_SAMPLERS = os.path.join(THIS_DIR, 'config_async_samplers.yml')
+CONFIG_SAMPLER_TIMEOUT = os.path.join(THIS_DIR, 'config_sampler_timeout.yml')
 
 
 @pytest.mark.parametrize(
@@ -89,4 +91,66 @@ def test_action_no_await(cli_run: CLIRunFixture, delay: float):
     timestamps = data.collected_data['_DummySampler'].data['timestamp']
 
     # Check that the delay does not show up, as the runner should not await it
-    assert abs(timestamps.diff()[1]) < timedelta(seconds=0.2)
\ No newline at end of file
+    assert abs(timestamps.diff()[1]) < timedelta(seconds=0.2)
+
+@pytest.mark.parametrize(
+    "num_samplers, delay",
+    [
+        # NOTE: More samplers than the default executor has threads (at most 32), delays are long enough to dwarf the
+        # per-sample processing overhead
+        (64, 2),
+        pytest.param(128, 4, marks=pytest.mark.slow)
+    ]
+)
+def test_async_samplers(cli_run: CLIRunFixture, num_samplers: int, delay: float):
+    _, data = cli_run(
+        CONFIG_ASYNC_SAMPLERS,
+        config_arguments={
+            'interval': '0s',
+            'num_samplers': f'{num_samplers}',
+            'delay': f'{delay}',
+            'amount': '2'
+        }
+    )
+
+    assert data is not None
+    assert len(data.collected_data) == num_samplers
+    for sampler_data in data.collected_data.values():
+        sampler_data = sampler_data.data
+        assert sampler_data.shape[0] == 2
+        # Async samplers should be awaited on the event loop, not in the executor
+        assert sampler_data['on_main_thread'].all()
+
+    # Running in the executor would take at least two delays per iteration since there are more samplers than threads,
+    # anything below that leaves the remainder of a delay as tolerance for processing overhead
+    timestamps = data.collected_data['async_0'].data['timestamp']
+    assert timestamps.diff()[1] < timedelta(seconds=2*delay)
+
+@pytest.mark.parametrize(
+    "slow_kind",
+    [
+        '_DummySampler',
+        '_DummyAsyncSampler'
+    ]
+)
+def test_sampler_timeout(cli_run: CLIRunFixture, slow_kind: str):
+    _, data = cli_run(
+        CONFIG_SAMPLER_TIMEOUT,
+        config_arguments={
+            'interval': '0.3s',
+            'slow_kind': slow_kind,
+            'timeout': '0.1s',
+            'delay': '0.5',
+            'amount': '4'
+        }
+    )
+
+    assert data is not None
+
+    # The slow sampler should not hold back the fast one
+    timestamps = data.collected_data['fast'].data['timestamp']
+    assert len(timestamps) == 4
+    assert (timestamps.diff()[1:] < timedelta(seconds=0.45)).all()
+
+    # All samples of the slow sampler overran their timeout, so no data is saved for it
+    assert 'slow' not in data.collected_data
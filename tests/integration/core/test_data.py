@@ -7,6 +7,7 @@ from test_resources.cli_fixtures import CLIRunFixture
 
 THIS_DIR = os.path.abspath(os.path.dirname(__file__))
 CONFIG_SCHEMA_CHANGES = os.path.join(THIS_DIR, 'config_schema_changes.yml')
+CONFIG_SELF_STATS = os.path.join(THIS_DIR, 'config_self_stats.yml')
 
 def test_schema_changes(cli_run: CLIRunFixture):
     _, data = cli_run(
@@ -26,4 +27,27 @@ def test_schema_changes(cli_run: CLIRunFixture):
     assert_frame_equal(
         data,
         expected,
-    )
\ No newline at end of file
+    )
+
+def test_self_stats(cli_run: CLIRunFixture):
+    _, data = cli_run(
+        CONFIG_SELF_STATS,
+        config_arguments={}
+    )
+
+    stats = data.collected_data['_MCalSelfStats'].raw_data
+    assert set(stats.columns) == {'id', 'timestamp', 'stage', 'seconds'}
+    # NOTE: Schedule drift may be negative, everything else is a duration
+    assert (stats[stats['stage'] != 'schedule_drift']['seconds'] >= 0).all()
+
+    stages = set(zip(stats['id'], stats['stage']))
+    for expected in (
+        ('_DummySampler', 'sample'),
+        ('_DummySampler', 'append'),
+        ('_DummySampler', 'timeout'),
+        ('_DummyWatcher', 'new-sample'),
+        ('_DummySleepAction', 'after_iter'),
+        ('run', 'schedule_drift'),
+        ('run', 'iteration'),
+    ):
+        assert expected in stages, f"Missing timing for {expected}: {stages}"
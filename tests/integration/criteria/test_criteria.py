@@ -1,6 +1,7 @@
 import os
 import subprocess
 import time
+from pathlib import Path
 
 import pytest
 from test_resources.cli_fixtures import CLIRunFixture
@@ -17,9 +18,10 @@ CONFIG_AFTER_ITERATIONS= os.path.join(THIS_DIR, 'config_iterations.yml')
         pytest.param(2, marks=pytest.mark.slow)
     ]
 )
-def test_allow_no_criteria(wait: float):
+def test_allow_no_criteria(tmp_path: Path, wait: float):
+    # NOTE: Run data is written while the run is in progress so keep it out of the working directory
     handle = subprocess.Popen(
-        ["mcal", "-vvv", "run", CONFIG_NO_CRITERIA],
+        ["mcal", "-vvv", "run", CONFIG_NO_CRITERIA, "--save-directory", str(tmp_path)],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
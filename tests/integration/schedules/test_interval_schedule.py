@@ -10,6 +10,7 @@ from mcal.utils.time import to_timedelta_str
 
 THIS_DIR = os.path.abspath(os.path.dirname(__file__))
 CONFIG_INTERVAL = os.path.join(THIS_DIR, 'config_interval.yml')
+CONFIG_SAMPLER_SCHEDULE = os.path.join(THIS_DIR, 'config_sampler_schedule.yml')
 
 @pytest.mark.parametrize(
     "interval, amount",
@@ -83,4 +84,44 @@ def test_slow_loop_warning(cli_run: CLIRunFixture):
     )
 
     stderr = result.stderr.decode()
-    assert re.search(".*WARNING - [^\n]* Calculated sleep time is not positive, this may indicate the sleep calculation loop is running too slow, returning immediately: [^\n]* seconds.*", stderr) is not None
\ No newline at end of file
+    assert re.search(".*WARNING - [^\n]* Calculated sleep time is not positive, this may indicate the sleep calculation loop is running too slow, returning immediately: [^\n]* seconds.*", stderr) is not None
+
+@pytest.mark.parametrize(
+    "interval, sampler_interval, delay, amount",
+    [
+        # Sampler scheduled faster than the run
+        (timedelta(seconds=0.5), timedelta(seconds=0.1), 0, 4),
+        # Slow sampler should not hold back the run level schedule
+        (timedelta(seconds=0.2), timedelta(seconds=0.2), 0.5, 6),
+    ]
+)
+def test_sampler_schedule(
+    cli_run: CLIRunFixture,
+    interval: timedelta,
+    sampler_interval: timedelta,
+    delay: float,
+    amount: int
+):
+    _, data = cli_run(
+        CONFIG_SAMPLER_SCHEDULE,
+        config_arguments={
+            'interval': to_timedelta_str(interval),
+            'sampler_interval': to_timedelta_str(sampler_interval),
+            'delay': f'{delay}',
+            'amount': f'{amount}'
+        },
+    )
+
+    assert data is not None
+    run_schedule = data.collected_data['run_schedule'].data
+    sampler_schedule = data.collected_data['sampler_schedule'].data
+
+    # Run level schedule should be unaffected by the independent sampler
+    assert run_schedule.shape == (amount, 2)
+    diff_from_interval = abs(run_schedule['timestamp'].diff().iloc[1:] - interval)
+    assert (diff_from_interval < timedelta(seconds=0.2)).all()
+
+    run_time = (amount - 1) * interval
+    expected_samples = run_time / max(sampler_interval, timedelta(seconds=delay))
+    assert len(sampler_schedule) >= int(expected_samples) - 1
+    assert len(sampler_schedule) <= int(expected_samples) + 2
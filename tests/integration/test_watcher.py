@@ -1,5 +1,6 @@
 import os
 import re
+from datetime import timedelta
 from typing import Dict
 
 import pytest
@@ -10,6 +11,7 @@ CONFIG_DUMMY_WATCHER = os.path.join(THIS_DIR, 'config_dummy_watcher.yml')
 CONFIG_WATCHER_SHORT_TIMEOUT = os.path.join(THIS_DIR, 'config_watcher_short_timeout.yml')
 CONFIG_WATCHER_ODD_EVEN = os.path.join(THIS_DIR, 'config_watcher_odd_even.yml')
 CONFIG_WATCHER_ORDERED = os.path.join(THIS_DIR, 'config_watcher_ordered.yml')
+CONFIG_WATCHER_PIPELINED = os.path.join(THIS_DIR, 'config_watcher_pipelined.yml')
 
 # Ids that were previously gone only return once
 # Test async
@@ -170,4 +172,73 @@ def test_defined_order(cli_run: CLIRunFixture, delay: float):
 
     # Assure that found / returned methods are ALWAYS called before update methods
     assert found_match.end() < matches[0].start(), "Out of order call to found made"
-    assert returned_match.end() < matches[1].start(), "Out of order call to return made"
\ No newline at end of file
+    assert returned_match.end() < matches[1].start(), "Out of order call to return made"
+
+@pytest.mark.parametrize(
+    "max_in_flight, delay",
+    (
+        (1, 0.3),
+        (5, 0.3),
+        pytest.param(1, 1, marks=pytest.mark.slow),
+        pytest.param(5, 1, marks=pytest.mark.slow),
+    )
+)
+def test_pipelined(cli_run: CLIRunFixture, max_in_flight: int, delay: float):
+    interval = 0.1
+    amount = 5
+    result, data = cli_run(
+        CONFIG_WATCHER_PIPELINED,
+        config_arguments={
+            'interval': f"{interval}s",
+            'delay': f"{delay}",
+            'amount': f"{amount}",
+            'max_in_flight': f"{max_in_flight}"
+        },
+        run_cmd_kwargs={
+            'capture_output': True
+        }
+    )
+    stdout = result.stdout.decode()
+
+    # All samples should be seen, in order, even if iterations overlap
+    samples = [int(n) for n in re.findall(r"new sample: (\d+)", stdout)]
+    assert samples == list(range(amount))
+
+    diffs = data.collected_data['_DummySampler'].data['timestamp'].diff().dropna()
+    if max_in_flight == 1:
+        # Each iteration waits on the slow watcher
+        assert (diffs >= timedelta(seconds=delay)).all()
+    else:
+        # Sampling stays on schedule while the watcher drains
+        assert (diffs < timedelta(seconds=delay)).all()
+
+def test_overflow_drop_oldest(cli_run: CLIRunFixture):
+    delay = 0.5
+    amount = 5
+    result, data = cli_run(
+        CONFIG_WATCHER_PIPELINED,
+        config_arguments={
+            'interval': "0.1s",
+            'delay': f"{delay}",
+            'amount': f"{amount}",
+            'max_in_flight': "1",
+            'max_pending': "2",
+            'overflow': "drop-oldest"
+        },
+        run_cmd_kwargs={
+            'capture_output': True
+        }
+    )
+    stdout = result.stdout.decode()
+    stderr = result.stderr.decode()
+
+    # Older queued events are dropped while the watcher is busy, the newest are kept
+    samples = [int(n) for n in re.findall(r"new sample: (\d+)", stdout)]
+    assert samples == sorted(samples)
+    assert samples[-1] == amount - 1
+    assert len(samples) < amount
+    assert re.search(r"Listener '_DummyWatcher' fell behind, \d+ events were dropped", stderr) is not None
+
+    # Sampling should not wait on the watcher
+    diffs = data.collected_data['_DummySampler'].data['timestamp'].diff().dropna()
+    assert (diffs < timedelta(seconds=delay)).all()
@@ -0,0 +1,205 @@
+import os
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from mcal.config import load_config
+from mcal.runner.models import CalibrationRun, load_run
+from mcal.samplers.base import RetentionPolicy, SamplerData
+from mcal.utils.pandas import DtypeCompactor, write_frame
+from mcal.utils.time import utc_now
+
+CONFIG = """
+schedule:
+  kind: IntervalSchedule
+  args:
+    interval: 1s
+samplers:
+  - kind: _DummySampler
+stop_criteria:
+  kind: 'builtin:after_iterations'
+  args:
+    amount: 1
+"""
+
+
+@pytest.mark.parametrize("file_type", ('csv', 'parquet', 'arrow'))
+def test_write_load(tmp_path: Path, file_type: str):
+    if file_type != 'csv':
+        pytest.importorskip('pyarrow')
+
+    now = utc_now()
+    df = pd.DataFrame({
+        'id': ['a', 'b', 'a'],
+        'timestamp': [now, now, now],
+        'value': [1, 2, 3],
+        'ratio': [0.5, None, 1.5],
+        'name': ['x', 'y', None],
+    })
+    data = SamplerData.from_dataframe(source_name='my_sampler', df=df)
+    data.write(str(tmp_path), file_type=file_type)
+
+    files = sorted(os.listdir(tmp_path))
+    if file_type == 'csv':
+        assert files == ['my_sampler.csv', 'my_sampler_dtypes.json']
+    else:
+        # Columnar formats should not need a dtypes file
+        assert files == [f'my_sampler.{file_type}']
+
+    loaded = SamplerData.load(str(tmp_path / f'my_sampler.{file_type}'))
+    assert loaded.source_name == 'my_sampler'
+
+    if file_type != 'csv':
+        # TODO: CSV currently loses the timezone
+        assert loaded.raw_data['timestamp'].dt.tz is not None
+    assert_frame_equal(
+        loaded.raw_data.drop(columns='timestamp'),
+        df.drop(columns='timestamp'),
+    )
+
+@pytest.mark.parametrize("file_type", ('csv', 'parquet', 'arrow'))
+def test_write_load_compact(tmp_path: Path, file_type: str):
+    if file_type != 'csv':
+        pytest.importorskip('pyarrow')
+
+    now = utc_now()
+    df = DtypeCompactor().compact(pd.DataFrame({
+        'id': ['a', 'b', 'a'],
+        'timestamp': [now, now, now],
+        'namespace': ['x', 'x', 'x'],
+        'value': [1, 2, 3],
+        'ratio': [0.5, None, 1.5],
+    }))
+    SamplerData.from_dataframe(source_name='my_sampler', df=df).write(str(tmp_path), file_type=file_type)
+
+    # Compact dtypes should survive saving
+    loaded = SamplerData.load(str(tmp_path / f'my_sampler.{file_type}'))
+    assert loaded.raw_data['namespace'].dtype == 'category'
+    assert loaded.raw_data['value'].dtype == 'int64'
+    assert loaded.raw_data['ratio'].dtype == 'float32'
+
+@pytest.mark.parametrize("file_type", ('csv', 'parquet', 'arrow'))
+def test_lazy_load(tmp_path: Path, file_type: str):
+    if file_type != 'csv':
+        pytest.importorskip('pyarrow')
+
+    now = utc_now()
+    df = pd.DataFrame({
+        'id': ['a', 'b'],
+        'timestamp': [now, now],
+        'value': [1, 2],
+        'other': [3.0, 4.0],
+    })
+    run = CalibrationRun(
+        start_time=now,
+        config=load_config(CONFIG, {}),
+        collected_data={
+            '_DummySampler': SamplerData.from_dataframe(source_name='_DummySampler', df=df)
+        }
+    )
+    path = run.write_run(save_directory=str(tmp_path), name='run_data', data_type=file_type)
+
+    loaded = load_run(path)
+    assert list(loaded.collected_data) == ['_DummySampler']
+    assert not loaded.collected_data.is_loaded('_DummySampler')
+
+    schema = loaded.collected_data.read_schema('_DummySampler')
+    assert list(schema.index) == ['id', 'timestamp', 'value', 'other']
+    assert schema['value'] == 'int64'
+
+    # Reading columns should not load the full data, missing columns are filled
+    subset = loaded.collected_data.read_columns('_DummySampler', ['id', 'value', 'missing'])
+    assert not loaded.collected_data.is_loaded('_DummySampler')
+    assert list(subset.columns) == ['id', 'value', 'missing']
+    assert subset['value'].tolist() == [1, 2]
+    assert subset['missing'].isna().all()
+
+    assert loaded.collected_data['_DummySampler'].data['other'].tolist() == [3.0, 4.0]
+    assert loaded.collected_data.is_loaded('_DummySampler')
+
+@pytest.mark.parametrize("file_type", ('csv', 'parquet'))
+def test_lazy_load_long(tmp_path: Path, file_type: str):
+    if file_type != 'csv':
+        pytest.importorskip('pyarrow')
+
+    now = utc_now()
+    df = pd.DataFrame({
+        'id': ['a', 'a', 'b'],
+        'timestamp': [now, now, now],
+        'metric': pd.Categorical(['tasks', 'memory', 'tasks']),
+        'labels': pd.Categorical(['state=memory', '', 'state=memory']),
+        'value': [1.0, 2.0, 3.0],
+    })
+    run = CalibrationRun(
+        start_time=now,
+        config=load_config(CONFIG, {}),
+        collected_data={
+            '_DummySampler': SamplerData.from_dataframe(source_name='_DummySampler', df=df)
+        }
+    )
+    path = run.write_run(save_directory=str(tmp_path), name='run_data', data_type=file_type)
+
+    loaded = load_run(path)
+
+    # Long data is presented as if it was wide
+    schema = loaded.collected_data.read_schema('_DummySampler')
+    assert list(schema.index) == ['id', 'timestamp', 'tasks-state=memory', 'memory']
+
+    subset = loaded.collected_data.read_columns('_DummySampler', ['id', 'tasks-state=memory'])
+    assert not loaded.collected_data.is_loaded('_DummySampler')
+    assert subset['id'].tolist() == ['a', 'b']
+    assert subset['tasks-state=memory'].tolist() == [1.0, 3.0]
+
+def test_append_interned_ids():
+    now = utc_now()
+    data = SamplerData.from_dataframe(
+        source_name='my_sampler',
+        df=pd.DataFrame({'id': ['a', 'b'], 'timestamp': [now, now]})
+    )
+    new, returned = data.append(SamplerData.from_dataframe(
+        source_name='my_sampler',
+        df=pd.DataFrame({'id': ['c', 'a', 'c'], 'timestamp': [now, now, now]})
+    ))
+
+    assert new.tolist() == ['c']
+    assert returned.tolist() == []
+    # Ids are restored when the data is read
+    assert data.raw_data['id'].tolist() == ['a', 'b', 'c', 'a', 'c']
+    assert data.id_keys.cat.codes.tolist() == [0, 1, 2, 0, 2]
+    assert data.ids['id'].tolist() == ['a', 'b', 'c']
+
+def test_evict_naive_timestamps(tmp_path: Path):
+    pytest.importorskip('pyarrow')
+
+    old = pd.Timestamp.now(tz='UTC').tz_localize(None) - pd.Timedelta(hours=1)
+    df = pd.DataFrame({
+        'id': ['a', 'a', 'a'],
+        'timestamp': [old, old, pd.Timestamp.now(tz='UTC').tz_localize(None)],
+        'value': [1, 2, 3],
+    })
+    data = SamplerData.from_dataframe(source_name='my_sampler', df=df)
+    data.retention = RetentionPolicy(max_age=timedelta(minutes=30))
+
+    # Two segments, only the first is needed to restore the evicted rows
+    spill_path = str(tmp_path / 'my_sampler')
+    os.makedirs(spill_path)
+    write_frame(SamplerData.segment_path(str(tmp_path), 'my_sampler', 0), df.iloc[:2], file_type='parquet')
+    write_frame(SamplerData.segment_path(str(tmp_path), 'my_sampler', 1), df.iloc[2:], file_type='parquet')
+
+    assert data.evict(durable_rows=3, spill_path=spill_path) == 2
+    assert len(data.id_keys) == 1
+    assert data.data['value'].tolist() == [1, 2, 3]
+
+def test_load_segment_order(tmp_path: Path):
+    now = utc_now()
+    os.makedirs(tmp_path / 'my_sampler')
+    # NOTE: Segment numbers past the zero padding, 'part-100000' sorts before 'part-99998' lexically
+    for segment in (100001, 99998, 100000, 99999):
+        df = pd.DataFrame({'id': ['a'], 'timestamp': [now], 'value': [segment]})
+        write_frame(SamplerData.segment_path(str(tmp_path), 'my_sampler', segment), df)
+
+    data = SamplerData.load(str(tmp_path / 'my_sampler'))
+    assert data.data['value'].tolist() == [99998, 99999, 100000, 100001]
@@ -0,0 +1,220 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from typing import List, Tuple
+
+import pandas as pd
+import pytest
+from pandas.core.groupby import DataFrameGroupBy
+
+from mcal.actions import Action
+from mcal.config import load_config
+from mcal.events import clear_subscriptions
+from mcal.runner import orchestrate
+from mcal.runner.models import CalibrationRun, RunStats
+from mcal.runner.orchestrate import _after, _notify_watchers, _run_loop
+from mcal.samplers.base import SamplerData
+from mcal.samplers.dummy import _DummySampler
+from mcal.schedules import IntervalSchedule
+from mcal.utils.instrument import RECORDER
+from mcal.utils.time import utc_now
+from mcal.watchers import Watcher
+
+
+class _RecordingWatcher(Watcher):
+    def __init__(self):
+        self.subscribe(_DummySampler)
+        self.calls: List[Tuple[str, str]] = []
+
+    def id_found(self, kind, id: str, record: pd.Series):
+        assert 'id' not in record.index
+        self.calls.append(('found', id))
+
+    def id_returned(self, kind, id: str, record: pd.Series):
+        self.calls.append(('returned', id))
+
+    def id_updates(self, kind, id: str, records: pd.DataFrame):
+        assert 'id' not in records.columns
+        self.calls.append(('updates', id))
+
+    def id_gone(self, kind, id: str):
+        self.calls.append(('gone', id))
+
+class _BatchWatcher(Watcher):
+    def __init__(self):
+        self.subscribe(_DummySampler)
+        self.batches: List[DataFrameGroupBy] = []
+
+    def id_updates(self, kind, id: str, records: pd.DataFrame):
+        raise AssertionError("Per id updates should not be called when batch is overridden")
+
+    def id_updates_batch(self, kind, grouped: DataFrameGroupBy):
+        self.batches.append(grouped)
+
+def test_notify_watchers():
+    clear_subscriptions()
+    recording = _RecordingWatcher()
+    batch = _BatchWatcher()
+
+    now = utc_now()
+    df = pd.DataFrame({
+        'id': ['a', 'b', 'a', 'c', 'b'],
+        'timestamp': [now] * 5,
+        'value': [1, 2, 3, 4, 5],
+    })
+    sample_data = SamplerData.from_dataframe(source_name='dummy', df=df, source_type=_DummySampler)
+
+    asyncio.get_event_loop().run_until_complete(_notify_watchers(
+        sample_data,
+        new_ids=pd.Series(['a', 'b']),
+        returned_ids=pd.Series(['c']),
+        gone_ids=pd.Series(['d'])
+    ))
+
+    calls = recording.calls
+    assert sorted(calls) == sorted([
+        ('found', 'a'), ('found', 'b'), ('returned', 'c'), ('gone', 'd'),
+        ('updates', 'a'), ('updates', 'b'), ('updates', 'c'),
+    ])
+    # Ids must be found / returned before their updates
+    for event, id in (('found', 'a'), ('found', 'b'), ('returned', 'c')):
+        assert calls.index((event, id)) < calls.index(('updates', id))
+
+    # One batched call for the whole sample
+    assert len(batch.batches) == 1
+    groups = dict(list(batch.batches[0]))
+    assert set(groups) == {'a', 'b', 'c'}
+    assert groups['a']['value'].tolist() == [1, 3]
+    assert 'id' not in groups['a'].columns
+
+def test_notify_watchers_subscribed_only():
+    clear_subscriptions()
+
+    gone = []
+    class _GoneWatcher(Watcher):
+        def __init__(self):
+            self.subscribe(_DummySampler, self.id_gone)
+
+        def id_gone(self, kind, id: str):
+            gone.append(id)
+    _GoneWatcher()
+
+    now = utc_now()
+    df = pd.DataFrame({'id': ['a'], 'timestamp': [now]})
+    sample_data = SamplerData.from_dataframe(source_name='dummy', df=df, source_type=_DummySampler)
+
+    # NOTE: 'x' is not in the sample, so building 'id-found' payloads would fail
+    asyncio.get_event_loop().run_until_complete(_notify_watchers(
+        sample_data,
+        new_ids=pd.Series(['x']),
+        returned_ids=pd.Series([], dtype=object),
+        gone_ids=pd.Series(['d'])
+    ))
+    assert gone == ['d']
+
+def test_after_failed():
+    notified = []
+    async def _failing():
+        raise RuntimeError("Previous notification failed")
+    async def _notify():
+        notified.append(True)
+
+    async def _run():
+        await _after(asyncio.create_task(_failing()), _notify())
+
+    # The next notification is still sent when the previous one failed
+    with pytest.raises(RuntimeError, match="Previous notification failed"):
+        asyncio.get_event_loop().run_until_complete(_run())
+    assert notified == [True]
+
+FAILING_SAMPLER_CONFIG = """
+schedule:
+  kind: IntervalSchedule
+  args:
+    interval: 0.1s
+samplers:
+  - kind: _DummySampler
+    name: run_schedule
+  - kind: _DummySampler
+    name: failing
+    args:
+      # NOTE: Odd / even ids can not be computed from 'none' values, so sampling raises
+      id_type: odd_even
+    schedule:
+      kind: IntervalSchedule
+      args:
+        interval: 0.1s
+stop_criteria:
+  kind: 'builtin:after_iterations'
+  args:
+    amount: 1000
+"""
+
+def test_sampler_loop_failed():
+    config = load_config(FAILING_SAMPLER_CONFIG, {})
+
+    # The run stops once the independently scheduled sampler fails, instead of only raising when it ends
+    start = time.perf_counter()
+    with pytest.raises(TypeError, match="unsupported operand"):
+        asyncio.get_event_loop().run_until_complete(asyncio.wait_for(orchestrate.run(config), 10))
+    assert time.perf_counter() - start < 5
+
+SELF_STATS_CONFIG = """
+schedule:
+  kind: IntervalSchedule
+  args:
+    interval: 0s
+samplers:
+  - kind: _DummySampler
+  - kind: _MCalSelfStats
+stop_criteria:
+  kind: 'builtin:after_iterations'
+  args:
+    amount: 2
+"""
+
+def test_self_stats_reset():
+    config = load_config(SELF_STATS_CONFIG, {})
+    run_data = asyncio.get_event_loop().run_until_complete(orchestrate.run(config))
+    assert len(run_data.collected_data['_MCalSelfStats'].raw_data) != 0
+
+    # Recording is scoped to the run
+    assert not RECORDER.enabled
+    assert len(RECORDER.collect()) == 0
+
+class _SlowAction(Action):
+    def __init__(self):
+        self.running = threading.Lock()
+        self.concurrent_observed = False
+        self.iterations = []
+
+    def after_iter(self, stats: RunStats):
+        if not self.running.acquire(blocking=False):
+            self.concurrent_observed = True
+            return
+        try:
+            iterations = stats.iterations
+            time.sleep(0.1)
+            # Stats should not change while the action is running
+            self.iterations.append((iterations, stats.iterations))
+        finally:
+            self.running.release()
+
+def test_actions_pipelined():
+    action = _SlowAction()
+    run_data = CalibrationRun(start_time=utc_now(), config=None)
+
+    asyncio.get_event_loop().run_until_complete(_run_loop(
+        run_data,
+        IntervalSchedule(timedelta(seconds=0)),
+        samplers={},
+        actions=[action],
+        stop_criteria=lambda stats: stats.iterations >= 4,
+        writer=None,
+        max_in_flight=3
+    ))
+
+    # Calls are ordered even when iterations overlap
+    assert not action.concurrent_observed
+    assert action.iterations == [(0, 0), (1, 1), (2, 2), (3, 3)]
@@ -0,0 +1,120 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from mcal.config import load_config
+from mcal.runner import orchestrate
+from mcal.runner.models import load_run
+from mcal.runner.writer import RunWriter
+
+CONFIG = """
+schedule:
+  kind: IntervalSchedule
+  args:
+    interval: 0s
+samplers:
+  - kind: _DummySampler
+    args:
+      value: sample_num
+stop_criteria:
+  kind: 'builtin:after_iterations'
+  args:
+    amount: {{amount}}
+"""
+
+@pytest.mark.parametrize(
+    "flush_every, amount, expected_segments",
+    [
+        (1, 5, 5),
+        (2, 5, 3),
+        (5, 5, 1),
+        (10, 5, 1)
+    ]
+)
+def test_segments(tmp_path: Path, flush_every: int, amount: int, expected_segments: int):
+    config = load_config(CONFIG, {'amount': amount})
+    writer = RunWriter(
+        save_directory=str(tmp_path),
+        name='run_data',
+        flush_every=flush_every
+    )
+
+    run_data = asyncio.get_event_loop().run_until_complete(orchestrate.run(config, writer=writer))
+    # Config should be written before the run finishes
+    assert os.path.isfile(tmp_path / 'run_data' / 'config.yml')
+
+    path = run_data.write_run()
+    assert path == str(tmp_path / 'run_data')
+
+    segments = [
+        file for file in os.listdir(tmp_path / 'run_data' / '_DummySampler')
+        if file.endswith('.csv')
+    ]
+    assert len(segments) == expected_segments
+
+    loaded = load_run(path)
+    assert loaded.collected_data['_DummySampler'].data['dummy'].tolist() == list(range(amount))
+
+def test_existing_path(tmp_path: Path):
+    config = load_config(CONFIG, {'amount': 1})
+    (tmp_path / 'run_data').mkdir()
+
+    writer = RunWriter(save_directory=str(tmp_path), name='run_data')
+    with pytest.raises(RuntimeError, match="Write path already exists"):
+        asyncio.get_event_loop().run_until_complete(orchestrate.run(config, writer=writer))
+
+@pytest.mark.parametrize("data_type", ('csv', 'parquet', 'arrow'))
+def test_data_type(tmp_path: Path, data_type: str):
+    if data_type != 'csv':
+        pytest.importorskip('pyarrow')
+
+    config = load_config(CONFIG, {'amount': 3})
+    writer = RunWriter(
+        save_directory=str(tmp_path),
+        name='run_data',
+        data_type=data_type
+    )
+    run_data = asyncio.get_event_loop().run_until_complete(orchestrate.run(config, writer=writer))
+    path = run_data.write_run()
+
+    segments = os.listdir(tmp_path / 'run_data' / '_DummySampler')
+    assert all(segment.endswith(f'.{data_type}') or segment.endswith('_dtypes.json') for segment in segments)
+
+    loaded = load_run(path)
+    assert loaded.collected_data['_DummySampler'].data['dummy'].tolist() == [0, 1, 2]
+
+CONFIG_RETENTION = """
+schedule:
+  kind: IntervalSchedule
+  args:
+    interval: 0s
+samplers:
+  - kind: _DummySampler
+    args:
+      value: sample_num
+    retention:
+      max_rows: 1
+stop_criteria:
+  kind: 'builtin:after_iterations'
+  args:
+    amount: 5
+"""
+
+def test_retention(tmp_path: Path):
+    config = load_config(CONFIG_RETENTION, {})
+    writer = RunWriter(save_directory=str(tmp_path), name='run_data')
+
+    run_data = asyncio.get_event_loop().run_until_complete(orchestrate.run(config, writer=writer))
+    path = run_data.write_run()
+
+    # Rows are only evicted once they have been written
+    sampler_data = run_data.collected_data['_DummySampler']
+    assert sampler_data.evicted > 0
+    assert len(sampler_data.id_keys) == 5 - sampler_data.evicted
+
+    # The full history is still presented, both in memory and once loaded
+    assert sampler_data.data['dummy'].tolist() == list(range(5))
+    loaded = load_run(path)
+    assert loaded.collected_data['_DummySampler'].data['dummy'].tolist() == list(range(5))
@@ -0,0 +1,163 @@
+import time
+from http.client import RemoteDisconnected
+from unittest.mock import MagicMock
+
+import pytest
+
+from mcal.samplers import dask_prom
+from mcal.samplers.dask_prom import (
+    DaskPromWorker,
+    K8Resources,
+    get_k8_resources,
+)
+from mcal.utils.prometheus import parse_exposition
+from mcal.utils.resources import ResourceRegistry
+
+
+class FakeInformers:
+    def __init__(self):
+        self.started = False
+        self.stopped = False
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.stopped = True
+
+@pytest.fixture
+def fake_k8(monkeypatch):
+    monkeypatch.setattr(dask_prom.config, 'load_kube_config', lambda: None)
+    monkeypatch.setattr(dask_prom.client, 'CoreV1Api', MagicMock)
+    monkeypatch.setattr(dask_prom.client, 'CustomObjectsApi', MagicMock)
+    monkeypatch.setattr(dask_prom, 'DaskInformers', FakeInformers)
+
+def test_informers_closed_with_registry(fake_k8):
+    registry = ResourceRegistry()
+    resources = get_k8_resources(registry)
+    assert isinstance(resources, K8Resources)
+    assert resources.informers.started
+
+    # Watches belong to the run, they are stopped when the run's resources are closed
+    registry.close()
+    assert resources.informers.stopped
+
+CLUSTERS = [
+    {'namespace': 'default', 'name': 'a', 'kind': 'dask-operator', 'scheduler_pods': [], 'worker_pods': ['a-0', 'a-1']},
+    {'namespace': 'default', 'name': 'b', 'kind': 'dask-operator', 'scheduler_pods': [], 'worker_pods': ['b-0']},
+]
+# Seconds each pod takes to respond, pods discovered first respond last
+DELAYS = {'a-0': 0.3, 'a-1': 0.2, 'b-0': 0.1}
+
+def _slow_prom_sample(namespace: str, pod: str, port: int, metric_filter=None, **kwargs):
+    time.sleep(DELAYS[pod])
+    return parse_exposition('tasks{state="memory"} %s\n' % DELAYS[pod], metric_filter=metric_filter)
+
+@pytest.mark.parametrize("layout", ('wide', 'long'))
+def test_worker_concurrent_scrape(fake_k8, layout: str):
+    sampler = DaskPromWorker(layout=layout, max_concurrency=4)
+    sampler.resources.discover = lambda: CLUSTERS
+    sampler.resources.pod_prom_sample = _slow_prom_sample
+
+    start = time.perf_counter()
+    df = sampler.sample()
+    # Pods are scraped at the same time, not one after another
+    assert time.perf_counter() - start < sum(DELAYS.values())
+
+    # Rows are kept in discovery order, each pod is timed when its scrape completes
+    pods = df.drop_duplicates('id')
+    assert pods['id'].tolist() == ['default/a/a-0', 'default/a/a-1', 'default/b/b-0']
+    timestamps = pods['timestamp'].tolist()
+    assert timestamps[0] > timestamps[1] > timestamps[2]
+    assert str(df['timestamp'].dt.tz) == 'UTC'
+
+    sampler.close()
+    with pytest.raises(RuntimeError):
+        sampler._executor.submit(lambda: None)
+
+class FakeConnection:
+    """Port-forwarded connection which fails its first `failures` requests"""
+    def __init__(self, failures: int = 0, body: str = 'up 1\n'):
+        self.failures = failures
+        self.body = body
+        self.connected = True
+        self.closed = False
+        self.requests = 0
+
+    def request(self, method: str, endpoint: str):
+        self.requests += 1
+        if self.requests <= self.failures:
+            raise RemoteDisconnected("Remote end closed connection without response")
+
+    def getresponse(self):
+        response = MagicMock()
+        response.read.return_value = self.body.encode()
+        response.will_close = False
+        return response
+
+    def close_all(self):
+        self.connected = False
+        self.closed = True
+
+def _fake_conns(resources: K8Resources, conns: list) -> list:
+    created = []
+    def get_conn(namespace: str, pod_name: str, port: int):
+        created.append(conns.pop(0))
+        return created[-1]
+    resources.get_conn = get_conn
+    return created
+
+def test_pooled_conn_reused(fake_k8):
+    resources = K8Resources()
+    created = _fake_conns(resources, [FakeConnection(), FakeConnection()])
+
+    for _ in range(3):
+        families = resources.pod_prom_sample('default', 'a-0', 8788)
+        assert [family.name for family in families] == ['up']
+    # One port-forward serves all scrapes of a pod
+    assert len(created) == 1
+    assert created[0].requests == 3
+
+    # Disconnected port-forwards are replaced
+    created[0].connected = False
+    resources.pod_prom_sample('default', 'a-0', 8788)
+    assert len(created) == 2
+    assert created[0].closed
+
+def test_pooled_conn_reconnect(fake_k8):
+    resources = K8Resources()
+    created = _fake_conns(resources, [FakeConnection(failures=1), FakeConnection(), FakeConnection(failures=1), FakeConnection(failures=1)])
+
+    # The pod closed the pooled connection, the scrape reconnects once
+    assert resources.pod_prom_sample('default', 'a-0', 8788) is not None
+    assert len(created) == 2
+    assert created[0].closed
+
+    # Gives up after reconnecting once
+    resources.close()
+    assert created[1].closed
+    assert resources.pod_prom_sample('default', 'a-0', 8788) is None
+    assert len(created) == 4
+
+def test_evict_conns(fake_k8):
+    resources = K8Resources()
+    created = _fake_conns(resources, [FakeConnection(), FakeConnection()])
+
+    resources.pod_prom_sample('default', 'a-0', 8788)
+    resources.pod_prom_sample('default', 'a-1', 8788)
+    resources.evict_conns([('default', 'a-1')])
+
+    # Only the connection to the pod which is gone is closed
+    assert created[0].closed
+    assert not created[1].closed
+
+@pytest.mark.parametrize("layout", ('wide', 'long'))
+def test_worker_failed_scrape(fake_k8, layout: str):
+    sampler = DaskPromWorker(layout=layout)
+    sampler.resources.discover = lambda: CLUSTERS
+    sampler.resources.pod_prom_sample = lambda pod, **kwargs: None if pod == 'a-1' else _slow_prom_sample(pod=pod, **kwargs)
+
+    # Pods which failed to be scraped are still seen, so their ids do not time out
+    df = sampler.sample()
+    assert df['id'].unique().tolist() == ['default/a/a-0', 'default/a/a-1', 'default/b/b-0']
+    sampler.close()
@@ -1,10 +1,19 @@
 import asyncio
+import threading
 import time
 
 import pandas as pd
 import pytest
 
-from mcal.events import clear_subscriptions, emit, on_event
+import mcal.events
+from mcal.events import (
+    ListenerWorker,
+    clear_subscriptions,
+    dispatch_plan,
+    emit,
+    has_listeners,
+    on_event,
+)
 
 
 def test_simple_event():
@@ -138,3 +147,192 @@ def test_sync_no_reentrant_multi_event(sleep_time: float):
         asyncio.gather(*tasks)
     )
 
+def test_dispatch_plan():
+    clear_subscriptions()
+
+    @on_event(('kind', 'sync-event'))
+    def sync_listener():
+        pass
+
+    @on_event(('kind', 'async-event'))
+    async def async_listener():
+        pass
+
+    assert has_listeners(('kind', 'sync-event'))
+    assert has_listeners(('kind', 'async-event'))
+    assert not has_listeners(('kind', 'other-event'))
+    assert not has_listeners(('other-kind', 'sync-event'))
+
+    assert dispatch_plan('kind', ('sync-event', 'async-event', 'other-event')) == {'sync-event', 'async-event'}
+    assert dispatch_plan('other-kind', ('sync-event', 'async-event')) == set()
+
+    # Emitting without listeners is a no-op
+    asyncio.get_event_loop().run_until_complete(
+        emit(('kind', 'other-event'))
+    )
+
+def test_sync_listener_worker():
+    clear_subscriptions()
+
+    received = []
+    threads = set()
+
+    @on_event('simple-event')
+    def listener(i: int):
+        received.append(i)
+        threads.add(threading.current_thread().name)
+
+    async def _emit():
+        await asyncio.gather(*(emit('simple-event', i) for i in range(1000)))
+
+    asyncio.get_event_loop().run_until_complete(_emit())
+
+    # Calls are made in order on a single dedicated thread
+    assert received == list(range(1000))
+    assert threads == {'mcal-listener-test_sync_listener_worker.<locals>.listener'}
+
+def test_sync_listener_shared_worker():
+    clear_subscriptions()
+
+    class _Listener:
+        def __init__(self):
+            self.count = 0
+            self.concurrent_observed = False
+
+            on_event('simple-event')(self.first)
+            on_event('another-event')(self.second)
+
+        def _enter(self):
+            self.count += 1
+            if self.count != 1:
+                self.concurrent_observed = True
+            time.sleep(0.05)
+            self.count -= 1
+
+        def first(self):
+            self._enter()
+
+        def second(self):
+            self._enter()
+
+    listener = _Listener()
+    tasks = (
+        emit('simple-event'),
+        emit('another-event'),
+        emit('simple-event'),
+        emit('another-event'),
+    )
+    asyncio.get_event_loop().run_until_complete(
+        asyncio.gather(*tasks)
+    )
+
+    # Methods of the same instance share one worker, so they are never run concurrently
+    assert len(mcal.events.SYNC_LISTENER_WORKERS) == 1
+    assert not listener.concurrent_observed
+
+@pytest.mark.parametrize("overflow", ('drop-oldest', 'coalesce'))
+def test_listener_worker_overflow(overflow: str):
+    received = []
+    release = threading.Event()
+
+    def listener(id: str, records: list):
+        release.wait()
+        received.append((id, records))
+
+    worker = ListenerWorker('test', max_pending=2, overflow=overflow)
+    worker.coalescers = {
+        'id-updates': (lambda kwargs: kwargs['id'], lambda old, new: {**new, 'records': old['records'] + new['records']})
+    }
+
+    async def _submit():
+        # First call blocks the worker thread so the rest are queued
+        await worker.submit(listener, kwargs={'id': 'blocking', 'records': [0]}, event=('kind', 'id-updates'))
+        await asyncio.sleep(0.1)
+
+        for i in range(1, 5):
+            await worker.submit(listener, kwargs={'id': 'a', 'records': [i]}, event=('kind', 'id-updates'))
+            await worker.submit(listener, kwargs={'id': 'b', 'records': [i]}, event=('kind', 'id-updates'))
+
+        release.set()
+        await worker.join()
+
+    asyncio.get_event_loop().run_until_complete(_submit())
+    worker.stop()
+
+    if overflow == 'drop-oldest':
+        # Only the newest two queued calls survive
+        assert received == [('blocking', [0]), ('a', [4]), ('b', [4])]
+        assert worker.dropped == 6
+        assert worker.coalesced == 0
+    else:
+        # Updates for the same id are merged in order, nothing is lost
+        assert received == [('blocking', [0]), ('a', [1, 2, 3, 4]), ('b', [1, 2, 3, 4])]
+        assert worker.dropped == 0
+        assert worker.coalesced == 6
+
+def test_listener_worker_coalesce_order():
+    received = []
+    release = threading.Event()
+
+    def listener(**kwargs):
+        release.wait()
+        received.append((kwargs['event'], kwargs.get('id'), kwargs.get('records')))
+
+    worker = ListenerWorker('test', max_pending=4, overflow='coalesce')
+    worker.coalescers = {
+        'id-updates': (lambda kwargs: kwargs['id'], lambda old, new: {**new, 'records': old['records'] + new['records']}),
+        'id-updates-batch': (lambda kwargs: None, lambda old, new: {**new, 'records': old['records'] + new['records']}),
+    }
+
+    async def _emit(event: str, **kwargs):
+        await worker.submit(listener, kwargs={'event': event, **kwargs}, event=('kind', event))
+
+    async def _submit():
+        # First call blocks the worker thread so the rest are queued
+        await _emit('id-gone', id='blocking')
+        await asyncio.sleep(0.1)
+
+        # NOTE: Nothing is merged until the queue is full
+        await _emit('id-updates', id='a', records=[1])
+        await _emit('id-gone', id='a')
+        await _emit('id-returned', id='a')
+        await _emit('id-updates', id='a', records=[2])
+        # Queue is full, consecutive updates for 'a' are merged
+        await _emit('id-updates', id='a', records=[3])
+
+        release.set()
+        await worker.join()
+        release.clear()
+
+        await _emit('id-gone', id='blocking')
+        await asyncio.sleep(0.1)
+
+        await _emit('id-updates-batch', records=[1])
+        await _emit('id-found', id='b')
+        await _emit('id-updates-batch', records=[2])
+        await _emit('id-found', id='c')
+        # Queue is full, batches are only merged into the tail of the queue
+        await _emit('id-updates-batch', records=[3])
+        await _emit('id-updates-batch', records=[4])
+
+        release.set()
+        await worker.join()
+
+    asyncio.get_event_loop().run_until_complete(_submit())
+    worker.stop()
+
+    assert received == [
+        ('id-gone', 'blocking', None),
+        ('id-updates', 'a', [1]),
+        ('id-gone', 'a', None),
+        ('id-returned', 'a', None),
+        ('id-updates', 'a', [2, 3]),
+        ('id-gone', 'blocking', None),
+        # NOTE: The oldest call is dropped to make room for the first batch which could not be merged
+        ('id-found', 'b', None),
+        ('id-updates-batch', None, [2]),
+        ('id-found', 'c', None),
+        ('id-updates-batch', None, [3, 4]),
+    ]
+    assert worker.coalesced == 2
+    assert worker.dropped == 1
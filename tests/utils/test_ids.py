@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from mcal.utils.ids import IdIndex, IdTable
+from mcal.utils.time import utc_now
+
+
+def _update(index: IdIndex, ids: list, last_seen):
+    new, returned = index.update(
+        pd.Series(ids, name="id"),
+        pd.Series([last_seen] * len(ids))
+    )
+    return list(new), list(returned)
+
+def test_new_and_returned():
+    index = IdIndex()
+    start = utc_now()
+
+    assert _update(index, ['a', 'b'], start) == (['a', 'b'], [])
+    assert _update(index, ['b', 'c'], start) == (['c'], [])
+    assert len(index) == 3
+
+    # Nothing should timeout before the timeout has elapsed
+    timeout = timedelta(seconds=10)
+    assert list(index.timeout(start + timeout, timeout)) == []
+
+    # All ids should timeout once
+    now = start + timedelta(seconds=11)
+    assert sorted(index.timeout(now, timeout)) == ['a', 'b', 'c']
+    assert list(index.timeout(now, timeout)) == []
+
+    assert _update(index, ['a', 'd'], now) == (['d'], ['a'])
+
+    ids = index.to_frame().set_index("id")
+    assert ids["present"].to_dict() == {'a': True, 'b': False, 'c': False, 'd': True}
+
+def test_stale_expiry():
+    index = IdIndex()
+    timeout = timedelta(seconds=10)
+    start = utc_now()
+
+    _update(index, ['a', 'b'], start)
+    # 'a' is seen again, so the original expiry entry should be ignored
+    _update(index, ['a'], start + timedelta(seconds=5))
+
+    assert list(index.timeout(start + timedelta(seconds=11), timeout)) == ['b']
+    assert list(index.timeout(start + timedelta(seconds=16), timeout)) == ['a']
+
+def test_expiry_entry_per_id():
+    index = IdIndex()
+    timeout = timedelta(seconds=10)
+    start = utc_now()
+
+    for i in range(20):
+        _update(index, ['a', 'b'], start + timedelta(seconds=i))
+    # Updates to present ids should not add expiry entries
+    assert len(index._expiry) == 2
+
+    assert list(index.timeout(start + timedelta(seconds=25), timeout)) == []
+    assert len(index._expiry) == 2
+    assert sorted(index.timeout(start + timedelta(seconds=30), timeout)) == ['a', 'b']
+    assert len(index._expiry) == 0
+
+    assert _update(index, ['a'], start + timedelta(seconds=30)) == ([], ['a'])
+    assert len(index._expiry) == 1
+
+def test_from_frame():
+    now = utc_now()
+    index = IdIndex.from_frame(pd.DataFrame({
+        "id": ['a', 'b'],
+        "last_seen": [now, now],
+        "present": [True, False]
+    }))
+
+    assert _update(index, ['a', 'b', 'c'], now) == (['c'], ['b'])
+
+def test_id_table():
+    table = IdTable()
+
+    assert table.intern(pd.Series(['b', 'a', 'b'])).tolist() == [0, 1, 0]
+    assert table.intern(['c', 'a']).tolist() == [2, 1]
+    # Categorical ids intern to the same keys
+    assert table.intern(pd.Series(['a', 'c'], dtype='category')).tolist() == [1, 2]
+    assert len(table) == 3
+
+    assert table.lookup([2, 0, 0]).tolist() == ['c', 'b', 'b']
+    categorical = table.categorical([1, 1, 0])
+    assert categorical.tolist() == ['a', 'a', 'b']
+    assert categorical.codes.tolist() == [1, 1, 0]
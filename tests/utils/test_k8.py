@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from mcal.utils import k8
+from mcal.utils.k8 import Informer
+
+
+def _obj(name: str, resource_version: str, **labels) -> dict:
+    return {
+        'metadata': {
+            'namespace': 'default',
+            'name': name,
+            'resourceVersion': resource_version,
+            'labels': labels
+        }
+    }
+
+class FakeWatch:
+    """Yields the queued event batches, one batch per `stream(...)` call, then blocks until stopped"""
+    batches = []
+    calls = []
+
+    def __init__(self):
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stream(self, func, **kwargs):
+        FakeWatch.calls.append(kwargs)
+        if len(FakeWatch.batches) != 0:
+            yield from FakeWatch.batches.pop(0)
+        self._stopped.wait()
+
+@pytest.fixture
+def fake_watch(monkeypatch):
+    FakeWatch.batches = []
+    FakeWatch.calls = []
+    monkeypatch.setattr(k8.watch, 'Watch', FakeWatch)
+    return FakeWatch
+
+def _wait_for(predicate, timeout: float = 2):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "Timed out waiting for informer"
+        time.sleep(0.01)
+
+def test_informer_list_watch(fake_watch):
+    lists = []
+    def list_func(**kwargs):
+        lists.append(kwargs)
+        return {
+            'metadata': {'resourceVersion': '10'},
+            'items': [
+                _obj('a', '1', component='worker'),
+                _obj('b', '2', component='worker'),
+            ]
+        }
+
+    fake_watch.batches = [[
+        {'type': 'ADDED', 'object': _obj('c', '11', component='scheduler')},
+        {'type': 'DELETED', 'object': _obj('a', '12', component='worker')},
+        {'type': 'MODIFIED', 'object': _obj('b', '13', component='scheduler')},
+    ]]
+
+    informer = Informer('test', list_func, label_selector='component')
+    informer.start()
+    try:
+        assert informer.wait_synced(2)
+        _wait_for(lambda: informer.get('default', 'a') is None)
+
+        assert lists == [{'label_selector': 'component'}]
+        # Watch resumes from the listed resource version
+        assert fake_watch.calls[0]['resource_version'] == '10'
+        assert fake_watch.calls[0]['label_selector'] == 'component'
+
+        assert sorted(obj['metadata']['name'] for obj in informer.items()) == ['b', 'c']
+        assert [obj['metadata']['name'] for obj in informer.select(labels={'component': 'worker'})] == []
+        assert len(informer.select(namespace='default', labels={'component': 'scheduler'})) == 2
+        assert len(informer.select(namespace='other')) == 0
+    finally:
+        informer.stop()
+
+def test_informer_relist_on_error(fake_watch):
+    lists = []
+    def list_func(**kwargs):
+        lists.append(kwargs)
+        return {
+            'metadata': {'resourceVersion': str(len(lists))},
+            'items': [_obj('a', '1')] if len(lists) == 1 else [_obj('b', '2')]
+        }
+
+    fake_watch.batches = [[
+        {'type': 'ERROR', 'object': {}, 'raw_object': {'code': 410}},
+    ]]
+
+    informer = Informer('test', list_func)
+    informer.start()
+    try:
+        _wait_for(lambda: len(fake_watch.calls) == 2)
+
+        assert len(lists) == 2
+        assert fake_watch.calls[1]['resource_version'] == '2'
+        assert [obj['metadata']['name'] for obj in informer.items()] == ['b']
+    finally:
+        informer.stop()
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from mcal.utils.pandas import (
+    ChunkedDataFrame,
+    DtypeCompactor,
+    concat_frames,
+    select_wide,
+    to_wide,
+)
+
+
+def test_chunked_append():
+    chunked = ChunkedDataFrame()
+    assert chunked.empty
+    assert chunked.to_frame().empty
+
+    for i in range(5):
+        chunked.append(pd.DataFrame([{'value': i}]))
+
+    assert len(chunked) == 5
+    assert chunked.num_chunks == 5
+
+    assert_frame_equal(
+        chunked.to_frame(),
+        pd.DataFrame({'value': [0, 1, 2, 3, 4]})
+    )
+    # Reading should consolidate the chunks
+    assert chunked.num_chunks == 1
+
+def test_chunked_schema_changes():
+    chunked = ChunkedDataFrame(pd.DataFrame([{'a': 0}]))
+    chunked.append(pd.DataFrame([{'b': 1}]))
+
+    assert_frame_equal(
+        chunked.to_frame(),
+        pd.DataFrame({'a': [0, np.nan], 'b': [np.nan, 1]})
+    )
+
+def test_chunked_empty_append():
+    chunked = ChunkedDataFrame(pd.DataFrame(columns=['a']))
+    assert list(chunked.to_frame().columns) == ['a']
+
+    chunked.append(pd.DataFrame([{'a': 1}]))
+    chunked.append(pd.DataFrame(columns=['a']))
+
+    assert len(chunked) == 1
+    assert chunked.num_chunks == 1
+
+def test_concat_frames_categorical():
+    a = pd.DataFrame({'metric': pd.Categorical(['x', 'y'])})
+    b = pd.DataFrame({'metric': pd.Categorical(['z', 'x'])})
+
+    df = concat_frames([a, b])
+    assert isinstance(df['metric'].dtype, pd.CategoricalDtype)
+    assert df['metric'].tolist() == ['x', 'y', 'z', 'x']
+
+def test_to_wide():
+    long = pd.DataFrame({
+        'id': ['b', 'b', 'a', 'a', 'b'],
+        'timestamp': [1, 1, 1, 1, 2],
+        'metric': pd.Categorical(['tasks', 'tasks', 'tasks', 'memory', 'tasks']),
+        'labels': pd.Categorical(['state=memory', 'state=executing', 'state=memory', '', 'state=memory']),
+        'value': [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+
+    # Rows keep the order they first appear in
+    assert_frame_equal(
+        to_wide(long),
+        pd.DataFrame({
+            'id': ['b', 'a', 'b'],
+            'timestamp': [1, 1, 2],
+            'tasks-state=memory': [1.0, 3.0, 5.0],
+            'tasks-state=executing': [2.0, np.nan, np.nan],
+            'memory': [np.nan, 4.0, np.nan],
+        })
+    )
+
+    assert_frame_equal(
+        select_wide(long, ['id', 'memory', 'missing']),
+        pd.DataFrame({
+            'id': ['a'],
+            'memory': [4.0],
+            'missing': [np.nan],
+        })
+    )
+
+    # Rows without a metric are kept without values
+    failed = pd.concat([long, pd.DataFrame({
+        'id': ['c'],
+        'timestamp': [2],
+        'metric': pd.Categorical([None]),
+        'labels': pd.Categorical([None]),
+        'value': [np.nan],
+    })], ignore_index=True)
+    assert to_wide(failed)['id'].tolist() == ['b', 'a', 'b', 'c']
+    assert to_wide(failed).iloc[-1, 2:].isna().all()
+    assert_frame_equal(
+        select_wide(failed, ['id', 'memory']),
+        pd.DataFrame({
+            'id': ['a', 'c'],
+            'memory': [4.0, np.nan],
+        })
+    )
+
+    # Wide data is returned unchanged
+    wide = pd.DataFrame({'id': ['a'], 'value': [1.0]})
+    assert to_wide(wide) is wide
+
+def test_dtype_compactor():
+    compactor = DtypeCompactor()
+    df = pd.DataFrame({
+        'id': ['a', 'b', 'c', 'd'],
+        'timestamp': pd.to_datetime([0, 1, 2, 3], unit='s', utc=True).as_unit('us'),
+        'namespace': ['x', 'x', 'x', 'y'],
+        'pod': ['a', 'b', 'c', None],
+        'count': [1, 2, 3, 4],
+        'ratio': [0.5, 0.25, np.nan, 1.0],
+        'precise': [0.1, 0.2, 0.3, 0.4],
+    })
+
+    compact = compactor.compact(df)
+    assert compact['id'].dtype == df['id'].dtype
+    assert compact['timestamp'].dtype == 'datetime64[ns, UTC]'
+    assert compact['namespace'].dtype == 'category'
+    # Too many unique values to be worth a categorical
+    assert compact['pod'].dtype == df['pod'].dtype
+    # Integers are not downcast so arithmetic can not wrap
+    assert compact['count'].dtype == 'int64'
+    assert compact['ratio'].dtype == 'float32'
+    # Downcasting would change the values
+    assert compact['precise'].dtype == 'float64'
+    assert_frame_equal(compact, df, check_dtype=False, check_categorical=False)
+
+    # Dtypes are only widened by later batches
+    compact = compactor.compact(pd.DataFrame({'ratio': [0.1], 'namespace': ['z']}))
+    assert compact['ratio'].dtype == 'float64'
+    assert compact['namespace'].dtype == 'category'
+    compact = compactor.compact(pd.DataFrame({'ratio': [0.5]}))
+    assert compact['ratio'].dtype == 'float64'
+
+def test_dtype_compactor_single_rows():
+    compactor = DtypeCompactor(category_max_unique=2)
+    batches = [
+        compactor.compact(pd.DataFrame({'namespace': ['x'], 'pod': [pod]}))
+        for pod in ['a', 'b', 'c', 'd']
+    ]
+
+    # Unique values are counted across batches, not within each one
+    assert batches[0]['namespace'].dtype != 'category'
+    assert all(batch['namespace'].dtype == 'category' for batch in batches[1:])
+    assert all(batch['pod'].dtype != 'category' for batch in batches)
+
+    # Past the cap a column is never converted, even if the ratio would allow it
+    for _ in range(10):
+        batch = compactor.compact(pd.DataFrame({'pod': ['a']}))
+        assert batch['pod'].dtype != 'category'
+
+    # Earlier string batches are converted when concatenated with categorical ones
+    df = concat_frames(batches)
+    assert df['namespace'].dtype == 'category'
+    assert df['namespace'].tolist() == ['x'] * 4
+
+def test_chunked_drop_head():
+    chunked = ChunkedDataFrame()
+    for i in range(0, 6, 2):
+        chunked.append(pd.DataFrame({'value': [i, i + 1]}))
+
+    assert chunked.leading_rows(lambda chunk: chunk['value'] < 3) == 3
+
+    chunked.drop_head(3)
+    assert len(chunked) == 3
+    assert chunked.to_frame()['value'].tolist() == [3, 4, 5]
+
+    # Columns are kept when everything is dropped
+    chunked.drop_head(10)
+    assert chunked.empty
+    assert list(chunked.to_frame().columns) == ['value']
@@ -0,0 +1,198 @@
+import math
+
+from mcal.utils.pandas import to_wide
+from mcal.utils.prometheus import (
+    MetricFilter,
+    create_metric_filter,
+    long_frame,
+    mapper_python_info,
+    metrics_to_dict,
+    metrics_to_long,
+    parse_exposition,
+)
+
+EXPOSITION = '''# HELP python_info Python platform information
+# TYPE python_info gauge
+python_info{implementation="CPython",major="3",minor="11",patchlevel="4",version="3.11.4"} 1.0
+# HELP dask_worker_tasks Number of tasks at worker.
+# TYPE dask_worker_tasks gauge
+dask_worker_tasks{state="memory"} 12.0
+dask_worker_tasks{state="executing"} 2.0
+# HELP dask_worker_transfer_incoming_count_total Total number of incoming transfers
+# TYPE dask_worker_transfer_incoming_count_total counter
+dask_worker_transfer_incoming_count_total 3.0
+dask_worker_transfer_incoming_count_created 1.7e+09
+# TYPE dask_worker_latency_seconds histogram
+dask_worker_latency_seconds_bucket{le="0.5"} 4.0
+dask_worker_latency_seconds_bucket{le="+Inf"} 5.0
+dask_worker_latency_seconds_count 5.0
+dask_worker_latency_seconds_sum 1.5
+# TYPE dask_worker_spill_seconds gauge
+dask_worker_spill_seconds{path="C:\\\\tmp \\"spill\\""} NaN 1700000000000
+untyped_metric +Inf
+'''
+
+def test_parse_exposition_families():
+    families = list(parse_exposition(EXPOSITION))
+
+    assert [(family.name, family.type) for family in families] == [
+        ('python_info', 'gauge'),
+        ('dask_worker_tasks', 'gauge'),
+        # Counters are named without '_total', same as prometheus_client
+        ('dask_worker_transfer_incoming_count', 'counter'),
+        ('dask_worker_transfer_incoming_count_created', 'untyped'),
+        ('dask_worker_latency_seconds', 'histogram'),
+        ('dask_worker_spill_seconds', 'gauge'),
+        ('untyped_metric', 'untyped'),
+    ]
+
+    tasks = families[1]
+    assert [(sample.labels, sample.value) for sample in tasks.samples] == [
+        ({'state': 'memory'}, 12.0),
+        ({'state': 'executing'}, 2.0),
+    ]
+
+    histogram = families[4]
+    assert [sample.name for sample in histogram.samples] == [
+        'dask_worker_latency_seconds_bucket',
+        'dask_worker_latency_seconds_bucket',
+        'dask_worker_latency_seconds_count',
+        'dask_worker_latency_seconds_sum',
+    ]
+    assert histogram.samples[1].labels == {'le': '+Inf'}
+
+    spill = families[5].samples[0]
+    assert spill.labels == {'path': 'C:\\tmp "spill"'}
+    assert math.isnan(spill.value)
+
+def test_metrics_to_dict():
+    row = metrics_to_dict(
+        parse_exposition(EXPOSITION),
+        custom_maps={
+            'python_info': mapper_python_info
+        }
+    )
+
+    assert row['python_implementation'] == 'CPython'
+    assert row['python_version'] == '3.11.4'
+    assert row['dask_worker_tasks-state=memory'] == 12.0
+    assert row['dask_worker_tasks-state=executing'] == 2.0
+    assert row['dask_worker_transfer_incoming_count'] == 3.0
+    # Histogram samples keep their suffix so '_count' / '_sum' do not overwrite each other
+    assert row['dask_worker_latency_seconds_bucket-le=0.5'] == 4.0
+    assert row['dask_worker_latency_seconds_bucket-le=+Inf'] == 5.0
+    assert row['dask_worker_latency_seconds_count'] == 5.0
+    assert row['dask_worker_latency_seconds_sum'] == 1.5
+    assert row['untyped_metric'] == math.inf
+
+    # Projecting labels without dropping any keeps the same names
+    projected = metrics_to_dict(
+        parse_exposition(EXPOSITION),
+        custom_maps={
+            'python_info': mapper_python_info
+        },
+        metric_filter=MetricFilter(exclude_labels=['nothing'])
+    )
+    assert projected.keys() == row.keys()
+    _, samples = metrics_to_long(parse_exposition(EXPOSITION))
+    _, projected_samples = metrics_to_long(parse_exposition(EXPOSITION), metric_filter=MetricFilter(exclude_labels=['nothing']))
+    # NOTE: Values are not compared since NaN != NaN
+    assert [sample[:2] for sample in projected_samples] == [sample[:2] for sample in samples]
+
+def test_metric_filter():
+    assert create_metric_filter() is None
+
+    metric_filter = MetricFilter(
+        include_metrics=['python_info', 'dask_worker_*'],
+        exclude_metrics=['*_created', 'dask_worker_spill_*'],
+    )
+    families = list(parse_exposition(EXPOSITION, metric_filter))
+    assert [family.name for family in families] == [
+        'python_info',
+        'dask_worker_tasks',
+        'dask_worker_transfer_incoming_count',
+        'dask_worker_latency_seconds',
+    ]
+
+def test_metric_filter_labels():
+    metric_filter = MetricFilter(
+        include_metrics=['python_info', 'dask_worker_tasks'],
+        exclude_labels=['state'],
+    )
+    row = metrics_to_dict(
+        parse_exposition(EXPOSITION, metric_filter),
+        custom_maps={
+            'python_info': mapper_python_info
+        },
+        metric_filter=metric_filter
+    )
+
+    # Samples which only differed by a dropped label are summed, custom maps still see all labels
+    assert row == {
+        'python_implementation': 'CPython',
+        'python_version': '3.11.4',
+        'dask_worker_tasks': 14.0,
+    }
+
+def test_metrics_to_long():
+    custom_maps = {
+        'python_info': mapper_python_info
+    }
+    info, samples = metrics_to_long(parse_exposition(EXPOSITION), custom_maps=custom_maps)
+
+    assert info == {
+        'python_implementation': 'CPython',
+        'python_version': '3.11.4',
+    }
+    assert samples[:3] == [
+        ('dask_worker_tasks', 'state=memory', 12.0),
+        ('dask_worker_tasks', 'state=executing', 2.0),
+        ('dask_worker_transfer_incoming_count', '', 3.0),
+    ]
+
+    df = long_frame([({'id': 'a', **info}, samples), ({'id': 'b'}, [])])
+    assert list(df.columns) == ['id', 'python_implementation', 'python_version', 'metric', 'labels', 'value']
+    assert df['metric'].dtype == 'category'
+    # Entities without samples keep a single row without a metric
+    assert len(df) == len(samples) + 1
+    assert df['id'].iloc[-1] == 'b'
+    assert df[['metric', 'labels', 'value']].iloc[-1].isna().all()
+
+    # Pivoting back should give the same columns as the wide layout
+    wide = to_wide(df)
+    assert wide['id'].tolist() == ['a', 'b']
+    assert wide.drop(columns=['id', 'python_implementation', 'python_version']).iloc[1].isna().all()
+    wide = wide.drop(columns='id').iloc[0].to_dict()
+    row = metrics_to_dict(parse_exposition(EXPOSITION), custom_maps=custom_maps)
+    assert wide.keys() == row.keys()
+    assert wide['dask_worker_tasks-state=memory'] == row['dask_worker_tasks-state=memory']
+
+def test_metric_filter_labels_histogram():
+    exposition = '''# TYPE h histogram
+h_bucket{le="1",w="a"} 2.0
+h_bucket{le="+Inf",w="a"} 3.0
+h_count{w="a"} 3.0
+h_sum{w="a"} 10.0
+h_bucket{le="1",w="b"} 1.0
+h_bucket{le="+Inf",w="b"} 1.0
+h_count{w="b"} 1.0
+h_sum{w="b"} 0.5
+'''
+    metric_filter = MetricFilter(include_labels=['x'])
+    row = metrics_to_dict(parse_exposition(exposition, metric_filter), metric_filter=metric_filter)
+
+    # Only samples of the same series are summed, buckets / sum / count stay separate
+    assert row == {
+        'h_bucket-le=1': 3.0,
+        'h_bucket-le=+Inf': 4.0,
+        'h_count': 4.0,
+        'h_sum': 10.5,
+    }
+
+    _, samples = metrics_to_long(parse_exposition(exposition, metric_filter), metric_filter=metric_filter)
+    assert samples == [
+        ('h_bucket', 'le=1', 3.0),
+        ('h_bucket', 'le=+Inf', 4.0),
+        ('h_count', '', 4.0),
+        ('h_sum', '', 10.5),
+    ]
@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mcal.utils.resources import ResourceRegistry
+
+
+class Closeable:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_get_creates_once():
+    registry = ResourceRegistry()
+    created = []
+    def factory():
+        # Give other threads a chance to race
+        time.sleep(0.05)
+        created.append(Closeable())
+        return created[-1]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: registry.get('key', factory), range(4)))
+
+    assert len(created) == 1
+    assert all(result is created[0] for result in results)
+
+def test_snapshot_ttl():
+    registry = ResourceRegistry()
+    calls = []
+    def factory():
+        calls.append(None)
+        return len(calls)
+
+    assert registry.snapshot('key', factory, ttl=0.2) == 1
+    assert registry.snapshot('key', factory, ttl=0.2) == 1
+    time.sleep(0.25)
+    assert registry.snapshot('key', factory, ttl=0.2) == 2
+
+def test_close():
+    registry = ResourceRegistry()
+    resource = registry.get('closeable', Closeable)
+    registry.get('other', dict)
+
+    registry.close()
+    assert resource.closed
+
+    # Resources are re-created after closing
+    assert registry.get('closeable', Closeable) is not resource